@@ -0,0 +1,73 @@
+"""
+Build time and query latency of the co-purchase index as the order history grows.
+
+Usage:
+    python -m benchmarks.copurchase_benchmark [--orders 100000 200000 400000]
+                                              [--products 5000] [--queries 1000] [--seed 7]
+
+For every order count, ``benchmarks.synthetic_data`` orders are counted into a
+``CoPurchaseBuilder``, saved, loaded back as the agent would, and queried with the
+products of random orders. Counting time per order should stay flat as the history
+grows (the rebuild is linear in orders); saving and querying depend on the number of
+products and distinct pairs, not on the number of orders.
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic_data import SyntheticDataGenerator
+from copurchase import CoPurchaseBuilder, CoPurchaseIndex, order_products
+
+
+def main():
+    """Run the benchmark and print one row per order count."""
+    parser = argparse.ArgumentParser(description="Benchmark the co-purchase index build and queries")
+    parser.add_argument("--orders", type=int, nargs="+", default=[100000, 200000, 400000],
+                        help="Order history sizes")
+    parser.add_argument("--products", type=int, default=5000, help="Synthetic catalog size")
+    parser.add_argument("--queries", type=int, default=1000, help="Recommendation queries per size")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    print(f"{'orders':>9}{'count s':>9}{'us/order':>10}{'save s':>8}{'load s':>8}"
+          f"{'pairs':>10}{'p50 ms':>8}{'p95 ms':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "copurchase_index.npz")
+        for orders in args.orders:
+            # Enough users for the requested orders at the generator's 1.5 orders per user
+            generator = SyntheticDataGenerator(seed=args.seed, users=orders, products=args.products)
+            history = [order_products(order) for order in itertools.islice(generator.iter_orders(), orders)]
+
+            builder = CoPurchaseBuilder()
+            start = time.perf_counter()
+            for product_ids in history:
+                builder.add_order(product_ids)
+            count_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            saved = builder.save(path)
+            save_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            index = CoPurchaseIndex.load(path)
+            load_seconds = time.perf_counter() - start
+
+            rng = random.Random(args.seed)
+            samples = []
+            for _ in range(args.queries):
+                product_ids = [product_id for order in rng.sample(history, 3) for product_id in order]
+                start = time.perf_counter()
+                index.recommend(product_ids, exclude=product_ids, limit=50)
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            print(f"{len(history):>9}{count_seconds:>9.2f}{count_seconds / len(history) * 1e6:>10.2f}"
+                  f"{save_seconds:>8.2f}{load_seconds:>8.2f}{saved['pairs']:>10}"
+                  f"{samples[len(samples) // 2]:>8.3f}{samples[int(len(samples) * 0.95)]:>8.3f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
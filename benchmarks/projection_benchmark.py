@@ -0,0 +1,79 @@
+"""
+Benchmark product projection profiles against a large synthetic catalog.
+
+Usage:
+    python -m benchmarks.projection_benchmark [--products 100000] [--seed 7]
+
+For each profile in ``database.PROJECTION_PROFILES`` the catalog is projected the way
+the server would, BSON-encoded to measure bytes on the wire, decoded back with
+``bson.decode_all`` to time driver-side decoding and measure the resulting object
+graph, and serialized with ``tool_output.dumps`` to measure the JSON handed to the
+LLM before any per-tool field selection.
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+import bson
+
+from benchmarks.synthetic_data import SyntheticDataGenerator
+from database import PROJECTION_PROFILES, apply_projection
+from tool_output import dumps
+
+def synthetic_products(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Generate products shaped like the sample catalog in database.create_sample_data()."""
+    generator = SyntheticDataGenerator(seed=seed, products=count)
+    return [{"_id": bson.ObjectId(), **product} for product in generator.iter_products()]
+
+
+def measure_profile(products: List[Dict[str, Any]], profile: str) -> Dict[str, Any]:
+    """Measure wire bytes, decode time, decoded heap size and tool output size for a profile."""
+    projected = [apply_projection(product, profile) for product in products]
+    wire = b"".join(bson.encode(document) for document in projected)
+
+    start = time.perf_counter()
+    decoded = bson.decode_all(wire)
+    decode_seconds = time.perf_counter() - start
+
+    # Second decode under tracemalloc so tracing overhead does not skew the timing
+    tracemalloc.start()
+    bson.decode_all(wire)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    output = dumps(decoded)
+
+    return {
+        "profile": profile,
+        "wire_bytes": len(wire),
+        "decode_ms": decode_seconds * 1000,
+        "decoded_heap_bytes": peak,
+        "tool_output_bytes": len(output.encode("utf-8")),
+    }
+
+
+def main():
+    """Run the benchmark and print one row per profile."""
+    parser = argparse.ArgumentParser(description="Compare product projection profiles")
+    parser.add_argument("--products", type=int, default=100000, help="Synthetic catalog size")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    products = synthetic_products(args.products, args.seed)
+    print(f"Synthetic catalog: {args.products} products")
+    print(f"{'profile':<15}{'wire MB':>10}{'decode ms':>12}{'heap MB':>10}{'output MB':>12}{'vs full':>9}")
+
+    results = [measure_profile(products, profile) for profile in PROJECTION_PROFILES]
+    full_bytes = next(r["wire_bytes"] for r in results if r["profile"] == "full")
+    for result in results:
+        print(f"{result['profile']:<15}"
+              f"{result['wire_bytes'] / 1e6:>10.2f}"
+              f"{result['decode_ms']:>12.1f}"
+              f"{result['decoded_heap_bytes'] / 1e6:>10.2f}"
+              f"{result['tool_output_bytes'] / 1e6:>12.2f}"
+              f"{result['wire_bytes'] / full_bytes:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Build time, memory and query latency of the content-based recommender.
+
+Usage:
+    python -m benchmarks.recommender_benchmark [--products 100000] [--queries 200]
+                                               [--python-queries 3] [--seed 7]
+
+A ``ContentRecommender`` is built over ``--products`` synthetic products, once with the
+dense copy of its TF-IDF matrix and once sparse only (as for a catalog whose feature
+vocabulary is too large for ``DENSE_MATRIX_BYTES``). Each is queried with customer
+histories of 1, 5 and 20 products, half of them with a category and price filter.
+``python`` scores the same queries with a per-product Python loop over feature dicts,
+the cost the vectorized product replaces. Latencies are milliseconds per query.
+"""
+import argparse
+import logging
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import content_recommender
+from benchmarks.synthetic_data import CATEGORIES, SyntheticDataGenerator
+from content_recommender import ContentRecommender, product_features
+from product_search import label_key
+
+HISTORY_SIZES = (1, 5, 20)
+
+Query = Tuple[List[str], Optional[str], Optional[float]]
+
+
+class PythonRecommender:
+    """The same TF-IDF ranking as ContentRecommender, scored product by product in Python."""
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+        self.by_id = {product['product_id']: product for product in products}
+        frequency: Dict[str, int] = {}
+        for product in products:
+            for feature in product_features(product):
+                frequency[feature] = frequency.get(feature, 0) + 1
+        idf = {feature: math.log((1 + len(products)) / (1 + count)) + 1 for feature, count in frequency.items()}
+        self.vectors = {}
+        for product in products:
+            vector = {feature: idf[feature] for feature in product_features(product)}
+            norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+            self.vectors[product['product_id']] = {feature: weight / norm for feature, weight in vector.items()}
+
+    def recommend(self, product_ids: List[str], category: Optional[str] = None,
+                  max_price: Optional[float] = None, limit: int = 5) -> List[str]:
+        profile: Dict[str, float] = {}
+        for product_id in product_ids:
+            for feature, weight in self.vectors.get(product_id, {}).items():
+                profile[feature] = profile.get(feature, 0.0) + weight
+        norm = math.sqrt(sum(weight * weight for weight in profile.values())) or 1.0
+        excluded = set(product_ids)
+        scored = []
+        for product in self.products:
+            if (product['product_id'] in excluded or not product['in_stock']
+                    or (category and label_key(product['category']) != label_key(category))
+                    or (max_price is not None and product['price'] > max_price)):
+                continue
+            similarity = sum(profile.get(feature, 0.0) * weight
+                             for feature, weight in self.vectors[product['product_id']].items()) / norm
+            if similarity > 0:
+                scored.append((-(similarity + content_recommender.RATING_WEIGHT * product['rating']
+                                 / content_recommender.MAX_RATING), product['product_id']))
+        scored.sort()
+        return [product_id for _, product_id in scored[:limit]]
+
+
+def make_queries(generator: SyntheticDataGenerator, history: int, count: int, rng: random.Random) -> List[Query]:
+    """Customer histories of ``history`` products, every other one filtered by category and price."""
+    queries = []
+    for index in range(count):
+        chosen = [generator.product_id(rng.randrange(generator.products)) for _ in range(history)]
+        if index % 2:
+            queries.append((chosen, rng.choice(CATEGORIES), float(rng.choice([300, 500]))))
+        else:
+            queries.append((chosen, None, None))
+    return queries
+
+
+def time_queries(recommend: Callable[[Query], Any], queries: List[Query]) -> Dict[str, float]:
+    """p50/p95 milliseconds per query, after one warm-up query."""
+    recommend(queries[0])
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        recommend(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"p50_ms": samples[len(samples) // 2],
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))]}
+
+
+def matrix_megabytes(recommender: ContentRecommender) -> float:
+    """Memory held by the recommender's NumPy arrays."""
+    arrays = [value for value in vars(recommender).values() if hasattr(value, "nbytes")]
+    return sum(array.nbytes for array in arrays) / 1e6
+
+
+def main():
+    """Run the benchmark and print one row per recommender and history size."""
+    parser = argparse.ArgumentParser(description="Benchmark the content-based recommender")
+    parser.add_argument("--products", type=int, default=100000, help="Synthetic catalog size")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per history size")
+    parser.add_argument("--python-queries", type=int, default=3,
+                        help="Queries per history size for the Python loop, 0 to skip it")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    generator = SyntheticDataGenerator(seed=args.seed, users=1, products=args.products)
+    products = [generator.product(index) for index in range(args.products)]
+
+    recommenders: Dict[str, Callable[[Query], Any]] = {}
+    dense_limit = content_recommender.DENSE_MATRIX_BYTES
+    for name, limit in (("numpy dense", dense_limit), ("numpy sparse", 0)):
+        content_recommender.DENSE_MATRIX_BYTES = limit
+        start = time.perf_counter()
+        recommender = ContentRecommender(products)
+        print(f"{name}: built in {time.perf_counter() - start:.2f} s, {matrix_megabytes(recommender):.1f} MB, "
+              f"{recommender.stats()}")
+        recommenders[name] = (lambda query, recommender=recommender:
+                              recommender.recommend(query[0], exclude=query[0], category=query[1],
+                                                    max_price=query[2]))
+    content_recommender.DENSE_MATRIX_BYTES = dense_limit
+    if args.python_queries:
+        start = time.perf_counter()
+        python = PythonRecommender(products)
+        print(f"python: built in {time.perf_counter() - start:.2f} s")
+        recommenders["python"] = lambda query: python.recommend(query[0], category=query[1], max_price=query[2])
+
+    print(f"{'recommender':<16}{'history':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    rng = random.Random(args.seed)
+    for history in HISTORY_SIZES:
+        queries = make_queries(generator, history, args.queries, rng)
+        for name, recommend in recommenders.items():
+            sample = queries[:args.python_queries] if name == "python" else queries
+            latency = time_queries(recommend, sample)
+            print(f"{name:<16}{history:>8}{latency['p50_ms']:>10.2f}{latency['p95_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,154 @@
+"""
+Accuracy and latency of the spoken product name resolver.
+
+Usage:
+    python -m benchmarks.resolver_benchmark [--cases benchmarks/resolver_cases.jsonl]
+                                            [--catalog data/sample_catalog.jsonl]
+                                            [--products 100000] [--queries 500] [--seed 7]
+                                            [--min-accuracy 0.95]
+
+Accuracy is measured on ``resolver_cases.jsonl``: transcripts of the sample catalog's
+product names as Deepgram returns them in English, Hinglish and Devanagari, each with
+the product it must resolve to, or ``null`` where the resolver has to ask instead
+(names that match several products, products the catalog does not have). The report
+splits failures into wrong products, which would put the wrong item in an order, and
+missed ones, where the customer would only be asked to confirm.
+
+Latency is measured on the sample catalog with the same transcripts and on a
+``benchmarks.synthetic_data`` catalog of ``--products`` products with misspelled
+names. The run exits with status 1 when accuracy is below ``--min-accuracy`` or any
+transcript resolves to the wrong product.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.synthetic_data import SyntheticDataGenerator
+from product_resolver import ProductNameResolver
+
+DEFAULT_CASES = os.path.join(os.path.dirname(__file__), "resolver_cases.jsonl")
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "data", "sample_catalog.jsonl")
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    """Read one JSON object per non-empty line."""
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """Lowercase a name and change one letter in one word, as a transcription slip would."""
+    words = name.lower().split()
+    position = rng.randrange(len(words))
+    word = words[position]
+    if len(word) > 3:
+        index = rng.randrange(1, len(word))
+        word = word[:index] + rng.choice("aeiouy") + word[index + 1:]
+    words[position] = word
+    return " ".join(words)
+
+
+def time_queries(resolve: Callable[[str], Any], queries: List[str]) -> Dict[str, float]:
+    """p50/p95/max milliseconds per resolve() call, after one warm-up pass."""
+    for query in queries:
+        resolve(query)
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        resolve(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max_ms": samples[-1],
+    }
+
+
+def score_cases(resolver: ProductNameResolver, cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Resolve every case and compare with its expected product.
+
+    Args:
+        resolver (ProductNameResolver): Resolver over the catalog the cases were written for
+        cases (List[Dict]): Cases with 'transcript' and 'expected' (a product_id or None)
+
+    Returns:
+        Dict: Counts of correct, wrong and missed resolutions, the share of expected
+            products that were at least offered as candidates, and the failing cases
+    """
+    correct = wrong = missed = offered = positives = 0
+    failures = []
+    for case in cases:
+        expected: Optional[str] = case["expected"]
+        resolution = resolver.resolve(case["transcript"])
+        if expected is not None:
+            positives += 1
+            offered += any(match.product_id == expected for match in resolution.matches)
+        if resolution.product_id == expected:
+            correct += 1
+            continue
+        if resolution.product_id is None:
+            missed += 1
+        else:
+            wrong += 1
+        failures.append((case["transcript"], expected, resolution.product_id,
+                         [(match.product_id, match.score) for match in resolution.matches]))
+    return {
+        "accuracy": correct / len(cases) if cases else 0.0,
+        "correct": correct,
+        "wrong": wrong,
+        "missed": missed,
+        "offered": offered / positives if positives else 0.0,
+        "failures": failures,
+    }
+
+
+def main():
+    """Run the benchmark and print accuracy and latency."""
+    parser = argparse.ArgumentParser(description="Measure spoken product name resolution")
+    parser.add_argument("--cases", default=DEFAULT_CASES, help="JSONL accuracy cases")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="JSONL catalog the cases refer to")
+    parser.add_argument("--products", type=int, default=100000, help="Synthetic catalog size for latency")
+    parser.add_argument("--queries", type=int, default=500, help="Synthetic queries to time")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    parser.add_argument("--min-accuracy", type=float, default=0.95, help="Fail below this accuracy")
+    args = parser.parse_args()
+
+    cases = read_jsonl(args.cases)
+    resolver = ProductNameResolver(read_jsonl(args.catalog))
+    result = score_cases(resolver, cases)
+    print(f"accuracy {result['accuracy']:.3f} on {len(cases)} cases: {result['correct']} correct, "
+          f"{result['wrong']} wrong product, {result['missed']} asked instead; "
+          f"expected product offered for {result['offered']:.1%}")
+    for transcript, expected, resolved, matches in result["failures"]:
+        print(f"  {transcript!r}: expected {expected}, resolved {resolved}, candidates {matches}")
+
+    latency = time_queries(resolver.resolve, [case["transcript"] for case in cases])
+    print(f"{'sample catalog':<24}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    print(f"{len(resolver):<24}{latency['p50_ms']:>9.3f}{latency['p95_ms']:>9.3f}{latency['max_ms']:>9.3f}")
+
+    generator = SyntheticDataGenerator(seed=args.seed, users=1, products=args.products)
+    products = [generator.product(index) for index in range(args.products)]
+    start = time.perf_counter()
+    synthetic = ProductNameResolver(products)
+    build_seconds = time.perf_counter() - start
+    rng = random.Random(args.seed)
+    queries = [misspell(rng.choice(products)["name"], rng) for _ in range(args.queries)]
+    latency = time_queries(synthetic.resolve, queries)
+    print(f"synthetic catalog: {synthetic.stats()}, built in {build_seconds:.2f} s")
+    print(f"{args.products:<24}{latency['p50_ms']:>9.3f}{latency['p95_ms']:>9.3f}{latency['max_ms']:>9.3f}")
+
+    if result["accuracy"] < args.min_accuracy or result["wrong"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
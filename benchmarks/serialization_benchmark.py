@@ -0,0 +1,181 @@
+"""
+Serialization cost per tool: hand-written stdlib JSON versus result models and orjson.
+
+Usage:
+    python -m benchmarks.serialization_benchmark [--iterations 2000] [--seed 7]
+
+For every tool that returns JSON, a representative result is built from
+``benchmarks.synthetic_data`` documents (with ObjectIds and datetimes, as the driver
+returns them) and serialized three ways:
+
+- ``stdlib``: the previous path, stringifying ``_id`` in place and calling
+  ``json.dumps(..., indent=2, default=str)`` on the raw documents
+- ``models+json``: the tool's ``tool_models`` result model dumped with stdlib json
+- ``models+orjson``: ``tool_output.format_tool_output()``, what the tools run now
+
+``create_product_order[input]`` compares the previous ``json.loads`` plus per-item
+checks with ``tool_models.OrderRequest``. Times are microseconds per call.
+"""
+import argparse
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+import bson
+
+from benchmarks.synthetic_data import SyntheticDataGenerator
+from tool_models import (FeedbackResult, OrderRequest, OrderResult, ProductPage, RecommendationResult,
+                         UserInfoResult, WishlistAddResult, WishlistResult)
+from tool_output import format_tool_output
+
+Case = Tuple[Callable[[], Any], Callable[[], Any], Callable[[], Any]]
+
+
+def legacy_dumps(payload: Dict[str, Any], records: List[Dict[str, Any]]) -> str:
+    """The serialization the tools used before result models."""
+    for record in records:
+        if '_id' in record:
+            record['_id'] = str(record['_id'])
+    return json.dumps(payload, indent=2, default=str)
+
+
+def legacy_order_items(items: str) -> Any:
+    """The hand-written validation create_product_order used before OrderRequest."""
+    parsed_items = json.loads(items)
+    if not isinstance(parsed_items, list) or not parsed_items:
+        return "Error: Items must be a non-empty list after parsing JSON"
+    for i, item in enumerate(parsed_items):
+        if not isinstance(item, dict):
+            return f"Error: Item {i+1} must be a dictionary with product_id and quantity"
+        if "product_id" not in item or "quantity" not in item:
+            return f"Error: Item {i+1} must contain both 'product_id' and 'quantity' fields"
+        if not isinstance(item.get("quantity"), (int, float)) or item.get("quantity") <= 0:
+            return f"Error: Item {i+1} quantity must be a positive number"
+    return parsed_items
+
+
+def build_cases(generator: SyntheticDataGenerator) -> Dict[str, Case]:
+    """One (stdlib, models+json, models+orjson) triple of callables per tool result."""
+    def documents(rows):
+        return [{"_id": bson.ObjectId(), **row} for row in rows]
+
+    products = documents(generator.product(i) for i in range(10))
+    recommended = products[:5]
+    wishlist = documents({"user_id": generator.user_id(0), "product_id": generator.product_id(i),
+                          "quantity_desired": 1, "priority": "medium", "notes": "",
+                          "added_date": datetime.now(timezone.utc)} for i in range(5))
+    profile = documents([generator.user(0)])[0]
+    token = "eyJhZnRlciI6ICJUVy1CQS0wMDAwMTAifQ=="
+    now = datetime.now(timezone.utc)
+    order_items = json.dumps([{"product_id": generator.product_id(i), "quantity": 2} for i in range(3)])
+
+    def page():
+        return ProductPage(products_count=len(products), products=products, next_page_token=token)
+
+    def wishlist_result():
+        return WishlistResult(wishlist_count=len(wishlist), wishlist_items=wishlist)
+
+    def recommendations():
+        return RecommendationResult(total_recommendations=len(recommended), recommended_products=recommended)
+
+    def user_info():
+        return UserInfoResult(user_profile=profile)
+
+    def wishlist_add():
+        return WishlistAddResult(message="Item added to wishlist for user user001", product_id="TW-BT-001")
+
+    def order():
+        return OrderResult(order_id=str(bson.ObjectId()))
+
+    def feedback():
+        return FeedbackResult(feedback_id=str(bson.ObjectId()))
+
+    def models_json(build):
+        return lambda: json.dumps(build().model_dump(exclude_none=True), separators=(",", ":"),
+                                  ensure_ascii=False)
+
+    return {
+        "get_all_products": (
+            lambda: legacy_dumps({"products_count": len(products), "products": products,
+                                  "next_page_token": token}, products),
+            models_json(page),
+            lambda: format_tool_output("get_all_products", page(), records_key="products")),
+        "get_user_wishlist": (
+            lambda: legacy_dumps({"user_id": "user001", "wishlist_count": len(wishlist),
+                                  "wishlist_items": wishlist}, wishlist),
+            models_json(wishlist_result),
+            lambda: format_tool_output("get_user_wishlist", wishlist_result(), records_key="wishlist_items")),
+        "get_product_recommendations": (
+            lambda: legacy_dumps({"user_id": "user001", "recommendation_criteria": {"in_stock": True},
+                                  "total_recommendations": len(recommended),
+                                  "recommended_products": recommended}, recommended),
+            models_json(recommendations),
+            lambda: format_tool_output("get_product_recommendations", recommendations(),
+                                       records_key="recommended_products")),
+        "get_user_info": (
+            lambda: legacy_dumps({"status": "success", "user_profile": profile}, [profile]),
+            models_json(user_info),
+            lambda: format_tool_output("get_user_info", user_info())),
+        "add_items_to_wishlist": (
+            lambda: json.dumps({"status": "success", "message": "Item added to wishlist for user user001",
+                                "product_id": "TW-BT-001",
+                                "added_item": {"product_id": "TW-BT-001", "added_date": now,
+                                               "quantity_desired": 2}}, indent=2, default=str),
+            models_json(wishlist_add),
+            lambda: format_tool_output("add_items_to_wishlist", wishlist_add())),
+        "create_product_order": (
+            lambda: json.dumps({"status": "success", "message": "Order created successfully",
+                                "order_id": str(bson.ObjectId()),
+                                "order_details": {"user_id": "user001", "items": json.loads(order_items),
+                                                  "shipping_address": "12 MG Road, Pune",
+                                                  "payment_method": "online", "special_instructions": "",
+                                                  "order_status": "pending"}}, indent=2, default=str),
+            models_json(order),
+            lambda: format_tool_output("create_product_order", order())),
+        "submit_product_feedback": (
+            lambda: json.dumps({"status": "success", "message": "Feedback submitted successfully",
+                                "feedback_id": str(bson.ObjectId()),
+                                "feedback_details": {"user_id": "user001", "product_id": "TW-BT-001",
+                                                     "rating": 4.5, "review_text": "Tasty and healthy",
+                                                     "order_id": None, "created_at": now,
+                                                     "verified_purchase": False}}, indent=2, default=str),
+            models_json(feedback),
+            lambda: format_tool_output("submit_product_feedback", feedback())),
+        "create_product_order[input]": (
+            lambda: legacy_order_items(order_items),
+            lambda: OrderRequest(user_id="user001", items=order_items, shipping_address="12 MG Road, Pune"),
+            lambda: OrderRequest(user_id="user001", items=order_items, shipping_address="12 MG Road, Pune")),
+    }
+
+
+def time_call(fn: Callable[[], Any], iterations: int) -> float:
+    """Mean microseconds per call, after a short warm-up."""
+    for _ in range(min(iterations, 100)):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    """Run the benchmark and print one row per tool."""
+    parser = argparse.ArgumentParser(description="Compare tool result serialization paths")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per case and path")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    cases = build_cases(SyntheticDataGenerator(seed=args.seed, users=10, products=10))
+    print(f"{'case':<32}{'stdlib us':>11}{'models+json us':>16}{'models+orjson us':>18}{'speedup':>9}")
+    for name, (legacy, models_json, models_orjson) in cases.items():
+        before = time_call(legacy, args.iterations)
+        middle = time_call(models_json, args.iterations)
+        after = time_call(models_orjson, args.iterations)
+        print(f"{name:<32}{before:>11.1f}{middle:>16.1f}{after:>18.1f}{before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,380 @@
+"""
+Seeded, streaming generator of production-scale synthetic data.
+
+Usage:
+    python -m benchmarks.synthetic_data --users 1000000 --products 100000 --out-dir synthetic/
+    python -m benchmarks.synthetic_data --users 100000 --backend sqlite [--batch-size 5000]
+    python -m benchmarks.synthetic_data --users 100000 --backend mongo --database twiddles_synthetic
+
+Every record is derived from the seed and its own index, so the output is identical
+across runs and any collection can be streamed without materializing the others.
+Product popularity follows a Zipf distribution (a few products appear in most
+wishlists, orders and reviews), users speak Hindi, English or Hinglish in a
+configurable mix, and order counts are skewed so most users have none or one order
+while a tail of repeat customers has many.
+
+JSONL output uses MongoDB Extended JSON, so files load with ``mongoimport``; the
+products file is plain JSON and loads with ``import_catalog.py``. Backends should be
+empty before loading: users, orders and feedback are inserted, not upserted.
+"""
+import argparse
+import asyncio
+import bisect
+import datetime
+import itertools
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import json_util
+
+from database import WISHLISTS_COLLECTION, StorageBackend, TwiddlesDatabase
+from storage import STORAGE_BACKENDS, create_backend
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["Spreads", "Bites", "Combo", "Bars", "Granola"]
+INGREDIENTS = ["California Walnuts", "Almonds", "Seeds", "Dark Chocolate", "Jaggery", "Dates",
+               "Cashews", "Coconut Oil", "Hazelnuts", "Orange Zest", "Vanilla", "Sea Salt",
+               "Pumpkin Seeds", "Coconut Sugar", "Oats", "Quinoa", "Cocoa Butter", "Raisins"]
+DIETARY_INFO = ["No Refined Sugar", "High Protein", "Omega-3 Rich", "Gluten Free", "Keto Friendly",
+                "Vegan", "Antioxidant Rich", "High Energy", "Natural Flavors", "Premium Quality"]
+STYLES = ["Crunch", "Silk", "Noir", "Energy", "Delight", "Bliss"]
+
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Arjun", "Rohan", "Kabir", "Ishaan", "Rahul", "Karan", "Amit",
+               "Priya", "Ananya", "Diya", "Meera", "Kavya", "Sneha", "Pooja", "Neha", "Riya", "Aisha"]
+LAST_NAMES = ["Sharma", "Verma", "Gupta", "Mehta", "Joshi", "Patel", "Reddy", "Iyer", "Nair", "Singh",
+              "Kumar", "Das", "Banerjee", "Kapoor", "Malhotra", "Chopra", "Agarwal", "Rao", "Jain", "Khan"]
+LOCATIONS = ["Delhi", "Mumbai", "Bangalore", "Pune", "Hyderabad", "Chennai", "Kolkata", "Ahmedabad",
+             "Jaipur", "Lucknow", "Chandigarh", "Indore", "Kochi", "Gurgaon", "Noida"]
+LANGUAGE_MIX = {"hindi": 0.35, "english": 0.30, "hinglish": 0.35}
+ORDER_STATUSES = [("delivered", 0.78), ("shipped", 0.08), ("pending", 0.06), ("cancelled", 0.08)]
+PRIORITIES = [("high", 0.25), ("medium", 0.5), ("low", 0.25)]
+REVIEWS = {
+    "english": ["Loved it, will order again", "Tastes great and feels healthy", "A bit too sweet for me",
+                "Perfect evening snack", "Packaging could be better"],
+    "hindi": ["बहुत स्वादिष्ट है, फिर से मंगाऊंगा", "बच्चों को बहुत पसंद आया", "थोड़ा ज़्यादा मीठा है",
+              "शाम के नाश्ते के लिए बढ़िया", "पैकिंग और अच्छी हो सकती है"],
+    "hinglish": ["Bahut tasty hai, will order again", "Kids ko bahut pasand aaya", "Thoda zyada sweet hai",
+                 "Evening snack ke liye perfect", "Packaging thodi better ho sakti hai"],
+}
+
+COLLECTIONS = ("products", "users", WISHLISTS_COLLECTION, "orders", "feedback")
+
+
+def _weighted(rng: random.Random, choices: List[Tuple[str, float]]) -> str:
+    return rng.choices([choice for choice, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+class SyntheticDataGenerator:
+    """
+    Deterministic streams of products, users, wishlists, orders and feedback.
+    """
+
+    def __init__(self, seed: int = 7, users: int = 10000, products: int = 1000,
+                 zipf_exponent: float = 1.1,
+                 mean_wishlist_items: float = 3.0,
+                 mean_orders: float = 1.5,
+                 feedback_rate: float = 0.3,
+                 language_mix: Optional[Dict[str, float]] = None,
+                 now: Optional[datetime.datetime] = None):
+        """
+        Configure the dataset.
+
+        Args:
+            seed (int): Random seed; the same seed always yields the same data
+            users (int): Number of users
+            products (int): Number of products
+            zipf_exponent (float): Skew of product popularity, higher is more concentrated
+            mean_wishlist_items (float): Average wishlist size
+            mean_orders (float): Average number of orders per user
+            feedback_rate (float): Share of ordered items that get a review
+            language_mix (Optional[Dict]): Preferred-language weights, LANGUAGE_MIX if None
+            now (Optional[datetime]): Reference time for generated dates
+        """
+        self.seed = seed
+        self.users = users
+        self.products = products
+        self.zipf_exponent = zipf_exponent
+        self.mean_wishlist_items = mean_wishlist_items
+        self.mean_orders = mean_orders
+        self.feedback_rate = feedback_rate
+        self.language_mix = list((language_mix or LANGUAGE_MIX).items())
+        self.now = now or datetime.datetime(2025, 1, 1)
+        self._popularity: Optional[List[float]] = None
+        self._ranked_products: Optional[List[int]] = None
+        self._prices: Dict[int, int] = {}
+
+    def _rng(self, *key: Any) -> random.Random:
+        # String seeds are hashed with SHA-512, so every record gets an independent stream
+        return random.Random(":".join(str(part) for part in (self.seed, *key)))
+
+    def product_id(self, index: int) -> str:
+        category = CATEGORIES[index % len(CATEGORIES)]
+        return f"TW-{category[:2].upper()}-{index:06d}"
+
+    def user_id(self, index: int) -> str:
+        return f"syn_user_{index:07d}"
+
+    def product(self, index: int) -> Dict[str, Any]:
+        """Generate one product, shaped like the sample catalog."""
+        rng = self._rng("product", index)
+        category = CATEGORIES[index % len(CATEGORIES)]
+        price = rng.randrange(149, 999, 10)
+        return {
+            "product_id": self.product_id(index),
+            "name": f"{rng.choice(INGREDIENTS)} {rng.choice(STYLES)} {category}",
+            "category": category,
+            "brand": "Twiddles",
+            "price": price,
+            "mrp": int(price * rng.uniform(1.15, 1.45)),
+            "size": f"{rng.choice([80, 85, 90, 100, 120])}g",
+            "description": " ".join(rng.choices(INGREDIENTS + DIETARY_INFO, k=14)),
+            "ingredients": rng.sample(INGREDIENTS, rng.randint(3, 8)),
+            "dietary_info": rng.sample(DIETARY_INFO, 3),
+            "image_url": f"https://cdn.twiddles.in/products/{index:06d}_{rng.getrandbits(64):016x}.jpg",
+            "in_stock": rng.random() > 0.15,
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+            "reviews_count": rng.randint(0, 2000),
+        }
+
+    def _price(self, index: int) -> int:
+        if index not in self._prices:
+            self._prices[index] = self.product(index)['price']
+        return self._prices[index]
+
+    def _popular_product(self, rng: random.Random) -> int:
+        """Draw a product index from the Zipf popularity distribution."""
+        if self._popularity is None:
+            weights = [1 / rank ** self.zipf_exponent for rank in range(1, self.products + 1)]
+            self._popularity = list(itertools.accumulate(weights))
+            # Shuffle which products are popular so the head is not one category
+            self._ranked_products = list(range(self.products))
+            self._rng("popularity").shuffle(self._ranked_products)
+        rank = bisect.bisect_left(self._popularity, rng.random() * self._popularity[-1])
+        return self._ranked_products[min(rank, self.products - 1)]
+
+    def _distinct_products(self, rng: random.Random, count: int) -> List[int]:
+        chosen: List[int] = []
+        for _ in range(count * 4):
+            if len(chosen) == count:
+                break
+            index = self._popular_product(rng)
+            if index not in chosen:
+                chosen.append(index)
+        return chosen
+
+    def _order_count(self, rng: random.Random) -> int:
+        # Geometric counts: many users with 0-1 orders, a long tail of repeat customers
+        if self.mean_orders <= 0:
+            return 0
+        p = 1 / (1 + self.mean_orders)
+        count = 0
+        while rng.random() > p:
+            count += 1
+        return count
+
+    def _days_ago(self, rng: random.Random, days: int) -> datetime.datetime:
+        return self.now - datetime.timedelta(seconds=rng.randrange(days * 86400))
+
+    def iter_products(self) -> Iterator[Dict[str, Any]]:
+        """Stream every product."""
+        for index in range(self.products):
+            yield self.product(index)
+
+    def user(self, index: int) -> Dict[str, Any]:
+        """Generate one user profile."""
+        rng = self._rng("user", index)
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        registered = self._days_ago(rng, 730)
+        orders = self._order_count(self._rng("orders", index))
+        return {
+            "user_id": self.user_id(index),
+            "name": f"{first} {last}",
+            "phone": f"+91-{rng.randrange(7000000000, 9999999999)}",
+            "email": f"{first.lower()}.{last.lower()}{index}@example.com",
+            "registration_date": registered,
+            "customer_type": "repeat" if orders > 1 else "new",
+            "preferred_language": _weighted(rng, self.language_mix),
+            "location": rng.choice(LOCATIONS),
+            "total_orders": orders,
+            "created_at": registered,
+        }
+
+    def iter_users(self) -> Iterator[Dict[str, Any]]:
+        """Stream every user profile."""
+        for index in range(self.users):
+            yield self.user(index)
+
+    def iter_wishlists(self) -> Iterator[Dict[str, Any]]:
+        """Stream wishlist items, at most one per (user, product)."""
+        for index in range(self.users):
+            rng = self._rng("wishlist", index)
+            size = min(int(rng.expovariate(1 / self.mean_wishlist_items)), self.products) \
+                if self.mean_wishlist_items > 0 else 0
+            for product_index in self._distinct_products(rng, size):
+                added = self._days_ago(rng, 180)
+                yield {
+                    "user_id": self.user_id(index),
+                    "product_id": self.product_id(product_index),
+                    "added_date": added,
+                    "updated_at": added,
+                    "priority": _weighted(rng, PRIORITIES),
+                    "quantity_desired": rng.choice([1, 1, 1, 2, 2, 3]),
+                    "notification_on_stock": rng.random() < 0.7,
+                    "notification_on_price_drop": rng.random() < 0.5,
+                }
+
+    def _user_orders(self, index: int) -> Iterator[Tuple[random.Random, Dict[str, Any]]]:
+        rng = self._rng("orders", index)
+        count = self._order_count(rng)
+        language = self.user(index)["preferred_language"] if count else None
+        for order_number in range(count):
+            items = [{"product_id": self.product_id(product_index),
+                      "quantity": rng.choice([1, 1, 2, 3]),
+                      "price": self._price(product_index)}
+                     for product_index in self._distinct_products(rng, rng.choice([1, 1, 2, 3]))]
+            yield rng, {
+                "user_id": self.user_id(index),
+                "items": items,
+                "total_amount": sum(item["price"] * item["quantity"] for item in items),
+                "shipping_address": f"{rng.randint(1, 999)}, {rng.choice(LOCATIONS)}",
+                "payment_method": rng.choice(["online", "online", "cod"]),
+                "order_status": _weighted(rng, ORDER_STATUSES),
+                "created_at": self._days_ago(rng, 365),
+                "language": language,
+            }
+
+    def iter_orders(self) -> Iterator[Dict[str, Any]]:
+        """Stream orders; each user's count comes from a skewed geometric distribution."""
+        for index in range(self.users):
+            for _, order in self._user_orders(index):
+                order.pop("language")
+                yield order
+
+    def iter_feedback(self) -> Iterator[Dict[str, Any]]:
+        """Stream reviews of delivered order items, written in the user's language."""
+        for index in range(self.users):
+            for rng, order in self._user_orders(index):
+                if order["order_status"] != "delivered":
+                    continue
+                for item in order["items"]:
+                    if rng.random() >= self.feedback_rate:
+                        continue
+                    yield {
+                        "user_id": order["user_id"],
+                        "product_id": item["product_id"],
+                        "rating": rng.choices([5.0, 4.5, 4.0, 3.0, 2.0, 1.0], weights=[40, 20, 20, 10, 6, 4])[0],
+                        "review_text": rng.choice(REVIEWS[order["language"]]),
+                        "order_id": None,
+                        "verified_purchase": True,
+                        "created_at": order["created_at"] + datetime.timedelta(days=rng.randint(3, 20)),
+                    }
+
+    def stream(self, collection_name: str) -> Iterator[Dict[str, Any]]:
+        """Stream the documents of one collection by name."""
+        return {
+            "products": self.iter_products,
+            "users": self.iter_users,
+            WISHLISTS_COLLECTION: self.iter_wishlists,
+            "orders": self.iter_orders,
+            "feedback": self.iter_feedback,
+        }[collection_name]()
+
+
+def _batches(documents: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def write_jsonl(generator: SyntheticDataGenerator, out_dir: str,
+                collections: Iterable[str] = COLLECTIONS) -> Dict[str, int]:
+    """
+    Write each collection to ``<out_dir>/<collection>.jsonl``.
+
+    Returns:
+        Dict[str, int]: Documents written per collection
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    for collection_name in collections:
+        count = 0
+        with open(os.path.join(out_dir, f"{collection_name}.jsonl"), "w", encoding="utf-8") as handle:
+            for document in generator.stream(collection_name):
+                handle.write(json_util.dumps(document, ensure_ascii=False) + "\n")
+                count += 1
+        counts[collection_name] = count
+        logger.info(f"Wrote {count} {collection_name} documents")
+    return counts
+
+
+async def load_into(database: StorageBackend, generator: SyntheticDataGenerator,
+                    collections: Iterable[str] = COLLECTIONS,
+                    batch_size: int = 5000) -> Dict[str, int]:
+    """
+    Stream generated collections into a storage backend in batches.
+
+    Products are upserted by product_id; everything else is inserted.
+
+    Returns:
+        Dict[str, int]: Documents loaded per collection
+    """
+    counts = {}
+    for collection_name in collections:
+        start = time.perf_counter()
+        count = 0
+        for batch in _batches(generator.stream(collection_name), batch_size):
+            if collection_name == "products":
+                result = await database.upsert_products(batch)
+            else:
+                result = await database.insert_documents(collection_name, batch)
+            if result is None:
+                raise RuntimeError(f"Loading {collection_name} failed after {count} documents")
+            count += len(batch)
+        counts[collection_name] = count
+        elapsed = time.perf_counter() - start
+        logger.info(f"Loaded {count} {collection_name} documents in {elapsed:.1f}s "
+                    f"({count / elapsed if elapsed > 0 else 0:.0f} docs/sec)")
+    return counts
+
+
+async def main():
+    """Parse arguments and generate the dataset."""
+    parser = argparse.ArgumentParser(description="Generate production-scale synthetic data")
+    parser.add_argument("--users", type=int, default=10000, help="Number of users")
+    parser.add_argument("--products", type=int, default=1000, help="Number of products")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of product popularity")
+    parser.add_argument("--collections", nargs="+", choices=COLLECTIONS, default=list(COLLECTIONS),
+                        help="Collections to generate")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out-dir", help="Write one JSONL file per collection to this directory")
+    target.add_argument("--backend", choices=STORAGE_BACKENDS, help="Load into a storage backend")
+    parser.add_argument("--database", default="twiddles_synthetic",
+                        help="MongoDB database name for --backend mongo")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert")
+    args = parser.parse_args()
+
+    generator = SyntheticDataGenerator(seed=args.seed, users=args.users, products=args.products,
+                                       zipf_exponent=args.zipf)
+    start = time.perf_counter()
+    if args.out_dir:
+        counts = write_jsonl(generator, args.out_dir, args.collections)
+    else:
+        # Never default to the production database for synthetic data
+        database = TwiddlesDatabase(args.database) if args.backend == "mongo" else create_backend(args.backend)
+        async with database:
+            await database.ensure_indexes()
+            counts = await load_into(database, generator, args.collections, args.batch_size)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    print(f"Generated {total} documents in {elapsed:.1f}s ({total / elapsed if elapsed > 0 else 0:.0f} docs/sec)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,275 @@
+"""
+Latency, allocation and output-size benchmark for the agent's tools.
+
+Usage:
+    python -m benchmarks.tool_benchmark [--sizes small medium] [--iterations 100] [--rounds 3]
+                                        [--latency-ms 0] [--save-baseline]
+                                        [--baseline benchmarks/baseline.json] [--threshold 1.5]
+
+Every ``function_tool`` in ``tools.py`` and ``prompts.get_session_instruction`` is
+called against an ``InMemoryDatabase`` loaded with ``benchmarks.synthetic_data`` at
+each dataset size. For each tool the report gives p50/p95/p99 latency, peak memory
+allocated per call, and mean output bytes and estimated LLM tokens.
+
+Results are compared with the stored baseline and the run exits with status 1 when a
+tool got slower or its output grew by more than ``--threshold`` times. Output size is
+deterministic; latency is only comparable with a baseline recorded on the same
+machine, so re-record it with ``--save-baseline`` when switching hardware.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List
+
+from livekit.agents.llm import is_function_tool
+
+import connection
+import prompts
+import tools
+from benchmarks.synthetic_data import (CATEGORIES, DIETARY_INFO, INGREDIENTS, STYLES, SyntheticDataGenerator,
+                                       load_into)
+from catalog_cache import CatalogCache, set_catalog_cache
+from copurchase import CoPurchaseBuilder, order_products, set_copurchase_index
+from recommendations import RecommendationRefresher, set_recommendation_refresher
+from storage import InMemoryDatabase
+from tool_output import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DATASET_SIZES = {
+    "small": {"users": 1000, "products": 1000},
+    "medium": {"users": 10000, "products": 10000},
+    "large": {"users": 100000, "products": 100000},
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Metrics checked against the baseline; latencies under LATENCY_FLOOR_MS are treated as noise
+COMPARED_METRICS = ("p50_ms", "p95_ms", "output_bytes")
+LATENCY_FLOOR_MS = 1.0
+
+Case = Callable[[random.Random], Awaitable[str]]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sample list."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def build_cases(generator: SyntheticDataGenerator) -> Dict[str, Case]:
+    """One representative call per tool, drawing users and products from the dataset."""
+    def user(rng: random.Random) -> str:
+        return generator.user_id(rng.randrange(generator.users))
+
+    def product(rng: random.Random) -> str:
+        return generator.product_id(rng.randrange(generator.products))
+
+    # Orders for out-of-stock products are rejected before any write, so orders draw
+    # from in-stock products to time the full checkout
+    orderable = [generator.product_id(index) for index in range(min(generator.products, 200))
+                 if generator.product(index)['in_stock']]
+
+    return {
+        "get_all_products": lambda rng: tools.get_all_products(),
+        "get_all_products[details]": lambda rng: tools.get_all_products(include_details=True),
+        "search_products": lambda rng: tools.search_products(
+            category=rng.choice(CATEGORIES), max_price=rng.choice([300, 500]), in_stock=True),
+        "search_products[keywords]": lambda rng: tools.search_products(
+            query=f"{rng.choice(INGREDIENTS)} {rng.choice(STYLES)}", dietary_info=rng.choice(DIETARY_INFO)),
+        "resolve_product_name": lambda rng: tools.resolve_product_name(
+            f"{rng.choice(INGREDIENTS)} {rng.choice(STYLES)} {rng.choice(CATEGORIES)}".lower()),
+        "get_user_wishlist": lambda rng: tools.get_user_wishlist(user(rng)),
+        "get_product_recommendations": lambda rng: tools.get_product_recommendations(user(rng)),
+        "get_product_recommendations[filtered]": lambda rng: tools.get_product_recommendations(
+            user(rng), rng.choice(CATEGORIES), "500"),
+        "get_user_info": lambda rng: tools.get_user_info(user(rng)),
+        "create_user_profile": lambda rng: tools.create_user_profile(
+            "Benchmark User", f"+91-{rng.randrange(7000000000, 9999999999)}", "Pune"),
+        "add_items_to_wishlist": lambda rng: tools.add_items_to_wishlist(user(rng), product(rng), 2),
+        "create_product_order": lambda rng: tools.create_product_order(
+            user(rng), json.dumps([{"product_id": rng.choice(orderable), "quantity": 1}]), "12 MG Road, Pune"),
+        "submit_product_feedback": lambda rng: tools.submit_product_feedback(
+            user(rng), product(rng), "4.5", "Tasty and healthy"),
+        "get_session_instruction": lambda rng: prompts.get_session_instruction(user(rng)),
+    }
+
+
+async def measure_case(case: Case, iterations: int, warmup: int, rounds: int, seed: int) -> Dict[str, Any]:
+    """
+    Time a case, then measure allocations in a separate pass so tracing does not skew latency.
+
+    Latency percentiles are the best of ``rounds`` independent rounds, which filters out
+    interference from other processes on the machine.
+    """
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await case(rng)
+
+    percentiles = {"p50_ms": [], "p95_ms": [], "p99_ms": []}
+    output_bytes = []
+    output_tokens = []
+    for _ in range(rounds):
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            output = await case(rng)
+            latencies.append((time.perf_counter() - start) * 1000)
+            output_bytes.append(len(output.encode("utf-8")))
+            output_tokens.append(estimate_tokens(output))
+        for name, fraction in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            percentiles[name].append(percentile(latencies, fraction))
+
+    peaks = []
+    for _ in range(min(iterations, 20)):
+        tracemalloc.start()
+        await case(rng)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+
+    return {
+        **{name: round(min(values), 4) for name, values in percentiles.items()},
+        "alloc_peak_kb": round(sum(peaks) / len(peaks) / 1024, 1),
+        "output_bytes": round(sum(output_bytes) / len(output_bytes)),
+        "output_tokens": round(sum(output_tokens) / len(output_tokens)),
+    }
+
+
+async def run_size(size: str, iterations: int, warmup: int, rounds: int,
+                   latency_ms: float, seed: int) -> Dict[str, Any]:
+    """Load a dataset size into a fresh in-memory backend and benchmark every case."""
+    generator = SyntheticDataGenerator(seed=seed, **DATASET_SIZES[size])
+    database = InMemoryDatabase()
+    start = time.perf_counter()
+    await load_into(database, generator)
+    logger.info(f"Loaded '{size}' dataset in {time.perf_counter() - start:.1f}s")
+    # Simulated round trips only apply to the measured calls, not the bulk load
+    database.latency_ms = latency_ms
+
+    connection.set_database(database)
+
+    async def load_catalog():
+        return await database.get_all_products(profile="full")
+    cache = CatalogCache(load_catalog)
+    set_catalog_cache(cache)
+    await cache.start()
+    # Co-purchase neighbors from the dataset's own orders, built as the offline job would
+    builder = CoPurchaseBuilder()
+    async for order in database.iter_orders():
+        builder.add_order(order_products(order), order['_id'])
+    set_copurchase_index(builder.index())
+    # Every customer's recommendation list stored, as the background refresher keeps them
+    # for active customers; filtered requests the list cannot satisfy still compute live
+    refresher = RecommendationRefresher()
+    set_recommendation_refresher(refresher)
+    for index in range(generator.users):
+        await refresher.refresh(generator.user_id(index))
+    refresher.start()
+
+    # The dataset lives in the database in production, not in the worker's heap; keep
+    # full garbage collections over it from showing up as tool latency
+    gc.collect()
+    gc.freeze()
+
+    cases = build_cases(generator)
+    missing = sorted(name for name in dir(tools) if is_function_tool(getattr(tools, name))
+                     and not any(case.split("[")[0] == name for case in cases))
+    if missing:
+        logger.warning(f"No benchmark case for tools: {', '.join(missing)}")
+
+    results = {}
+    for index, (name, case) in enumerate(cases.items()):
+        results[name] = await measure_case(case, iterations, warmup, rounds, seed + index)
+    await refresher.close()
+    await cache.stop()
+    await connection.close_database()
+    gc.unfreeze()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float) -> List[str]:
+    """List every metric that exceeds its baseline value by more than the threshold ratio."""
+    regressions = []
+    for size, cases in results.items():
+        for name, metrics in cases.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            for metric in COMPARED_METRICS:
+                floor = LATENCY_FLOOR_MS if metric.endswith("_ms") else 0
+                old, new = max(reference.get(metric, 0), floor), max(metrics[metric], floor)
+                if old and new / old > threshold:
+                    regressions.append(f"{size}/{name}: {metric} {reference.get(metric)} -> {metrics[metric]} "
+                                       f"({new / old:.2f}x)")
+    return regressions
+
+
+def print_report(size: str, results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{size}: {DATASET_SIZES[size]['users']} users, {DATASET_SIZES[size]['products']} products")
+    print(f"{'case':<40}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'alloc KB':>10}{'bytes':>9}{'tokens':>8}")
+    for name, metrics in results.items():
+        print(f"{name:<40}{metrics['p50_ms']:>9.3f}{metrics['p95_ms']:>9.3f}{metrics['p99_ms']:>9.3f}"
+              f"{metrics['alloc_peak_kb']:>10.1f}{metrics['output_bytes']:>9}{metrics['output_tokens']:>8}")
+
+
+async def main() -> int:
+    """Run the benchmark and return the process exit code."""
+    parser = argparse.ArgumentParser(description="Benchmark the agent's tools against an in-memory database")
+    parser.add_argument("--sizes", nargs="+", choices=DATASET_SIZES, default=["small", "medium"],
+                        help="Dataset sizes to run")
+    parser.add_argument("--iterations", type=int, default=100, help="Measured calls per case and round")
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds per case, the fastest one is reported")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured calls per case")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated database round trip")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Fail when a metric exceeds its baseline by this ratio")
+    args = parser.parse_args()
+
+    # Measure writes end to end instead of acknowledging them from the write-behind queue
+    os.environ["WRITE_BEHIND_ENABLED"] = "0"
+    results = {}
+    for size in args.sizes:
+        results[size] = await run_size(size, args.iterations, args.warmup, args.rounds,
+                                       args.latency_ms, args.seed)
+        print_report(size, results[size])
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as handle:
+                baseline = json.load(handle)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as handle:
+        regressions = compare(results, json.load(handle), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.threshold}x baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions over {args.threshold}x baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,100 @@
+"""
+Build the co-purchase recommendation index from the orders collection.
+
+Usage:
+    python build_copurchase_index.py [--output data/copurchase_index.npz] [--incremental]
+                                     [--neighbors 50] [--batch-size 1000]
+                                     [--backend mongo|memory|sqlite]
+
+Orders are streamed once in ``_id`` order and each adds a bounded number of product
+pairs (``copurchase.MAX_ORDER_ITEMS``), so the run time grows linearly with the number
+of orders. ``--incremental`` continues an existing index with only the orders placed
+after its newest order. The file is replaced atomically and running agents pick it up
+within COPURCHASE_RELOAD_SECONDS.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from copurchase import NEIGHBORS, CoPurchaseBuilder, order_products
+from database import StorageBackend
+from storage import STORAGE_BACKENDS, create_backend
+
+logger = logging.getLogger(__name__)
+
+
+async def count_orders(database: StorageBackend, builder: CoPurchaseBuilder,
+                       batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Add every order newer than the builder's watermark to the builder.
+
+    Args:
+        database (StorageBackend): Connected storage backend
+        builder (CoPurchaseBuilder): Empty builder, or one loaded from a previous build
+        batch_size (int): Orders fetched per round trip
+
+    Returns:
+        Dict: Orders read, elapsed seconds and orders/sec
+    """
+    start = time.perf_counter()
+    read = 0
+    async for order in database.iter_orders(after_order_id=builder.last_order_id, batch_size=batch_size):
+        builder.add_order(order_products(order), order['_id'])
+        read += 1
+        if read % 100000 == 0:
+            elapsed = time.perf_counter() - start
+            logger.info(f"{read} orders counted ({read / elapsed:.0f} orders/sec)")
+
+    elapsed = time.perf_counter() - start
+    return {
+        "orders_read": read,
+        "elapsed_seconds": round(elapsed, 3),
+        "orders_per_second": round(read / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+async def main() -> int:
+    """Parse arguments, build and save the index, and return the process exit code."""
+    parser = argparse.ArgumentParser(description="Build the co-purchase recommendation index from orders")
+    parser.add_argument("--output", default=os.getenv("COPURCHASE_INDEX_PATH",
+                                                      os.path.join("data", "copurchase_index.npz")),
+                        help="Index file (default: COPURCHASE_INDEX_PATH or data/copurchase_index.npz)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Continue the existing index with orders placed since it was built")
+    parser.add_argument("--neighbors", type=int, default=NEIGHBORS, help="Neighbors kept per product")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Orders fetched per round trip")
+    parser.add_argument("--backend", choices=STORAGE_BACKENDS,
+                        help="Storage backend (default: TWIDDLES_STORAGE_BACKEND or mongo)")
+    args = parser.parse_args()
+
+    builder: Optional[CoPurchaseBuilder] = CoPurchaseBuilder()
+    if args.incremental and os.path.exists(args.output):
+        builder = CoPurchaseBuilder.load(args.output)
+        if builder is None:
+            return 1
+        logger.info(f"Continuing {args.output} after order {builder.last_order_id} "
+                    f"({builder.orders} orders, {len(builder)} products)")
+
+    try:
+        async with create_backend(args.backend) as db:
+            report = await count_orders(db, builder, batch_size=args.batch_size)
+    except Exception as e:
+        logger.error(f"Error reading orders: {e}")
+        return 1
+
+    start = time.perf_counter()
+    saved = builder.save(args.output, neighbors=args.neighbors)
+    print(f"Counted {report['orders_read']} orders in {report['elapsed_seconds']}s "
+          f"({report['orders_per_second']} orders/sec); saved {saved['products']} products, "
+          f"{saved['pairs']} pairs and {saved['neighbors']} neighbors from {saved['orders']} orders "
+          f"to {args.output} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,670 @@
+"""
+In-process product catalog cache.
+
+The catalog changes a few times a day but is read on nearly every conversation turn,
+so each worker keeps the full product collection in memory. Reads are served from a
+dict, the snapshot is reloaded when it is older than the TTL, and a change feed
+(a MongoDB change stream in production, ``InMemoryChangeFeed`` in tests) applies
+inserts, updates and deletes incrementally between reloads. Every snapshot carries a
+``product_search.ProductSearchIndex``, a ``product_resolver.ProductNameResolver`` and a
+``content_recommender.ContentRecommender`` that follow the same changes, so structured
+searches, spoken product names and recommendations never scan the catalog in Python.
+"""
+import asyncio
+import bisect
+import datetime
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from connection import get_connection_manager, get_database
+from content_recommender import ContentRecommender
+from database import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    apply_projection,
+    decode_page_token,
+    encode_page_token,
+    match_document,
+)
+from product_resolver import ProductNameResolver
+from product_search import ProductSearchIndex, label_key
+
+logger = logging.getLogger(__name__)
+
+ProductLoader = Callable[[], Awaitable[Optional[List[Dict[str, Any]]]]]
+
+# Fields every order changes; updates touching only these do not count as catalog changes
+STOCK_FIELDS = frozenset({"in_stock", "stock_quantity"})
+
+
+def _last_change(products: List[Dict[str, Any]]) -> Optional[datetime.datetime]:
+    """Latest updated_at/created_at of the products, as naive UTC like BSON dates."""
+    stamps = [stamp.astimezone(datetime.timezone.utc).replace(tzinfo=None) if stamp.tzinfo else stamp
+              for product in products for stamp in (product.get('updated_at'), product.get('created_at'))
+              if isinstance(stamp, datetime.datetime)]
+    return max(stamps, default=None)
+
+
+def _is_stock_update(event: Dict[str, Any]) -> bool:
+    """True for an update event that only changed stock fields, e.g. an order's reservation."""
+    description = event.get('updateDescription')
+    if event.get('operationType') != 'update' or not description:
+        return False
+    return (not description.get('removedFields') and not description.get('truncatedArrays')
+            and set(description.get('updatedFields') or {}) <= STOCK_FIELDS)
+
+
+def _build_indexes(products: List[Dict[str, Any]]
+                   ) -> Tuple[ProductSearchIndex, ProductNameResolver, ContentRecommender]:
+    return ProductSearchIndex(products), ProductNameResolver(products), ContentRecommender(products)
+
+
+class ChangeFeed(ABC):
+    """
+    Source of product change events.
+
+    Events use the MongoDB change stream shape: ``operationType`` plus
+    ``documentKey`` and, for inserts/updates/replaces, ``fullDocument``.
+    """
+
+    @abstractmethod
+    def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield change events until closed."""
+
+    async def close(self) -> None:
+        """Stop producing events."""
+
+
+class MongoChangeFeed(ChangeFeed):
+    """Change feed backed by a MongoDB change stream on the products collection."""
+
+    def __init__(self, collection=None):
+        """
+        Initialize the change feed.
+
+        Args:
+            collection: Motor collection to watch, the shared products collection if None
+        """
+        self.collection = collection
+        self._stream = None
+        self._resume_token = None
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        if self.collection is None:
+            db = await get_database()
+            self.collection = db.db['products']
+        self._stream = self.collection.watch(full_document='updateLookup',
+                                             resume_after=self._resume_token)
+        async with self._stream as stream:
+            async for event in stream:
+                self._resume_token = stream.resume_token
+                yield event
+
+    async def close(self) -> None:
+        if self._stream is not None:
+            await self._stream.close()
+            self._stream = None
+
+
+class InMemoryChangeFeed(ChangeFeed):
+    """Change feed fed by hand, used to drive the cache without MongoDB."""
+
+    _CLOSED = object()
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Queue a raw change event."""
+        self._queue.put_nowait(event)
+
+    def insert(self, document: Dict[str, Any]) -> None:
+        """Publish an insert of a full product document."""
+        self.publish({"operationType": "insert", "documentKey": {"_id": document.get('_id')},
+                      "fullDocument": document})
+
+    def update(self, document: Dict[str, Any]) -> None:
+        """Publish an update carrying the post-image of a product document."""
+        self.publish({"operationType": "update", "documentKey": {"_id": document.get('_id')},
+                      "fullDocument": document})
+
+    def delete(self, document_id: Any) -> None:
+        """Publish a delete by MongoDB _id."""
+        self.publish({"operationType": "delete", "documentKey": {"_id": document_id}})
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            event = await self._queue.get()
+            if event is self._CLOSED:
+                return
+            yield event
+
+    async def close(self) -> None:
+        self._queue.put_nowait(self._CLOSED)
+
+
+class CatalogCache:
+    """
+    Read-through, TTL-refreshed cache of the whole product catalog.
+
+    A stale snapshot keeps being served while a single background reload runs,
+    so catalog reads never wait on MongoDB once the first load has completed.
+    """
+
+    def __init__(self, loader: ProductLoader, ttl_seconds: float = 300.0,
+                 change_feed: Optional[ChangeFeed] = None):
+        """
+        Initialize the cache without loading anything.
+
+        Args:
+            loader (ProductLoader): Coroutine returning all full product documents, None on error
+            ttl_seconds (float): Age after which the snapshot is reloaded
+            change_feed (Optional[ChangeFeed]): Source of incremental invalidations
+        """
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.change_feed = change_feed
+        self._products: Dict[str, Dict[str, Any]] = {}
+        self._keys_by_id: Dict[Any, str] = {}
+        self._sorted_keys: Optional[List[str]] = None
+        self._search_index = ProductSearchIndex()
+        self._resolver = ProductNameResolver()
+        self._recommender = ContentRecommender()
+        self._loaded_at: Optional[float] = None
+        self._changed_at: Optional[datetime.datetime] = None
+        self._generation = 0
+        self._expired = False
+        self._pending_changes: Optional[List[Dict[str, Any]]] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._feed_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.invalidations = 0
+        self.last_refresh_ms = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        """True once a snapshot has been loaded."""
+        return self._loaded_at is not None
+
+    @property
+    def changed_at(self) -> Optional[datetime.datetime]:
+        """
+        Naive UTC time of the newest catalog change seen: the latest product update in
+        the snapshot, or the arrival of a change event since. Stock-only updates are not
+        counted, since readers check stock against the snapshot anyway. None before the
+        first load.
+        """
+        return self._changed_at
+
+    @property
+    def generation(self) -> int:
+        """
+        Counter bumped by every reload and every applied change other than a stock-only
+        update, for callers holding results derived from the catalog.
+        """
+        return self._generation
+
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the snapshot was last reloaded, None before the first load."""
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def _store(self, document: Dict[str, Any], index: bool = True) -> None:
+        product_id = document.get('product_id')
+        if not product_id:
+            return
+        if product_id not in self._products:
+            self._sorted_keys = None
+        self._products[product_id] = document
+        if '_id' in document:
+            self._keys_by_id[document['_id']] = product_id
+        if index:
+            self._search_index.add(document)
+            self._resolver.add(document)
+            self._recommender.update(document)
+
+    def _remove(self, document_id: Any) -> None:
+        product_id = self._keys_by_id.pop(document_id, None)
+        if product_id is not None:
+            self._products.pop(product_id, None)
+            self._search_index.remove(product_id)
+            self._resolver.remove(product_id)
+            self._recommender.remove(product_id)
+            self._sorted_keys = None
+
+    async def _refresh(self) -> bool:
+        start = time.perf_counter()
+        # Changes arriving while the loader or indexing runs may be missing from the result
+        self._pending_changes = []
+        try:
+            products = await self.loader()
+            if products is not None:
+                # Indexing a large catalog takes a while; keep the event loop serving calls
+                search_index, resolver, recommender = await asyncio.to_thread(_build_indexes, products)
+        finally:
+            pending, self._pending_changes = self._pending_changes, None
+        if products is None:
+            self.refresh_failures += 1
+            logger.error("Catalog cache refresh failed, keeping previous snapshot")
+            return False
+
+        self._products = {}
+        self._keys_by_id = {}
+        self._sorted_keys = None
+        for product in products:
+            self._store(product, index=False)
+        self._search_index = search_index
+        self._resolver = resolver
+        self._recommender = recommender
+        last_change = _last_change(products)
+        if last_change is not None and (self._changed_at is None or last_change > self._changed_at):
+            self._changed_at = last_change
+        for event in pending:
+            self._apply(event)
+        self._loaded_at = time.monotonic()
+        self._expired = False
+        self._generation += 1
+        self.refreshes += 1
+        self.last_refresh_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Catalog cache loaded {len(self._products)} products in {self.last_refresh_ms:.1f} ms")
+        return True
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return self._refresh_task
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        # Background refreshes are not awaited; report a raised error here and let the next read retry
+        if task.cancelled() or task.exception() is None:
+            return
+        self.refresh_failures += 1
+        logger.error(f"Catalog cache refresh failed, keeping previous snapshot: {task.exception()}")
+        if self._refresh_task is task:
+            self._refresh_task = None
+
+    async def _ensure_loaded(self) -> bool:
+        """Return True if a snapshot is available, loading or refreshing it as needed."""
+        if self._loaded_at is None:
+            self.misses += 1
+            await asyncio.shield(self._schedule_refresh())
+            return self._loaded_at is not None
+
+        if self._expired or self.age_seconds() > self.ttl_seconds:
+            self.stale_hits += 1
+            self._schedule_refresh()
+        else:
+            self.hits += 1
+        return True
+
+    async def get_all_products(self, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """
+        Get every cached product.
+
+        Args:
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[List[Dict]]: Projected copies of all products, None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        return [apply_projection(product, profile) for product in self._products.values()]
+
+    async def get_products_by_filter(self, filter_dict: Dict[str, Any],
+                                     profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """
+        Get cached products matching a simple MongoDB filter.
+
+        Args:
+            filter_dict (Dict): Filter criteria, see database.match_document
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[List[Dict]]: Projected copies of matching products, None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        return [apply_projection(product, profile) for product in self._products.values()
+                if match_document(product, filter_dict)]
+
+    async def get_products_page(self, filter_dict: Optional[Dict[str, Any]] = None,
+                                profile: str = "full",
+                                page_size: int = DEFAULT_PAGE_SIZE,
+                                page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get one page of cached products ordered by product_id.
+
+        Uses the same page tokens as TwiddlesDatabase.get_products_page, so a
+        conversation can continue paging if reads move between the cache and MongoDB.
+
+        Args:
+            filter_dict (Optional[Dict]): Filter criteria, all products if None
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+            page_size (int): Products per page, capped at MAX_PAGE_SIZE
+            page_token (Optional[str]): Token returned with the previous page
+
+        Returns:
+            Optional[Dict]: 'products' and 'next_page_token' (None on the last page),
+                None if never loaded
+
+        Raises:
+            ValueError: If the page token is malformed
+        """
+        if not await self._ensure_loaded():
+            return None
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self._products)
+        keys = self._sorted_keys
+        position = bisect.bisect_right(keys, decode_page_token(page_token)) if page_token else 0
+
+        # Collect one extra match to learn whether another page exists
+        matches = []
+        while position < len(keys) and len(matches) <= page_size:
+            product = self._products.get(keys[position])
+            position += 1
+            if product is None or (filter_dict and not match_document(product, filter_dict)):
+                continue
+            matches.append(product)
+
+        page = matches[:page_size]
+        has_more = len(matches) > page_size
+        return {
+            "products": [apply_projection(product, profile) for product in page],
+            "next_page_token": encode_page_token(page[-1]['product_id']) if has_more else None,
+        }
+
+    async def get_product(self, product_id: str, profile: str = "full") -> Optional[Dict[str, Any]]:
+        """
+        Get a single cached product.
+
+        Args:
+            product_id (str): Product identifier
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[Dict]: Projected copy of the product, None if unknown or never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        product = self._products.get(product_id)
+        return apply_projection(product, profile) if product is not None else None
+
+    async def get_products(self, product_ids: Sequence[str],
+                           profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """
+        Get cached products by ID, like a ``product_id`` ``$in`` query.
+
+        Args:
+            product_ids (Sequence[str]): Product identifiers
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[List[Dict]]: Projected copies of the known products in the given
+                order, unknown IDs skipped, None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        return [apply_projection(self._products[product_id], profile)
+                for product_id in product_ids if product_id in self._products]
+
+    async def search_products(self, query: Optional[str] = None, category: Optional[str] = None,
+                              min_price: Optional[float] = None, max_price: Optional[float] = None,
+                              dietary: Sequence[str] = (), ingredients: Sequence[str] = (),
+                              in_stock: Optional[bool] = None, limit: int = 5,
+                              profile: str = "full") -> Optional[Dict[str, Any]]:
+        """
+        Search cached products with the snapshot's search index.
+
+        Args:
+            query (Optional[str]): Keywords matched against name and description
+            category (Optional[str]): Category, case-insensitive
+            min_price (Optional[float]): Lowest price, inclusive
+            max_price (Optional[float]): Highest price, inclusive
+            dietary (Sequence[str]): Dietary labels that must all be present
+            ingredients (Sequence[str]): Ingredients that must all be present
+            in_stock (Optional[bool]): Stock state to require
+            limit (int): Maximum number of products returned
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[Dict]: 'products' (best matches first), 'total' matching products (None
+                if more match than were counted) and 'unmatched_terms' dropped from the
+                query, None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        hits = self._search_index.search(query=query, category=category, min_price=min_price,
+                                         max_price=max_price, dietary=dietary, ingredients=ingredients,
+                                         in_stock=in_stock, limit=limit)
+        return {
+            "products": [apply_projection(self._products[product_id], profile) for product_id in hits.product_ids],
+            "total": hits.total,
+            "unmatched_terms": hits.unmatched_terms,
+        }
+
+    async def recommend_products(self, product_ids: Sequence[str], exclude: Sequence[str] = (),
+                                 category: Optional[str] = None, max_price: Optional[float] = None,
+                                 limit: int = 5, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """
+        Recommend in-stock products similar in content to the ones a customer chose.
+
+        Args:
+            product_ids (Sequence[str]): Wishlisted and ordered products
+            exclude (Sequence[str]): Products not to recommend
+            category (Optional[str]): Category, case-insensitive
+            max_price (Optional[float]): Highest price, inclusive
+            limit (int): Maximum number of products returned
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[List[Dict]]: Projected products, most similar first (empty when none of
+                the chosen products is known), None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        recommended = self._recommender.recommend(product_ids, exclude=exclude, category=category,
+                                                  max_price=max_price, limit=limit)
+        return [apply_projection(self._products[product_id], profile) for product_id in recommended]
+
+    async def select_products(self, product_ids: Sequence[str], category: Optional[str] = None,
+                              max_price: Optional[float] = None, in_stock: bool = True,
+                              limit: int = 5, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """
+        Keep the products of a ranked list that pass the recommendation filters.
+
+        Args:
+            product_ids (Sequence[str]): Ranked product IDs, e.g. co-purchased products
+            category (Optional[str]): Category, case-insensitive
+            max_price (Optional[float]): Highest price, inclusive
+            in_stock (bool): Only keep products in stock
+            limit (int): Maximum number of products returned
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[List[Dict]]: Projected products in the given order, None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        category_key = label_key(category) if category is not None else None
+        selected = []
+        for product_id in product_ids:
+            product = self._products.get(product_id)
+            if (product is None or (in_stock and not product.get('in_stock'))
+                    or (category_key is not None and label_key(product.get('category')) != category_key)):
+                continue
+            price = product.get('price')
+            if max_price is not None and not (isinstance(price, (int, float)) and price <= max_price):
+                continue
+            selected.append(apply_projection(product, profile))
+            if len(selected) == limit:
+                break
+        return selected
+
+    async def resolve_product(self, text: str, limit: int = 3,
+                              profile: str = "full") -> Optional[Dict[str, Any]]:
+        """
+        Match a spoken product name or product ID with the snapshot's name resolver.
+
+        Args:
+            text (str): Transcript fragment naming a product, in Latin letters or Devanagari
+            limit (int): Maximum number of candidates returned
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[Dict]: 'product_id' when one product clearly matches (else None) and
+                'candidates', best first, each with its 'confidence', None if never loaded
+        """
+        if not await self._ensure_loaded():
+            return None
+        resolution = self._resolver.resolve(text, limit=limit)
+        return {
+            "product_id": resolution.product_id,
+            "candidates": [{**apply_projection(self._products[match.product_id], profile),
+                            "confidence": match.score} for match in resolution.matches],
+        }
+
+    def apply_change(self, event: Dict[str, Any]) -> None:
+        """
+        Apply one change event to the snapshot.
+
+        Args:
+            event (Dict): Change stream event
+        """
+        self.invalidations += 1
+        if self._pending_changes is not None:
+            self._pending_changes.append(event)
+        self._apply(event)
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        operation = event.get('operationType')
+        document_id = event.get('documentKey', {}).get('_id')
+        document = event.get('fullDocument')
+        if not _is_stock_update(event):
+            self._changed_at = datetime.datetime.utcnow()
+            self._generation += 1
+
+        if operation in ('insert', 'update', 'replace'):
+            if document is None:
+                # Post-image missing: the document was deleted after the change
+                self._remove(document_id)
+                return
+            previous_key = self._keys_by_id.get(document_id)
+            if previous_key is not None and previous_key != document.get('product_id'):
+                self._products.pop(previous_key, None)
+                self._search_index.remove(previous_key)
+                self._resolver.remove(previous_key)
+                self._recommender.remove(previous_key)
+                self._sorted_keys = None
+            self._store(document)
+        elif operation == 'delete':
+            self._remove(document_id)
+        elif operation in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            # The stream cannot describe what changed; expire the snapshot
+            self._expired = True
+
+    async def _consume_feed(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async for event in self.change_feed.events():
+                    self.apply_change(event)
+                    backoff = 1.0
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Catalog change feed failed, retrying in {backoff:.0f}s: {e}")
+                # Changes may have been missed while disconnected
+                self._expired = True
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def start(self) -> bool:
+        """
+        Load the catalog and start following the change feed.
+
+        Returns:
+            bool: True if a snapshot is available
+        """
+        if self.change_feed is not None and (self._feed_task is None or self._feed_task.done()):
+            self._feed_task = asyncio.ensure_future(self._consume_feed())
+        if self._loaded_at is None:
+            await asyncio.shield(self._schedule_refresh())
+        return self._loaded_at is not None
+
+    async def stop(self) -> None:
+        """Stop the change feed and any pending refresh."""
+        if self.change_feed is not None:
+            await self.change_feed.close()
+        for task in (self._feed_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._feed_task = None
+        self._refresh_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dict: Hits, misses, stale hits, refreshes, invalidations, size and staleness
+        """
+        age = self.age_seconds()
+        return {
+            "products": len(self._products),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "invalidations": self.invalidations,
+            "staleness_seconds": round(age, 3) if age is not None else None,
+            "expired": self._expired,
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+            "search_terms": self._search_index.stats()["terms"],
+            "resolver_names": self._resolver.stats()["names"],
+            "recommender_features": self._recommender.stats()["features"],
+        }
+
+
+_catalog_cache: Optional[CatalogCache] = None
+
+
+async def _load_catalog() -> Optional[List[Dict[str, Any]]]:
+    db = await get_database()
+    return await db.get_all_products(profile="full")
+
+
+def get_catalog_cache() -> CatalogCache:
+    """
+    Get or create the process-wide catalog cache.
+
+    TTL comes from CATALOG_CACHE_TTL_SECONDS (default 300). A MongoDB change stream is
+    used for invalidation unless CATALOG_CHANGE_STREAM is set to 0 or a non-MongoDB
+    storage backend is selected.
+    """
+    global _catalog_cache
+    if _catalog_cache is None:
+        ttl_seconds = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+        use_change_stream = (os.getenv("CATALOG_CHANGE_STREAM", "1") != "0"
+                             and get_connection_manager().backend == "mongo")
+        change_feed = MongoChangeFeed() if use_change_stream else None
+        _catalog_cache = CatalogCache(_load_catalog, ttl_seconds=ttl_seconds, change_feed=change_feed)
+    return _catalog_cache
+
+
+def set_catalog_cache(cache: CatalogCache) -> None:
+    """Replace the process-wide catalog cache, e.g. with one bound to a benchmark backend."""
+    global _catalog_cache
+    _catalog_cache = cache
@@ -0,0 +1,375 @@
+"""
+Process-wide MongoDB connection management.
+
+Every module in the worker (tools, prompts, main) obtains its database handle from
+``get_database()`` so that a single pooled ``AsyncIOMotorClient`` is shared by all
+sessions running in the process instead of one client per caller.
+
+TWIDDLES_STORAGE_BACKEND selects a different ``StorageBackend`` from ``storage`` (memory,
+sqlite) for load tests and benchmarks; ``set_database()`` installs one directly.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from database import StorageBackend, TwiddlesDatabase, build_mongodb_uri, record_round_trip
+from resilience import get_database_guard
+from storage import create_backend
+from write_behind import WriteBehindBuffer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to a default."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+class PoolSettings:
+    """
+    Connection pool configuration for the shared Motor client.
+
+    Values are read from the environment so pool sizing can be tuned per deployment:
+    MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE, MONGODB_MAX_IDLE_TIME_MS,
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS, MONGODB_CONNECT_TIMEOUT_MS and
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS.
+    """
+
+    def __init__(self,
+                 max_pool_size: int = 50,
+                 min_pool_size: int = 0,
+                 max_idle_time_ms: int = 300000,
+                 wait_queue_timeout_ms: int = 2000,
+                 connect_timeout_ms: int = 5000,
+                 server_selection_timeout_ms: int = 5000):
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.max_idle_time_ms = max_idle_time_ms
+        self.wait_queue_timeout_ms = wait_queue_timeout_ms
+        self.connect_timeout_ms = connect_timeout_ms
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """Build settings from MONGODB_* environment variables."""
+        return cls(
+            max_pool_size=_env_int("MONGODB_MAX_POOL_SIZE", 50),
+            min_pool_size=_env_int("MONGODB_MIN_POOL_SIZE", 0),
+            max_idle_time_ms=_env_int("MONGODB_MAX_IDLE_TIME_MS", 300000),
+            wait_queue_timeout_ms=_env_int("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 2000),
+            connect_timeout_ms=_env_int("MONGODB_CONNECT_TIMEOUT_MS", 5000),
+            server_selection_timeout_ms=_env_int("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        )
+
+    def client_options(self) -> Dict[str, Any]:
+        """Keyword arguments for ``AsyncIOMotorClient``."""
+        return {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+        }
+
+
+class RoundTripListener(monitoring.CommandListener):
+    """
+    Counts every command sent to MongoDB, getMore included, against the tool call that
+    issued it. Motor runs driver calls with a copy of the caller's context, so the
+    counter in database.round_trip_counter is visible from its threads.
+    """
+
+    def started(self, event):
+        record_round_trip()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool counters fed by PyMongo's connection monitoring events.
+
+    Motor executes driver calls on a thread pool, so every counter update is guarded
+    by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return a point-in-time view of the pool.
+
+        Returns:
+            Dict: Open, checked-out and available connections plus checkout wait times
+        """
+        with self._lock:
+            average_wait = self.wait_time_total / self.checkouts if self.checkouts else 0.0
+            return {
+                "connections_open": self.total,
+                "connections_checked_out": self.checked_out,
+                "connections_available": max(self.total - self.checked_out, 0),
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_time_avg_ms": round(average_wait * 1000, 3),
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+            }
+
+    def _record_wait(self, event) -> None:
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            return
+        self.wait_time_total += duration
+        self.wait_time_max = max(self.wait_time_max, duration)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.total += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.total = max(self.total - 1, 0)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self._record_wait(event)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event)
+
+    def pool_cleared(self, event):
+        logger.warning(f"MongoDB connection pool cleared for {event.address}")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+class MongoConnectionManager:
+    """
+    Owns the single Motor client of a worker process.
+
+    The client is created lazily on first use behind an asyncio lock, so concurrent
+    sessions never build two clients. ``warm_up()`` can be scheduled early to pay the
+    TLS/auth/ping cost before the first tool call needs it; it also bootstraps the
+    indexes in ``database.INDEX_SPECS`` once per process.
+    """
+
+    def __init__(self, database_name: str = 'Techladder',
+                 settings: Optional[PoolSettings] = None,
+                 backend: Optional[str] = None):
+        """
+        Initialize the manager without opening any connection.
+
+        Args:
+            database_name (str): Name of the MongoDB database
+            settings (Optional[PoolSettings]): Pool configuration, read from env if None
+            backend (Optional[str]): Storage backend name, TWIDDLES_STORAGE_BACKEND if None
+        """
+        self.database_name = database_name
+        self.settings = settings or PoolSettings.from_env()
+        self.backend = backend or os.getenv("TWIDDLES_STORAGE_BACKEND", "mongo")
+        self.metrics = PoolMetrics()
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._database: Optional[StorageBackend] = None
+        self._write_buffer: Optional[WriteBehindBuffer] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created on first use so the lock binds to the worker's running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def get_database(self) -> StorageBackend:
+        """
+        Get the shared database handle, creating the client on first call.
+
+        Returns:
+            StorageBackend: Database bound to the process-wide client
+        """
+        if self._database is not None:
+            return self._database
+
+        async with self._get_lock():
+            if self._database is None and self.backend != "mongo":
+                self._database = create_backend(self.backend)
+                logger.info(f"Using '{self.backend}' storage backend")
+            elif self._database is None:
+                self._client = AsyncIOMotorClient(
+                    build_mongodb_uri(),
+                    event_listeners=[self.metrics, RoundTripListener()],
+                    **self.settings.client_options(),
+                )
+                self._database = TwiddlesDatabase(self.database_name, client=self._client)
+                logger.info(
+                    f"Created shared MongoDB client (maxPoolSize={self.settings.max_pool_size}, "
+                    f"minPoolSize={self.settings.min_pool_size})"
+                )
+        return self._database
+
+    async def warm_up(self) -> bool:
+        """
+        Open the first pooled connection by pinging the server.
+
+        Concurrent callers share a single ping.
+
+        Returns:
+            bool: True if the server answered, False otherwise
+        """
+        task = self._warm_up_task
+        if task is None or (task.done() and (task.cancelled() or task.exception() or not task.result())):
+            self._warm_up_task = asyncio.ensure_future(self._warm_up())
+        return await asyncio.shield(self._warm_up_task)
+
+    async def _warm_up(self) -> bool:
+        start = time.perf_counter()
+        database = await self.get_database()
+        connected = await database.connect()
+        if connected:
+            await database.ensure_indexes()
+            logger.info(f"Database warm-up completed in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return connected
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool metrics.
+
+        Returns:
+            Dict: Pool settings and current counters
+        """
+        stats = self.metrics.snapshot()
+        stats["max_pool_size"] = self.settings.max_pool_size
+        stats["min_pool_size"] = self.settings.min_pool_size
+        return stats
+
+    async def get_write_buffer(self) -> WriteBehindBuffer:
+        """
+        Get the write-behind buffer for the shared database, starting it on first call.
+
+        Background flushing is skipped when WRITE_BEHIND_ENABLED is 0, in which case
+        every queued write is flushed before the call returns.
+
+        Returns:
+            WriteBehindBuffer: Buffer bound to the shared database handle
+        """
+        database = await self.get_database()
+        if self._write_buffer is None or self._write_buffer.database is not database:
+            self._write_buffer = WriteBehindBuffer.from_env(database)
+            if os.getenv("WRITE_BEHIND_ENABLED", "1") != "0":
+                self._write_buffer.start()
+        return self._write_buffer
+
+    def set_database(self, database: StorageBackend) -> None:
+        """
+        Install an already built backend as the shared database handle.
+
+        Args:
+            database (StorageBackend): Backend to hand out from ``get_database()``
+        """
+        self._database = database
+        self._write_buffer = None
+        self._warm_up_task = None
+
+    async def close(self) -> None:
+        """
+        Flush buffered writes and close the shared client.
+
+        A later ``get_database()`` creates a new one.
+        """
+        if self._write_buffer is not None:
+            await self._write_buffer.close()
+            logger.info(f"Write-behind buffer closed, stats: {self._write_buffer.stats()}")
+            self._write_buffer = None
+        logger.info(f"Database guard stats: {get_database_guard().stats()}")
+        async with self._get_lock():
+            if self._client is not None:
+                logger.info(f"Closing shared MongoDB client, pool stats: {self.pool_stats()}, "
+                            f"coalescing stats: {self._database.single_flight.stats()}")
+                self._client.close()
+            elif self._database is not None:
+                logger.info(f"Closing '{self.backend}' storage backend, "
+                            f"coalescing stats: {self._database.single_flight.stats()}")
+                await self._database.disconnect()
+            self._client = None
+            self._database = None
+            self._warm_up_task = None
+
+
+_manager: Optional[MongoConnectionManager] = None
+
+
+def get_connection_manager() -> MongoConnectionManager:
+    """Get or create the process-wide connection manager."""
+    global _manager
+    if _manager is None:
+        _manager = MongoConnectionManager()
+    return _manager
+
+
+async def get_database() -> StorageBackend:
+    """Get the process-wide database handle."""
+    return await get_connection_manager().get_database()
+
+
+async def get_write_buffer() -> WriteBehindBuffer:
+    """Get the process-wide write-behind buffer for low-criticality writes."""
+    return await get_connection_manager().get_write_buffer()
+
+
+def set_database(database: StorageBackend) -> None:
+    """Replace the process-wide database handle, e.g. with an in-memory backend."""
+    get_connection_manager().set_database(database)
+
+
+async def close_database() -> None:
+    """Close the process-wide client, typically from a shutdown callback."""
+    if _manager is not None:
+        await _manager.close()
@@ -0,0 +1,259 @@
+"""
+Content-based product recommendations from ingredients and dietary labels.
+
+What a customer wishlists and orders says what they like: dates and jaggery, vegan, no
+added sugar. ``ContentRecommender`` turns every product's ``ingredients`` and
+``dietary_info`` into a TF-IDF vector when the catalog snapshot loads, kept as one CSR
+matrix in NumPy arrays (plus a dense float32 copy when the feature vocabulary is small
+enough for it to fit ``DENSE_MATRIX_BYTES``, which multiplies several times faster). A
+recommendation sums the rows of the customer's products into a profile vector, scores
+the whole catalog against it with one matrix-vector product, masks out filtered and already chosen products and takes the top k with
+``np.argpartition``. The cost is one pass over the matrix, however long the customer's
+history is.
+
+Catalog changes between reloads deactivate the product's row and keep the new version
+in a small overflow that is scored separately; the next snapshot reload builds them
+into the matrix.
+"""
+import logging
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from product_search import ingredient_terms, label_key
+
+logger = logging.getLogger(__name__)
+
+# Share of the score given to rating, which breaks ties between equally similar products
+RATING_WEIGHT = 0.05
+MAX_RATING = 5.0
+# Largest matrix also kept dense for the matrix-vector product
+DENSE_MATRIX_BYTES = 64 * 1024 * 1024
+
+# Feature indices and weights of one product row
+Row = Tuple[np.ndarray, np.ndarray]
+
+
+def product_features(product: Dict[str, Any]) -> List[str]:
+    """
+    List the content features of a product.
+
+    Ingredients contribute their terms, so "California Walnuts" and "Walnuts" overlap;
+    dietary labels contribute whole, normalized labels.
+
+    Args:
+        product (Dict): Product document
+
+    Returns:
+        List[str]: Distinct features such as ``ingredient:walnut`` and ``dietary:vegan``
+    """
+    features = []
+    ingredients = product.get('ingredients')
+    if isinstance(ingredients, list):
+        for ingredient in ingredients:
+            if isinstance(ingredient, str):
+                features.extend(f"ingredient:{term}" for term in ingredient_terms(ingredient))
+    dietary = product.get('dietary_info')
+    for label in dietary if isinstance(dietary, list) else [dietary]:
+        key = label_key(label)
+        if key:
+            features.append(f"dietary:{key}")
+    return list(dict.fromkeys(features))
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else math.nan
+
+
+class ContentRecommender:
+    """
+    TF-IDF matrix over product content, with the price, stock, category and rating
+    arrays that recommendation filters and ranking need.
+    """
+
+    def __init__(self, products: Iterable[Dict[str, Any]] = ()):
+        """
+        Build the matrix.
+
+        Args:
+            products (Iterable[Dict]): Product documents; the last one wins for a repeated product_id
+        """
+        documents = {product['product_id']: product for product in products if product.get('product_id')}
+        self._ids: List[str] = list(documents)
+        self._rows: Dict[str, int] = {product_id: row for row, product_id in enumerate(self._ids)}
+        self._features: Dict[str, int] = {}
+        self._categories: Dict[str, int] = {}
+
+        indptr = [0]
+        indices: List[int] = []
+        prices, in_stock, categories, ratings = [], [], [], []
+        for product in documents.values():
+            indices.extend(sorted({self._features.setdefault(feature, len(self._features))
+                                   for feature in product_features(product)}))
+            indptr.append(len(indices))
+            prices.append(_number(product.get('price')))
+            in_stock.append(bool(product.get('in_stock')))
+            categories.append(self._categories.setdefault(label_key(product.get('category')),
+                                                          len(self._categories)))
+            ratings.append(_number(product.get('rating')))
+
+        count = len(self._ids)
+        self._indptr = np.array(indptr, dtype=np.int64)
+        self._indices = np.array(indices, dtype=np.int32)
+        # Row of every stored value, so the matrix-vector product is one bincount
+        self._row_of = np.repeat(np.arange(count, dtype=np.int32), np.diff(self._indptr))
+        document_frequency = np.bincount(self._indices, minlength=len(self._features))
+        self._idf = np.log((1 + count) / (1 + document_frequency)) + 1
+        data = self._idf[self._indices]
+        norms = np.sqrt(np.bincount(self._row_of, weights=data * data, minlength=count))
+        self._data = data / np.where(norms > 0, norms, 1)[self._row_of]
+        self._dense: Optional[np.ndarray] = None
+        if count * len(self._features) * 4 <= DENSE_MATRIX_BYTES:
+            self._dense = np.zeros((count, len(self._features)), dtype=np.float32)
+            self._dense[self._row_of, self._indices] = self._data
+
+        self._price = np.array(prices, dtype=np.float64)
+        self._in_stock = np.array(in_stock, dtype=bool)
+        self._category = np.array(categories, dtype=np.int32)
+        self._rank_bonus = RATING_WEIGHT * np.nan_to_num(np.array(ratings, dtype=np.float64)) / MAX_RATING
+        self._active = np.ones(count, dtype=bool)
+        # Products changed since the build: (row, price, in stock, category key, rank bonus)
+        self._overflow: Dict[str, Tuple[Row, float, bool, str, float]] = {}
+
+    def __len__(self) -> int:
+        return int(self._active.sum()) + len(self._overflow)
+
+    def _vector(self, product: Dict[str, Any]) -> Row:
+        """TF-IDF row of a product outside the matrix; features new since the build are left out."""
+        indices = np.array(sorted({self._features[feature] for feature in product_features(product)
+                                   if feature in self._features}), dtype=np.int32)
+        data = self._idf[indices]
+        norm = np.sqrt(np.dot(data, data))
+        return indices, data / norm if norm > 0 else data
+
+    def _row(self, product_id: str) -> Optional[Row]:
+        if product_id in self._overflow:
+            return self._overflow[product_id][0]
+        row = self._rows.get(product_id)
+        if row is None or not self._active[row]:
+            return None
+        start, end = self._indptr[row], self._indptr[row + 1]
+        return self._indices[start:end], self._data[start:end]
+
+    def update(self, product: Dict[str, Any]) -> None:
+        """
+        Follow an inserted or updated product until the next rebuild.
+
+        Args:
+            product (Dict): Full product document
+        """
+        product_id = product.get('product_id')
+        if not product_id:
+            return
+        self.remove(product_id)
+        rating = _number(product.get('rating'))
+        self._overflow[product_id] = (
+            self._vector(product), _number(product.get('price')), bool(product.get('in_stock')),
+            label_key(product.get('category')),
+            RATING_WEIGHT * (0.0 if math.isnan(rating) else rating) / MAX_RATING,
+        )
+
+    def remove(self, product_id: str) -> None:
+        """Stop recommending a product; unknown IDs are ignored."""
+        self._overflow.pop(product_id, None)
+        row = self._rows.get(product_id)
+        if row is not None:
+            self._active[row] = False
+
+    def profile(self, product_ids: Sequence[str]) -> Optional[np.ndarray]:
+        """
+        Build a customer's taste vector from the products they chose.
+
+        Args:
+            product_ids (Sequence[str]): Wishlisted and ordered products, repeated for more weight
+
+        Returns:
+            Optional[np.ndarray]: Unit-length feature vector, None if none of the products has features
+        """
+        vector = np.zeros(len(self._features), dtype=np.float64)
+        for product_id in product_ids:
+            row = self._row(product_id)
+            if row is not None:
+                np.add.at(vector, row[0], row[1])
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def recommend(self, product_ids: Sequence[str], exclude: Iterable[str] = (),
+                  category: Optional[str] = None, max_price: Optional[float] = None,
+                  in_stock: bool = True, limit: int = 5) -> List[str]:
+        """
+        Rank the catalog by similarity to the products a customer chose.
+
+        Args:
+            product_ids (Sequence[str]): Wishlisted and ordered products
+            exclude (Iterable[str]): Products not to recommend, usually the same ones
+            category (Optional[str]): Category to recommend from, case-insensitive
+            max_price (Optional[float]): Highest price, inclusive
+            in_stock (bool): Only recommend products in stock
+            limit (int): Maximum number of products returned
+
+        Returns:
+            List[str]: Product IDs, most similar first; empty without a usable history
+        """
+        profile = self.profile(product_ids)
+        if profile is None or limit <= 0:
+            return []
+
+        if self._dense is not None:
+            similarity = self._dense @ profile.astype(np.float32)
+        else:
+            similarity = np.bincount(self._row_of, weights=self._data * profile[self._indices],
+                                     minlength=len(self._ids))
+        mask = self._active & (similarity > 0)
+        if in_stock:
+            mask &= self._in_stock
+        if category is not None:
+            mask &= self._category == self._categories.get(label_key(category), -1)
+        if max_price is not None:
+            mask &= self._price <= max_price
+        excluded = set(exclude)
+        for product_id in excluded:
+            row = self._rows.get(product_id)
+            if row is not None:
+                mask[row] = False
+
+        scores = np.where(mask, similarity + self._rank_bonus, -np.inf)
+        if limit < len(scores):
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        ranked = [(-scores[row], self._ids[row]) for row in top.tolist() if mask[row]]
+
+        category_key = label_key(category) if category is not None else None
+        for product_id, ((indices, data), price, stocked, key, bonus) in self._overflow.items():
+            if (product_id in excluded or (in_stock and not stocked)
+                    or (category_key is not None and key != category_key)
+                    or (max_price is not None and not price <= max_price)):
+                continue
+            score = float(np.dot(profile[indices], data))
+            if score > 0:
+                ranked.append((-(score + bonus), product_id))
+        ranked.sort()
+        return [product_id for _, product_id in ranked[:limit]]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get matrix sizes.
+
+        Returns:
+            Dict: Products, features, stored values, whether a dense copy is kept and
+                products changed since the build
+        """
+        return {
+            "products": len(self),
+            "features": len(self._features),
+            "nonzeros": len(self._data),
+            "dense": self._dense is not None,
+            "overflow": len(self._overflow),
+        }
@@ -0,0 +1,401 @@
+"""
+Item-to-item co-purchase recommendations from the orders collection.
+
+"People who ordered X also ordered Y": two products co-occur when they are in the same
+order. ``CoPurchaseBuilder`` counts co-occurrences in a single pass over the orders, and
+each order adds at most ``MAX_ORDER_ITEMS`` squared pairs, so a build is linear in the
+number of orders. ``build_copurchase_index.py`` runs it offline and saves a NumPy
+``.npz`` file holding the full sparse count matrix (CSR) and the top ``NEIGHBORS``
+neighbors of every product; ``--incremental`` reloads the counts and folds in only the
+orders placed since the last build.
+
+Agent workers load just the neighbor lists into a ``CoPurchaseIndex``, add the orders
+they place themselves until the next build, and pick up the file again when a rebuild
+replaces it. Neighbors are ranked by the cosine similarity of their order sets,
+co-orders / sqrt(orders of X * orders of Y), over pairs seen in at least
+``MIN_CO_ORDERS`` orders.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Neighbors kept per product
+NEIGHBORS = 50
+# Distinct products of one order that are paired, bounding the work per order
+MAX_ORDER_ITEMS = 20
+# Orders a pair must share before it is recommended
+MIN_CO_ORDERS = 2
+
+
+def order_products(order: Dict[str, Any]) -> List[str]:
+    """
+    List the distinct products of an order.
+
+    Args:
+        order (Dict): Order document with 'items' holding product_ids
+
+    Returns:
+        List[str]: Product IDs in item order, at most MAX_ORDER_ITEMS
+    """
+    items = order.get('items')
+    product_ids = [item.get('product_id') for item in items if isinstance(item, dict)] \
+        if isinstance(items, list) else []
+    return list(dict.fromkeys(product_id for product_id in product_ids
+                              if isinstance(product_id, str) and product_id))[:MAX_ORDER_ITEMS]
+
+
+def _cosine(co_orders: int, orders: int, other_orders: int) -> float:
+    return co_orders / math.sqrt(orders * other_orders) if orders and other_orders else 0.0
+
+
+class CoPurchaseBuilder:
+    """
+    Full co-occurrence counts, accumulated order by order and saved for the agent.
+    """
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # Row per product: co-ordered product row -> orders containing both
+        self._pairs: List[Dict[int, int]] = []
+        self._orders: List[int] = []
+        self.orders = 0
+        self.last_order_id: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _row(self, product_id: str) -> int:
+        row = self._rows.get(product_id)
+        if row is None:
+            row = self._rows[product_id] = len(self._ids)
+            self._ids.append(product_id)
+            self._pairs.append({})
+            self._orders.append(0)
+        return row
+
+    def add_order(self, product_ids: Sequence[str], order_id: Optional[str] = None) -> None:
+        """
+        Count one order.
+
+        Args:
+            product_ids (Sequence[str]): Distinct products of the order, from order_products()
+            order_id (Optional[str]): Order ID, remembered as the watermark for incremental builds
+        """
+        rows = [self._row(product_id) for product_id in product_ids]
+        for row in rows:
+            self._orders[row] += 1
+            pairs = self._pairs[row]
+            for other in rows:
+                if other != row:
+                    pairs[other] = pairs.get(other, 0) + 1
+        self.orders += 1
+        if order_id is not None:
+            self.last_order_id = order_id
+
+    def _neighbor_lists(self, neighbors: int) -> Tuple[List[int], List[int], List[int]]:
+        """Top neighbors of every row in CSR form: indptr, neighbor rows and co-orders."""
+        indptr, indices, counts = [0], [], []
+        for row, pairs in enumerate(self._pairs):
+            orders = self._orders[row]
+            candidates = [(other, count) for other, count in pairs.items() if count >= MIN_CO_ORDERS]
+            for other, count in heapq.nlargest(neighbors, candidates,
+                                               key=lambda pair: _cosine(pair[1], orders, self._orders[pair[0]])):
+                indices.append(other)
+                counts.append(count)
+            indptr.append(len(indices))
+        return indptr, indices, counts
+
+    def index(self, neighbors: int = NEIGHBORS) -> "CoPurchaseIndex":
+        """
+        Build the serving index in memory, without a file.
+
+        Args:
+            neighbors (int): Neighbors kept per product
+
+        Returns:
+            CoPurchaseIndex: Index over the orders counted so far
+        """
+        return CoPurchaseIndex(self._ids, self._orders, *self._neighbor_lists(neighbors),
+                               orders=self.orders, last_order_id=self.last_order_id)
+
+    def save(self, path: str, neighbors: int = NEIGHBORS) -> Dict[str, int]:
+        """
+        Write the counts and the top neighbors of every product.
+
+        The file is written next to ``path`` and renamed over it, so agents reloading it
+        never see a partial index.
+
+        Args:
+            path (str): Destination .npz file
+            neighbors (int): Neighbors kept per product
+
+        Returns:
+            Dict: Products, orders, stored pairs and stored neighbors
+        """
+        pair_indptr, pair_indices, pair_counts = [0], [], []
+        for pairs in self._pairs:
+            pair_indices.extend(pairs)
+            pair_counts.extend(pairs.values())
+            pair_indptr.append(len(pair_indices))
+        neighbor_indptr, neighbor_indices, neighbor_counts = self._neighbor_lists(neighbors)
+
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as handle:
+            np.savez(
+                handle,
+                product_ids=np.array(self._ids, dtype=str),
+                product_orders=np.array(self._orders, dtype=np.int64),
+                pair_indptr=np.array(pair_indptr, dtype=np.int64),
+                pair_indices=np.array(pair_indices, dtype=np.int32),
+                pair_counts=np.array(pair_counts, dtype=np.int32),
+                neighbor_indptr=np.array(neighbor_indptr, dtype=np.int64),
+                neighbor_indices=np.array(neighbor_indices, dtype=np.int32),
+                neighbor_counts=np.array(neighbor_counts, dtype=np.int32),
+                orders=np.array(self.orders, dtype=np.int64),
+                last_order_id=np.array(self.last_order_id or "", dtype=str),
+            )
+        os.replace(temporary, path)
+        return {"products": len(self._ids), "orders": self.orders,
+                "pairs": len(pair_indices), "neighbors": len(neighbor_indices)}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CoPurchaseBuilder"]:
+        """
+        Load the counts of a saved index to continue it with newer orders.
+
+        Args:
+            path (str): .npz file written by save()
+
+        Returns:
+            Optional[CoPurchaseBuilder]: Builder holding the saved counts, None if the file
+                cannot be read
+        """
+        try:
+            with np.load(path) as saved:
+                builder = cls()
+                builder._ids = saved['product_ids'].tolist()
+                builder._rows = {product_id: row for row, product_id in enumerate(builder._ids)}
+                builder._orders = saved['product_orders'].tolist()
+                indptr = saved['pair_indptr'].tolist()
+                indices = saved['pair_indices'].tolist()
+                counts = saved['pair_counts'].tolist()
+                builder._pairs = [dict(zip(indices[indptr[row]:indptr[row + 1]],
+                                           counts[indptr[row]:indptr[row + 1]]))
+                                  for row in range(len(builder._ids))]
+                builder.orders = int(saved['orders'])
+                builder.last_order_id = str(saved['last_order_id']) or None
+            return builder
+        except Exception as e:
+            logger.error(f"Error loading co-purchase counts from {path}: {e}")
+            return None
+
+
+class CoPurchaseIndex:
+    """
+    Top co-purchased neighbors of every product, plus the orders placed since they were built.
+    """
+
+    def __init__(self, product_ids: Sequence[str] = (), product_orders: Sequence[int] = (),
+                 indptr: Sequence[int] = (0,), indices: Sequence[int] = (), counts: Sequence[int] = (),
+                 orders: int = 0, last_order_id: Optional[str] = None):
+        """
+        Wrap neighbor lists in CSR form.
+
+        Args:
+            product_ids (Sequence[str]): Product of every row
+            product_orders (Sequence[int]): Orders containing each product
+            indptr (Sequence[int]): Start of every row's neighbors, plus the end of the last
+            indices (Sequence[int]): Neighbor rows
+            counts (Sequence[int]): Orders shared with each neighbor
+            orders (int): Orders the lists were built from
+            last_order_id (Optional[str]): Newest order included
+        """
+        self._ids = list(product_ids)
+        self._rows = {product_id: row for row, product_id in enumerate(self._ids)}
+        self._product_orders = np.asarray(product_orders, dtype=np.int64)
+        self._indptr = np.asarray(indptr, dtype=np.int64)
+        self._indices = np.asarray(indices, dtype=np.int32)
+        self._counts = np.asarray(counts, dtype=np.int32)
+        self.orders = orders
+        self.last_order_id = last_order_id
+        # Orders added since the build, so a reloaded index can take them over
+        self._added: List[Tuple[Optional[str], List[str]]] = []
+        self._added_orders: Dict[str, int] = {}
+        self._added_pairs: Dict[str, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids) + sum(1 for product_id in self._added_orders if product_id not in self._rows)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CoPurchaseIndex"]:
+        """
+        Load the neighbor lists of a saved index; the full counts are left on disk.
+
+        Args:
+            path (str): .npz file written by CoPurchaseBuilder.save()
+
+        Returns:
+            Optional[CoPurchaseIndex]: The index, None if the file cannot be read
+        """
+        try:
+            with np.load(path) as saved:
+                return cls(saved['product_ids'].tolist(), saved['product_orders'], saved['neighbor_indptr'],
+                           saved['neighbor_indices'], saved['neighbor_counts'], int(saved['orders']),
+                           str(saved['last_order_id']) or None)
+        except Exception as e:
+            logger.error(f"Error loading co-purchase index from {path}: {e}")
+            return None
+
+    def add_order(self, product_ids: Sequence[str], order_id: Optional[str] = None) -> None:
+        """
+        Follow an order placed since the build.
+
+        Pairs pruned from the neighbor lists at build time count from zero here until the
+        next build restores their full counts.
+
+        Args:
+            product_ids (Sequence[str]): Distinct products of the order, from order_products()
+            order_id (Optional[str]): Order ID
+        """
+        product_ids = list(product_ids)
+        self._added.append((order_id, product_ids))
+        for product_id in product_ids:
+            self._added_orders[product_id] = self._added_orders.get(product_id, 0) + 1
+            pairs = self._added_pairs.setdefault(product_id, {})
+            for other in product_ids:
+                if other != product_id:
+                    pairs[other] = pairs.get(other, 0) + 1
+        self.orders += 1
+
+    def take_over(self, previous: "CoPurchaseIndex") -> None:
+        """
+        Re-add the orders another index followed that are newer than this one's build.
+
+        Args:
+            previous (CoPurchaseIndex): Index this one replaces
+        """
+        for order_id, product_ids in previous._added:
+            # ObjectId hex strings sort by creation time
+            if order_id is None or self.last_order_id is None or order_id > self.last_order_id:
+                self.add_order(product_ids, order_id)
+
+    def _product_orders_of(self, product_id: str) -> int:
+        row = self._rows.get(product_id)
+        base = int(self._product_orders[row]) if row is not None else 0
+        return base + self._added_orders.get(product_id, 0)
+
+    def neighbors(self, product_id: str, limit: int = NEIGHBORS) -> List[Tuple[str, float]]:
+        """
+        Get the products most often ordered together with one product.
+
+        Args:
+            product_id (str): Product ID
+            limit (int): Maximum number of neighbors returned
+
+        Returns:
+            List[Tuple[str, float]]: (product_id, cosine similarity), most similar first
+        """
+        co_orders: Dict[str, int] = {}
+        row = self._rows.get(product_id)
+        if row is not None:
+            start, end = self._indptr[row], self._indptr[row + 1]
+            for other, count in zip(self._indices[start:end].tolist(), self._counts[start:end].tolist()):
+                co_orders[self._ids[other]] = count
+        for other, count in self._added_pairs.get(product_id, {}).items():
+            co_orders[other] = co_orders.get(other, 0) + count
+
+        orders = self._product_orders_of(product_id)
+        scored = [(-_cosine(count, orders, self._product_orders_of(other)), other)
+                  for other, count in co_orders.items() if count >= MIN_CO_ORDERS]
+        return [(other, -score) for score, other in heapq.nsmallest(limit, scored)]
+
+    def recommend(self, product_ids: Sequence[str], exclude: Iterable[str] = (),
+                  limit: int = 5) -> List[str]:
+        """
+        Rank the products co-ordered with a customer's products.
+
+        Args:
+            product_ids (Sequence[str]): Products the customer ordered or wishlisted
+            exclude (Iterable[str]): Products not to recommend, usually the same ones
+            limit (int): Maximum number of products returned
+
+        Returns:
+            List[str]: Product IDs by summed similarity to the customer's products, best
+                first; empty when none of them was ordered with anything
+        """
+        scores: Dict[str, float] = {}
+        for product_id in dict.fromkeys(product_ids):
+            for other, similarity in self.neighbors(product_id):
+                scores[other] = scores.get(other, 0.0) + similarity
+        excluded = set(exclude)
+        ranked = heapq.nsmallest(limit, ((-score, other) for other, score in scores.items()
+                                         if other not in excluded))
+        return [other for _, other in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get index sizes.
+
+        Returns:
+            Dict: Products, stored neighbors, orders counted and orders added since the build
+        """
+        return {
+            "products": len(self),
+            "neighbors": len(self._indices),
+            "orders": self.orders,
+            "added_orders": len(self._added),
+        }
+
+
+_copurchase_index: Optional[CoPurchaseIndex] = None
+_index_path: Optional[str] = None
+_index_mtime: Optional[float] = None
+_checked_at = 0.0
+
+
+async def get_copurchase_index() -> CoPurchaseIndex:
+    """
+    Get the process-wide co-purchase index.
+
+    It is loaded from COPURCHASE_INDEX_PATH (default data/copurchase_index.npz) on first
+    use and loaded again, keeping the orders added since, when a rebuild replaces the
+    file; the file is checked at most every COPURCHASE_RELOAD_SECONDS (default 60).
+    Without a file the index starts empty and follows the orders this process places.
+    """
+    global _copurchase_index, _index_path, _index_mtime, _checked_at
+    if _copurchase_index is None:
+        _copurchase_index = CoPurchaseIndex()
+        _index_path = os.getenv("COPURCHASE_INDEX_PATH", os.path.join("data", "copurchase_index.npz"))
+    now = time.monotonic()
+    if _index_path is None or now - _checked_at < float(os.getenv("COPURCHASE_RELOAD_SECONDS", "60")):
+        return _copurchase_index
+    _checked_at = now
+
+    try:
+        mtime = os.path.getmtime(_index_path)
+    except OSError:
+        return _copurchase_index
+    if mtime != _index_mtime:
+        _index_mtime = mtime
+        loaded = await asyncio.to_thread(CoPurchaseIndex.load, _index_path)
+        if loaded is not None:
+            loaded.take_over(_copurchase_index)
+            _copurchase_index = loaded
+            logger.info(f"Loaded co-purchase index: {loaded.stats()}")
+    return _copurchase_index
+
+
+def set_copurchase_index(index: CoPurchaseIndex) -> None:
+    """Replace the process-wide co-purchase index and stop reloading it from disk, e.g. in benchmarks."""
+    global _copurchase_index, _index_path
+    _copurchase_index = index
+    _index_path = None
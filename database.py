@@ -1,46 +1,529 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, DuplicateKeyError
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+from abc import ABC, abstractmethod
+import base64
 import datetime
+import json
 import logging
 from bson import ObjectId
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 import os
 from dotenv import load_dotenv
 import asyncio
+from contextvars import ContextVar
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from singleflight import SingleFlight, coalesce_reads
+
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class TwiddlesDatabase:
+# Round trips made by the tool call running in the current context (see tool_metrics)
+round_trip_counter: ContextVar[Optional[List[int]]] = ContextVar("round_trip_counter", default=None)
+
+
+def record_round_trip() -> None:
+    """Count one database round trip against the tool call in progress, if any."""
+    counter = round_trip_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+# Single collection holding every user's wishlist, unique on (user_id, product_id)
+WISHLISTS_COLLECTION = "wishlists"
+# Precomputed recommendation list per user, unique on user_id
+RECOMMENDATIONS_COLLECTION = "recommendations"
+
+# Indexes backing every query shape issued by tools.py and prompts.py. Unique keys
+# are partial so legacy documents missing the field do not block index creation.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True,
+                   partialFilterExpression={"user_id": {"$exists": True}}),
+    ],
+    "products": [
+        IndexModel([("product_id", ASCENDING)], name="product_id_unique", unique=True,
+                   partialFilterExpression={"product_id": {"$exists": True}}),
+        IndexModel([("category", ASCENDING), ("in_stock", ASCENDING), ("price", ASCENDING)],
+                   name="category_in_stock_price"),
+        IndexModel([("in_stock", ASCENDING), ("price", ASCENDING)], name="in_stock_price"),
+    ],
+    "orders": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+    ],
+    "feedback": [
+        IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING)], name="product_id_created_at"),
+    ],
+    WISHLISTS_COLLECTION: [
+        IndexModel([("user_id", ASCENDING), ("product_id", ASCENDING)],
+                   name="user_id_product_id_unique", unique=True),
+    ],
+    RECOMMENDATIONS_COLLECTION: [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+}
+
+# Representative (name, collection, filter, sort) for each query shape the tools issue.
+# Unfiltered full-catalog reads are scans by design and are not listed.
+QUERY_SHAPES: List[tuple] = [
+    ("user_profile", "users", {"user_id": "__probe__"}, None),
+    ("user_wishlist", WISHLISTS_COLLECTION, {"user_id": "__probe__"}, None),
+    ("products_in_stock", "products", {"in_stock": True}, None),
+    ("products_in_stock_max_price", "products", {"in_stock": True, "price": {"$lte": 300}}, None),
+    ("products_by_category", "products",
+     {"in_stock": True, "category": "Spreads", "price": {"$lte": 300}}, None),
+    ("user_orders", "orders", {"user_id": "__probe__"}, [("created_at", DESCENDING)]),
+    ("product_feedback", "feedback", {"product_id": "__probe__"}, [("created_at", DESCENDING)]),
+    ("user_recommendations", RECOMMENDATIONS_COLLECTION, {"user_id": "__probe__"}, None),
+]
+
+# Named field projections for product reads. Voice profiles drop fields the agent never
+# speaks (_id, image_url, mrp, brand) so less data crosses the wire and reaches the LLM.
+PROJECTION_PROFILES: Dict[str, Optional[Dict[str, int]]] = {
+    "voice-summary": {
+        "_id": 0, "product_id": 1, "name": 1, "category": 1,
+        "price": 1, "in_stock": 1, "rating": 1,
+    },
+    "voice-detail": {
+        "_id": 0, "product_id": 1, "name": 1, "category": 1, "price": 1, "size": 1,
+        "description": 1, "ingredients": 1, "dietary_info": 1, "in_stock": 1,
+        "rating": 1, "reviews_count": 1,
+    },
+    # What checkout needs to validate, price and reserve an order line
+    "order": {
+        "_id": 0, "product_id": 1, "name": 1, "price": 1, "in_stock": 1, "stock_quantity": 1,
+    },
+    "full": None,
+}
+
+
+def get_projection(profile: str) -> Optional[Dict[str, int]]:
+    """
+    Look up a projection profile.
+    
+    Args:
+        profile (str): Name of a profile in PROJECTION_PROFILES
+        
+    Returns:
+        Optional[Dict[str, int]]: MongoDB projection, None for full documents
+        
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    if profile not in PROJECTION_PROFILES:
+        raise ValueError(f"Unknown projection profile '{profile}', "
+                         f"expected one of {sorted(PROJECTION_PROFILES)}")
+    return PROJECTION_PROFILES[profile]
+
+
+def apply_projection(document: Dict[str, Any], profile: str) -> Dict[str, Any]:
+    """
+    Apply a projection profile to an already-loaded document.
+    
+    Mirrors the server-side projection for data that is served from memory.
+    
+    Args:
+        document (Dict): Full product document
+        profile (str): Name of a profile in PROJECTION_PROFILES
+        
+    Returns:
+        Dict: New document restricted to the profile's fields
+    """
+    projection = get_projection(profile)
+    if projection is None:
+        return dict(document)
+    return {key: document[key] for key, include in projection.items()
+            if include and key in document}
+
+
+# Sentinel for fields absent from a document, distinct from an explicit None
+_MISSING = object()
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    """Evaluate one field condition of a filter against a document value."""
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        for operator, operand in condition.items():
+            if operator == '$exists':
+                if (value is not _MISSING) != bool(operand):
+                    return False
+                continue
+            if value is _MISSING:
+                if operator in ('$ne', '$nin'):
+                    continue
+                return False
+            candidates = value if isinstance(value, list) else [value]
+            if operator == '$eq':
+                matched = operand in candidates or value == operand
+            elif operator == '$ne':
+                matched = operand not in candidates and value != operand
+            elif operator == '$in':
+                matched = any(candidate in operand for candidate in candidates)
+            elif operator == '$nin':
+                matched = not any(candidate in operand for candidate in candidates)
+            elif operator in ('$gt', '$gte', '$lt', '$lte'):
+                matched = any(_compare(candidate, operator, operand) for candidate in candidates)
+            else:
+                raise ValueError(f"Unsupported filter operator '{operator}'")
+            if not matched:
+                return False
+        return True
+    if value is _MISSING:
+        return condition is None
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    try:
+        if operator == '$gt':
+            return value > operand
+        if operator == '$gte':
+            return value >= operand
+        if operator == '$lt':
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+
+def match_document(document: Dict[str, Any], filter_dict: Dict[str, Any]) -> bool:
+    """
+    Evaluate a simple MongoDB filter against an in-memory document.
+
+    Supports top-level fields with equality (including array membership) and the
+    $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin and $exists operators, which covers
+    every filter the tools build.
+
+    Args:
+        document (Dict): Document to test
+        filter_dict (Dict): MongoDB filter criteria
+
+    Returns:
+        bool: True if the document matches
+
+    Raises:
+        ValueError: If the filter uses an unsupported operator
+    """
+    return all(_match_condition(document.get(field, _MISSING), condition)
+               for field, condition in filter_dict.items())
+
+
+# Default and maximum number of products per page for paginated reads
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+
+
+def encode_page_token(last_product_id: str) -> str:
+    """
+    Build an opaque page token pointing after a product.
+    
+    Args:
+        last_product_id (str): product_id of the last item on the current page
+        
+    Returns:
+        str: URL-safe token for the next page
+    """
+    payload = json.dumps({"after": last_product_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_page_token(page_token: str) -> str:
+    """
+    Decode a page token produced by encode_page_token.
+    
+    Args:
+        page_token (str): Token from a previous page
+        
+    Returns:
+        str: product_id the next page starts after
+        
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(page_token.encode("ascii")))
+        return str(payload["after"])
+    except Exception as e:
+        raise ValueError(f"Invalid page token: {page_token!r}") from e
+
+
+class QueryPlanError(Exception):
+    """Raised when a query shape used by the tools is planned as a collection scan."""
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Collect every stage name in an explain() plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def build_wishlist_upsert(user_id: str, item: Dict[str, Any],
+                          now: Optional[datetime.datetime] = None) -> UpdateOne:
+    """
+    Build the upsert for one wishlist item keyed by (user_id, product_id).
+    
+    Args:
+        user_id (str): User identifier
+        item (Dict): Wishlist item, must contain product_id
+        now (Optional[datetime]): Timestamp used for updated_at and a missing added_date
+        
+    Returns:
+        UpdateOne: Upsert operation for the wishlists collection
+    """
+    now = now or datetime.datetime.utcnow()
+    fields = {key: value for key, value in item.items()
+              if key not in ('_id', 'user_id', 'product_id', 'added_date')}
+    fields['updated_at'] = now
+    return UpdateOne(
+        {"user_id": user_id, "product_id": item['product_id']},
+        {
+            "$set": fields,
+            "$setOnInsert": {"added_date": item.get('added_date', now)},
+        },
+        upsert=True
+    )
+
+
+def _is_duplicate_id(write_error: Dict[str, Any]) -> bool:
+    """True for a bulk write error saying a document with the same _id is already stored."""
+    if write_error.get('code') != 11000:
+        return False
+    key_pattern = write_error.get('keyPattern')
+    if key_pattern is not None:
+        return list(key_pattern) == ['_id']
+    return ' index: _id_ ' in write_error.get('errmsg', '')
+
+
+def build_product_upsert(product: Dict[str, Any],
+                         now: Optional[datetime.datetime] = None) -> UpdateOne:
+    """
+    Build the upsert for one catalog product keyed by product_id.
+    
+    A pipeline update moves updated_at only when an imported field differs from the
+    stored value, so re-importing an unchanged product modifies nothing and emits no
+    change event.
+    
+    Args:
+        product (Dict): Product document, must contain product_id
+        now (Optional[datetime]): Timestamp used for updated_at and created_at on insert
+        
+    Returns:
+        UpdateOne: Upsert operation for the products collection
+    """
+    now = now or datetime.datetime.utcnow()
+    fields = {key: value for key, value in product.items() if key not in ('_id', 'created_at', 'updated_at')}
+    changed = {"$or": [{"$ne": [f"${key}", {"$literal": value}]} for key, value in fields.items()]}
+    return UpdateOne(
+        {"product_id": product['product_id']},
+        [
+            # Evaluated against the stored document, before the imported fields are set
+            {"$set": {
+                "updated_at": {"$cond": [changed, now, "$updated_at"]},
+                "created_at": {"$ifNull": ["$created_at", {"$literal": product.get('created_at', now)}]},
+            }},
+            # $literal keeps string values such as "$5 off" from being read as field paths
+            {"$set": {key: {"$literal": value} for key, value in fields.items()}},
+        ],
+        upsert=True
+    )
+
+
+def build_mongodb_uri() -> str:
+    """
+    Build the MongoDB connection URI from environment variables.
+    
+    Returns:
+        str: mongodb+srv URI for the configured cluster
+        
+    Raises:
+        ValueError: If any of the MongoDB environment variables are missing
+    """
+    username = os.getenv("MONGODB_USERNAME")
+    password = os.getenv("MONGODB_PASSWORD")
+    url = os.getenv("MONGODB_URL")
+    
+    if not all([username, password, url]):
+        raise ValueError("Missing required MongoDB environment variables")
+        
+    return f"mongodb+srv://{username}:{password}@{url}/?retryWrites=true&w=majority"
+
+
+class StorageBackend(ABC):
+    """
+    Storage interface used by tools.py, prompts.py and the catalog cache.
+    
+    TwiddlesDatabase is the MongoDB implementation; storage.py provides in-memory and
+    SQLite implementations for running and benchmarking the tool layer without Atlas.
+    Every read returns None and every write returns None/False on error, after logging,
+    matching the behaviour the tools already handle.
+    """
+    
+    def __init__(self):
+        # Identical reads overlapping in time share one query
+        self.single_flight = SingleFlight()
+    
+    @abstractmethod
+    async def connect(self) -> bool:
+        """Open the backend. Returns True if it is usable."""
+    
+    @abstractmethod
+    async def disconnect(self) -> None:
+        """Release the backend's resources."""
+    
+    @abstractmethod
+    async def ensure_indexes(self, collections: Optional[List[str]] = None) -> bool:
+        """Create the lookup indexes the tools rely on. Idempotent."""
+    
+    @abstractmethod
+    async def insert_documents(self, collection_name: str, documents: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """Insert documents into a collection and return their IDs."""
+    
+    @abstractmethod
+    async def upsert_products(self, products: List[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+        """Insert or update products by product_id and return inserted/matched/modified/errors counts."""
+    
+    @abstractmethod
+    async def get_all_products(self, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """Return every product projected with a PROJECTION_PROFILES profile."""
+    
+    @abstractmethod
+    async def get_products_by_filter(self, filter_dict: Dict[str, Any],
+                                     profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """Return products matching a filter."""
+    
+    @abstractmethod
+    def iter_products(self, filter_dict: Optional[Dict[str, Any]] = None,
+                      profile: str = "full",
+                      batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """Stream products matching a filter."""
+    
+    @abstractmethod
+    async def get_products_page(self, filter_dict: Optional[Dict[str, Any]] = None,
+                                profile: str = "full",
+                                page_size: int = DEFAULT_PAGE_SIZE,
+                                page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return one page of products ordered by product_id and the next page token."""
+    
+    @abstractmethod
+    async def get_recommended_products(self, user_id: str, filter_dict: Dict[str, Any],
+                                       limit: int = 5,
+                                       profile: str = "voice-detail") -> Optional[List[Dict[str, Any]]]:
+        """Return top-rated matching products not in the user's wishlist."""
+    
+    @abstractmethod
+    async def get_recent_orders(self, user_id: str, limit: int = 3) -> Optional[List[Dict[str, Any]]]:
+        """Return a user's most recent orders, newest first."""
+    
+    @abstractmethod
+    async def get_session_bootstrap(self, user_id: str, order_limit: int = 3) -> Optional[Dict[str, Any]]:
+        """Return the profile, enriched wishlist and recent orders of a user."""
+    
+    @abstractmethod
+    def iter_orders(self, after_order_id: Optional[str] = None,
+                    batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Stream every order's _id and item product IDs in _id order, after an order ID if given."""
+    
+    @abstractmethod
+    async def create_order(self, order_data: Dict[str, Any]) -> Optional[str]:
+        """Store an order and return its ID."""
+    
+    @abstractmethod
+    async def reserve_stock(self, items: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """Take every item's quantity from stock_quantity, or none. Returns the product IDs short of stock."""
+    
+    @abstractmethod
+    async def release_stock(self, items: List[Dict[str, Any]]) -> bool:
+        """Return reserved quantities to stock_quantity. Returns True if every item was released."""
+    
+    @abstractmethod
+    async def add_feedback(self, feedback_data: Dict[str, Any]) -> Optional[str]:
+        """Store product feedback and return its ID."""
+    
+    @abstractmethod
+    async def get_user_wishlist(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Return a user's wishlist items."""
+    
+    @abstractmethod
+    def iter_user_wishlist(self, user_id: str, batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a user's wishlist items."""
+    
+    @abstractmethod
+    async def add_to_wishlist(self, user_id: str, wishlist_items: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """Upsert wishlist items on (user_id, product_id) and return their product IDs."""
+    
+    @abstractmethod
+    async def get_user_recommendations(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a user's materialized recommendations ('product_ids', 'computed_at'), None if not found."""
+    
+    @abstractmethod
+    async def save_user_recommendations(self, user_id: str, product_ids: List[str],
+                                        computed_at: datetime.datetime) -> bool:
+        """Store a user's recommendations unless a newer list is stored. Returns True if stored."""
+    
+    @abstractmethod
+    async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a user profile, None if not found."""
+    
+    @abstractmethod
+    async def create_user_profile(self, user_data: Dict[str, Any]) -> Optional[str]:
+        """Store a user profile and return its ID."""
+    
+    @abstractmethod
+    async def update_user_profile(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update a user profile. Returns True if a profile was modified."""
+    
+    async def __aenter__(self):
+        """Async context manager entry."""
+        await self.connect()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit - cleanup connection."""
+        await self.disconnect()
+
+
+class TwiddlesDatabase(StorageBackend):
     """
     Database class for managing Twiddles e-commerce data in MongoDB.
     
     Handles connections, CRUD operations for products, orders, feedback, and wishlists.
+    Concurrent identical reads are coalesced into a single query. Inside the agent,
+    instances are obtained from ``connection.get_database()`` so that every module
+    shares one pooled client per worker process.
     """
     
-    def __init__(self, database_name: str = 'Techladder'):
+    def __init__(self, database_name: str = 'Techladder',
+                 client: Optional[AsyncIOMotorClient] = None):
         """
         Initialize database connection.
         
         Args:
             database_name (str): Name of the MongoDB database
+            client (Optional[AsyncIOMotorClient]): Shared client to bind to. When given,
+                the instance does not own the client and never closes it.
         """
+        super().__init__()
         self.database_name = database_name
-        self.client: Optional[AsyncIOMotorClient] = None
+        self.client: Optional[AsyncIOMotorClient] = client
         self.db = None
+        self._owns_client = client is None
         
-        # Get credentials from environment
-        self.username = os.getenv("MONGODB_USERNAME")
-        self.password = os.getenv("MONGODB_PASSWORD")
-        self.url = os.getenv("MONGODB_URL")
-        
-        if not all([self.username, self.password, self.url]):
-            raise ValueError("Missing required MongoDB environment variables")
-            
-        self.uri = f"mongodb+srv://{self.username}:{self.password}@{self.url}/?retryWrites=true&w=majority"
+        if client is not None:
+            self.uri = None
+            self.db = client[database_name]
+        else:
+            self.uri = build_mongodb_uri()
 
     async def connect(self) -> bool:
         """
@@ -50,7 +533,8 @@ class TwiddlesDatabase:
             bool: True if connection successful, False otherwise
         """
         try:
-            self.client = AsyncIOMotorClient(self.uri)
+            if self.client is None:
+                self.client = AsyncIOMotorClient(self.uri)
             # Test connection
             await self.client.admin.command('ping')
             self.db = self.client[self.database_name]
@@ -65,21 +549,28 @@ class TwiddlesDatabase:
             return False
 
     async def disconnect(self) -> None:
-        """Close the MongoDB connection."""
-        if self.client:
+        """Close the MongoDB connection if this instance owns the client."""
+        if self.client and self._owns_client:
             self.client.close()
+            self.client = None
+            self.db = None
             logger.info("MongoDB connection closed")
 
     async def insert_documents(self, collection_name: str, documents: List[Dict[str, Any]]) -> Optional[List[str]]:
         """
         Insert multiple documents into a collection.
         
+        The insert is unordered, so one failing document does not stop the rest. A
+        document whose _id is already stored counts as inserted: retrying a batch that
+        partly landed, or timed out after the server applied it, is safe.
+        
         Args:
             collection_name (str): Name of the collection
-            documents (List[Dict]): List of documents to insert
+            documents (List[Dict]): List of documents to insert; _id is filled in if missing
             
         Returns:
-            Optional[List[str]]: List of inserted document IDs, None if error
+            Optional[List[str]]: IDs of the documents now stored, which may be fewer than
+                the documents passed, None if error
         """
         if self.db is None:
             logger.error("Database not connected")
@@ -88,19 +579,69 @@ class TwiddlesDatabase:
         collection = self.db[collection_name]
         
         try:
-            result = await collection.insert_many(documents)
+            result = await collection.insert_many(documents, ordered=False)
             inserted_ids = [str(id) for id in result.inserted_ids]
             logger.info(f"Successfully inserted {len(inserted_ids)} documents into '{collection_name}'")
             return inserted_ids
             
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            failed = {error['index'] for error in write_errors if not _is_duplicate_id(error)}
+            if failed:
+                logger.error(f"{len(failed)} of {len(documents)} inserts into '{collection_name}' failed, "
+                             f"first error: {write_errors[0].get('errmsg')}")
+            return [str(document['_id']) for index, document in enumerate(documents) if index not in failed]
         except Exception as e:
             logger.error(f"Error inserting documents into '{collection_name}': {e}")
             return None
 
-    async def get_all_products(self) -> Optional[List[Dict[str, Any]]]:
+    async def upsert_products(self, products: List[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+        """
+        Insert or update products by product_id in one unordered bulk write.
+        
+        Args:
+            products (List[Dict]): Product documents, each with a product_id
+            
+        Returns:
+            Optional[Dict[str, int]]: Counts of inserted, matched, modified and failed
+                products, None if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        now = datetime.datetime.utcnow()
+        operations = [build_product_upsert(product, now) for product in products]
+        
+        try:
+            result = await self.db['products'].bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+            errors = 0
+        except BulkWriteError as e:
+            # Unordered: every operation without a write error was still applied
+            details = e.details
+            errors = len(details.get('writeErrors', []))
+            logger.error(f"{errors} of {len(operations)} product upserts failed, "
+                         f"first error: {details['writeErrors'][0].get('errmsg') if errors else None}")
+        except Exception as e:
+            logger.error(f"Error upserting products: {e}")
+            return None
+            
+        return {
+            "inserted": details.get('nUpserted', 0),
+            "matched": details.get('nMatched', 0),
+            "modified": details.get('nModified', 0),
+            "errors": errors,
+        }
+
+    @coalesce_reads
+    async def get_all_products(self, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
         """
         Retrieve all products from the products collection.
         
+        Args:
+            profile (str): Projection profile from PROJECTION_PROFILES
+        
         Returns:
             Optional[List[Dict]]: List of all products, None if error
         """
@@ -109,7 +650,7 @@ class TwiddlesDatabase:
             return None
             
         try:
-            cursor = self.db['products'].find({})
+            cursor = self.db['products'].find({}, get_projection(profile))
             products = await cursor.to_list(length=None)
             logger.info(f"Retrieved {len(products)} products")
             return products
@@ -118,12 +659,15 @@ class TwiddlesDatabase:
             logger.error(f"Error retrieving products: {e}")
             return None
 
-    async def get_products_by_filter(self, filter_dict: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    @coalesce_reads
+    async def get_products_by_filter(self, filter_dict: Dict[str, Any],
+                                     profile: str = "full") -> Optional[List[Dict[str, Any]]]:
         """
         Retrieve products based on filter criteria.
         
         Args:
             filter_dict (Dict): MongoDB filter criteria
+            profile (str): Projection profile from PROJECTION_PROFILES
             
         Returns:
             Optional[List[Dict]]: Filtered products, None if error
@@ -133,7 +677,7 @@ class TwiddlesDatabase:
             return None
             
         try:
-            cursor = self.db['products'].find(filter_dict)
+            cursor = self.db['products'].find(filter_dict, get_projection(profile))
             products = await cursor.to_list(length=None)
             logger.info(f"Retrieved {len(products)} products matching filter")
             return products
@@ -142,6 +686,281 @@ class TwiddlesDatabase:
             logger.error(f"Error retrieving filtered products: {e}")
             return None
 
+    async def iter_products(self, filter_dict: Optional[Dict[str, Any]] = None,
+                            profile: str = "full",
+                            batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream products matching a filter without materializing the result set.
+        
+        Args:
+            filter_dict (Optional[Dict]): MongoDB filter criteria, all products if None
+            profile (str): Projection profile from PROJECTION_PROFILES
+            batch_size (int): Documents fetched per server round trip
+            
+        Yields:
+            Dict: One product at a time
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return
+            
+        cursor = self.db['products'].find(filter_dict or {}, get_projection(profile)).batch_size(batch_size)
+        async for product in cursor:
+            yield product
+
+    async def get_products_page(self, filter_dict: Optional[Dict[str, Any]] = None,
+                                profile: str = "full",
+                                page_size: int = DEFAULT_PAGE_SIZE,
+                                page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve one page of products ordered by product_id.
+        
+        Pages are keyset-paginated on the unique product_id index, so each page costs
+        the same regardless of how deep into the catalog it is.
+        
+        Args:
+            filter_dict (Optional[Dict]): MongoDB filter criteria, all products if None
+            profile (str): Projection profile from PROJECTION_PROFILES
+            page_size (int): Products per page, capped at MAX_PAGE_SIZE
+            page_token (Optional[str]): Token returned with the previous page
+            
+        Returns:
+            Optional[Dict]: 'products' and 'next_page_token' (None on the last page),
+                None if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        try:
+            page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+            query = dict(filter_dict or {})
+            if page_token:
+                query = {"$and": [query, {"product_id": {"$gt": decode_page_token(page_token)}}]}
+                
+            projection = get_projection(profile)
+            if projection is not None and not projection.get('product_id'):
+                projection = {**projection, "product_id": 1}
+            cursor = self.db['products'].find(query, projection).sort("product_id", ASCENDING).limit(page_size + 1)
+            products = await cursor.to_list(length=page_size + 1)
+            
+            next_page_token = None
+            if len(products) > page_size:
+                products = products[:page_size]
+                next_page_token = encode_page_token(products[-1]['product_id'])
+            logger.info(f"Retrieved page of {len(products)} products")
+            return {"products": products, "next_page_token": next_page_token}
+            
+        except Exception as e:
+            logger.error(f"Error retrieving product page: {e}")
+            return None
+
+    @coalesce_reads
+    async def get_recommended_products(self, user_id: str, filter_dict: Dict[str, Any],
+                                       limit: int = 5,
+                                       profile: str = "voice-detail") -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the top-rated products matching a filter that are not in the user's wishlist.
+        
+        Runs as a single aggregation (MongoDB 5.1+ for $documents): the user's wishlisted
+        product IDs are looked up once, then products are matched, anti-joined against
+        them, sorted by rating and limited on the server, so only ``limit`` projected
+        documents cross the wire.
+        
+        Args:
+            user_id (str): User identifier
+            filter_dict (Dict): MongoDB filter criteria for candidate products
+            limit (int): Maximum number of products to return
+            profile (str): Projection profile from PROJECTION_PROFILES
+            
+        Returns:
+            Optional[List[Dict]]: Recommended products ordered by rating, None if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        try:
+            product_pipeline = [
+                {"$match": filter_dict},
+                {"$match": {"$expr": {"$not": [{"$in": ["$product_id", "$$wishlisted"]}]}}},
+                {"$sort": {"rating": -1, "product_id": 1}},
+                {"$limit": limit},
+            ]
+            projection = get_projection(profile)
+            if projection is not None:
+                product_pipeline.append({"$project": projection})
+                
+            pipeline = [
+                {"$documents": [{"user_id": user_id}]},
+                {"$lookup": {
+                    "from": WISHLISTS_COLLECTION,
+                    "localField": "user_id",
+                    "foreignField": "user_id",
+                    "pipeline": [{"$project": {"_id": 0, "product_id": 1}}],
+                    "as": "wishlist",
+                }},
+                {"$lookup": {
+                    "from": "products",
+                    "let": {"wishlisted": "$wishlist.product_id"},
+                    "pipeline": product_pipeline,
+                    "as": "recommended",
+                }},
+                {"$project": {"_id": 0, "recommended": 1}},
+            ]
+            
+            result = await self.db.aggregate(pipeline).to_list(length=1)
+            products = result[0]['recommended'] if result else []
+            logger.info(f"Retrieved {len(products)} recommended products for user {user_id}")
+            return products
+            
+        except Exception as e:
+            logger.error(f"Error retrieving recommendations for user {user_id}: {e}")
+            return None
+
+    @coalesce_reads
+    async def get_recent_orders(self, user_id: str, limit: int = 3) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieve a user's most recent orders, newest first.
+        
+        Args:
+            user_id (str): User identifier
+            limit (int): Maximum number of orders to return
+            
+        Returns:
+            Optional[List[Dict]]: Recent orders, None if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        try:
+            cursor = self.db['orders'].find({"user_id": user_id}).sort("created_at", DESCENDING).limit(limit)
+            orders = await cursor.to_list(length=limit)
+            for order in orders:
+                order['_id'] = str(order['_id'])
+            logger.info(f"Retrieved {len(orders)} recent orders for user {user_id}")
+            return orders
+            
+        except Exception as e:
+            logger.error(f"Error retrieving recent orders for user {user_id}: {e}")
+            return None
+
+    async def iter_orders(self, after_order_id: Optional[str] = None,
+                          batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream all orders in insertion (_id) order, for offline jobs over order history.
+        
+        Only '_id' (as a string) and the product_id of each item are fetched, and the
+        cursor walks the default _id index.
+        
+        Args:
+            after_order_id (Optional[str]): Start after this order ID, from the first order if None
+            batch_size (int): Documents fetched per server round trip
+            
+        Yields:
+            Dict: One order at a time
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return
+            
+        query = {"_id": {"$gt": ObjectId(after_order_id)}} if after_order_id else {}
+        cursor = (self.db['orders'].find(query, {"items.product_id": 1})
+                  .sort("_id", ASCENDING).batch_size(batch_size))
+        async for order in cursor:
+            order['_id'] = str(order['_id'])
+            yield order
+
+    @coalesce_reads
+    async def get_session_bootstrap(self, user_id: str, order_limit: int = 3) -> Optional[Dict[str, Any]]:
+        """
+        Fetch everything the agent needs before its first greeting in one round trip.
+        
+        A single aggregation (MongoDB 5.1+ for $documents) returns the user profile,
+        the wishlist enriched with product name, price and stock, and the last few
+        orders. If the aggregation fails the three reads are issued concurrently and
+        the wishlist is returned without enrichment.
+        
+        Args:
+            user_id (str): User identifier
+            order_limit (int): Number of recent orders to include
+            
+        Returns:
+            Optional[Dict]: Keys 'profile' (None if not found), 'wishlist' and
+                'recent_orders', None if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        pipeline = [
+            {"$documents": [{"user_id": user_id}]},
+            {"$lookup": {
+                "from": "users",
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "pipeline": [{"$limit": 1}],
+                "as": "profile",
+            }},
+            {"$lookup": {
+                "from": WISHLISTS_COLLECTION,
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "pipeline": [
+                    {"$lookup": {
+                        "from": "products",
+                        "localField": "product_id",
+                        "foreignField": "product_id",
+                        "pipeline": [{"$project": {"_id": 0, "name": 1, "price": 1, "in_stock": 1}}],
+                        "as": "product",
+                    }},
+                    {"$set": {"product": {"$first": "$product"}}},
+                    {"$project": {
+                        "_id": 0, "product_id": 1, "quantity_desired": 1, "priority": 1, "added_date": 1,
+                        "name": "$product.name", "price": "$product.price", "in_stock": "$product.in_stock",
+                    }},
+                ],
+                "as": "wishlist",
+            }},
+            {"$lookup": {
+                "from": "orders",
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "pipeline": [
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": order_limit},
+                    {"$project": {"items": 1, "total_amount": 1, "order_status": 1, "created_at": 1}},
+                ],
+                "as": "recent_orders",
+            }},
+            {"$project": {"_id": 0, "profile": {"$first": "$profile"}, "wishlist": 1, "recent_orders": 1}},
+        ]
+        
+        try:
+            result = await self.db.aggregate(pipeline).to_list(length=1)
+            bootstrap = result[0] if result else {"wishlist": [], "recent_orders": []}
+            bootstrap.setdefault('profile', None)
+            
+        except Exception as e:
+            logger.warning(f"Bootstrap aggregation failed for user {user_id}, falling back to concurrent reads: {e}")
+            profile, wishlist, orders = await asyncio.gather(
+                self.get_user_profile(user_id),
+                self.get_user_wishlist(user_id),
+                self.get_recent_orders(user_id, order_limit),
+            )
+            if wishlist is None or orders is None:
+                return None
+            bootstrap = {"profile": profile, "wishlist": wishlist, "recent_orders": orders}
+            
+        if bootstrap['profile'] and '_id' in bootstrap['profile']:
+            bootstrap['profile']['_id'] = str(bootstrap['profile']['_id'])
+        for order in bootstrap['recent_orders']:
+            order['_id'] = str(order['_id'])
+        logger.info(f"Loaded session bootstrap for user {user_id}: "
+                    f"{len(bootstrap['wishlist'])} wishlist items, {len(bootstrap['recent_orders'])} recent orders")
+        return bootstrap
+
     async def create_order(self, order_data: Dict[str, Any]) -> Optional[str]:
         """
         Create a new order.
@@ -170,6 +989,75 @@ class TwiddlesDatabase:
             logger.error(f"Error creating order: {e}")
             return None
 
+    async def _adjust_stock(self, product_id: str, quantity: float) -> bool:
+        """Add quantity to a product's stock_quantity, refusing to go below zero."""
+        # Pipeline update: in_stock follows the remaining quantity in the same atomic write
+        result = await self.db['products'].update_one(
+            {"product_id": product_id, "stock_quantity": {"$gte": -quantity}},
+            [{"$set": {"stock_quantity": {"$add": ["$stock_quantity", quantity]}}},
+             {"$set": {"in_stock": {"$gt": ["$stock_quantity", 0]}}}]
+        )
+        return result.modified_count > 0
+
+    async def reserve_stock(self, items: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """
+        Reserve stock for order lines, all or nothing.
+        
+        Each line is one conditional update that only applies while enough stock is
+        left, so concurrent orders can never oversell. The updates run concurrently,
+        costing one round trip of latency, and lines already reserved are given back
+        if any other line is short.
+        
+        Args:
+            items (List[Dict]): Lines with product_id and quantity, one per product,
+                for products that track stock_quantity
+            
+        Returns:
+            Optional[List[str]]: Product IDs without enough stock (nothing is reserved
+                then), an empty list if everything was reserved, None if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        results = await asyncio.gather(
+            *(self._adjust_stock(item['product_id'], -item['quantity']) for item in items),
+            return_exceptions=True
+        )
+        reserved = [item for item, result in zip(items, results) if result is True]
+        if len(reserved) == len(items):
+            return []
+        if reserved:
+            await self.release_stock(reserved)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.error(f"Error reserving stock: {errors[0]}")
+            return None
+        return [item['product_id'] for item, result in zip(items, results) if result is not True]
+
+    async def release_stock(self, items: List[Dict[str, Any]]) -> bool:
+        """
+        Give reserved stock back, e.g. when the order could not be stored.
+        
+        Args:
+            items (List[Dict]): Lines with product_id and quantity that were reserved
+            
+        Returns:
+            bool: True if every line was released, False if error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return False
+            
+        results = await asyncio.gather(
+            *(self._adjust_stock(item['product_id'], item['quantity']) for item in items),
+            return_exceptions=True
+        )
+        failed = [item['product_id'] for item, result in zip(items, results) if result is not True]
+        if failed:
+            logger.error(f"Error releasing reserved stock for products {failed}")
+        return not failed
+
     async def add_feedback(self, feedback_data: Dict[str, Any]) -> Optional[str]:
         """
         Add user feedback.
@@ -198,6 +1086,7 @@ class TwiddlesDatabase:
             logger.error(f"Error adding feedback: {e}")
             return None
 
+    @coalesce_reads
     async def get_user_wishlist(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
         """
         Retrieve user's wishlist.
@@ -212,10 +1101,8 @@ class TwiddlesDatabase:
             logger.error("Database not connected")
             return None
             
-        collection_name = f"{user_id}_wishlist"
-        
         try:
-            cursor = self.db[collection_name].find({})
+            cursor = self.db[WISHLISTS_COLLECTION].find({"user_id": user_id})
             wishlist = await cursor.to_list(length=None)
             logger.info(f"Retrieved {len(wishlist)} wishlist items for user {user_id}")
             return wishlist
@@ -224,20 +1111,183 @@ class TwiddlesDatabase:
             logger.error(f"Error retrieving wishlist for user {user_id}: {e}")
             return None
 
+    async def iter_user_wishlist(self, user_id: str,
+                                 batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a user's wishlist items without materializing the result set.
+        
+        Args:
+            user_id (str): User identifier
+            batch_size (int): Documents fetched per server round trip
+            
+        Yields:
+            Dict: One wishlist item at a time
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return
+            
+        cursor = self.db[WISHLISTS_COLLECTION].find({"user_id": user_id}).batch_size(batch_size)
+        async for item in cursor:
+            yield item
+
     async def add_to_wishlist(self, user_id: str, wishlist_items: List[Dict[str, Any]]) -> Optional[List[str]]:
         """
         Add items to user's wishlist.
         
+        Items are upserted on (user_id, product_id), so adding a product that is
+        already wishlisted updates it instead of creating a duplicate.
+        
         Args:
             user_id (str): User identifier
-            wishlist_items (List[Dict]): Items to add to wishlist
+            wishlist_items (List[Dict]): Items to add to wishlist, each with a product_id
             
         Returns:
-            Optional[List[str]]: List of inserted item IDs, None if error
+            Optional[List[str]]: Product IDs of the stored items, None if error
         """
-        collection_name = f"{user_id}_wishlist"
-        return await self.insert_documents(collection_name, wishlist_items)
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        if not wishlist_items or any(not item.get('product_id') for item in wishlist_items):
+            logger.error(f"Wishlist items for user {user_id} must each have a product_id")
+            return None
+            
+        now = datetime.datetime.utcnow()
+        operations = [build_wishlist_upsert(user_id, item, now) for item in wishlist_items]
+        
+        try:
+            result = await self.db[WISHLISTS_COLLECTION].bulk_write(operations, ordered=False)
+            logger.info(
+                f"Upserted {len(operations)} wishlist items for user {user_id} "
+                f"({result.upserted_count} new, {result.modified_count} updated)"
+            )
+            return [item['product_id'] for item in wishlist_items]
+            
+        except Exception as e:
+            logger.error(f"Error adding wishlist items for user {user_id}: {e}")
+            return None
 
+    async def ensure_indexes(self, collections: Optional[List[str]] = None) -> bool:
+        """
+        Create the indexes listed in INDEX_SPECS.
+        
+        Idempotent: MongoDB skips indexes that already exist with the same definition,
+        so this runs on every worker start.
+        
+        Args:
+            collections (Optional[List[str]]): Restrict to these collections, all if None
+            
+        Returns:
+            bool: True if every index exists, False if any creation failed
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return False
+            
+        success = True
+        for collection_name, indexes in INDEX_SPECS.items():
+            if collections is not None and collection_name not in collections:
+                continue
+            try:
+                names = await self.db[collection_name].create_indexes(indexes)
+                logger.info(f"Ensured indexes on '{collection_name}': {names}")
+            except Exception as e:
+                logger.error(f"Error creating indexes on '{collection_name}': {e}")
+                success = False
+        return success
+
+    async def verify_query_plans(self, raise_on_collscan: bool = True) -> Dict[str, List[str]]:
+        """
+        Run explain() on every query shape in QUERY_SHAPES.
+        
+        Args:
+            raise_on_collscan (bool): Raise QueryPlanError if any winning plan is a COLLSCAN
+            
+        Returns:
+            Dict[str, List[str]]: Winning plan stages per query shape
+            
+        Raises:
+            QueryPlanError: If a shape is planned as a collection scan and raise_on_collscan is set
+        """
+        if self.db is None:
+            raise QueryPlanError("Database not connected")
+            
+        plans = {}
+        collscans = []
+        for name, collection_name, filter_dict, sort in QUERY_SHAPES:
+            cursor = self.db[collection_name].find(filter_dict)
+            if sort:
+                cursor = cursor.sort(sort)
+            explanation = await cursor.explain()
+            stages = _plan_stages(explanation.get('queryPlanner', {}).get('winningPlan', {}))
+            plans[name] = stages
+            if 'COLLSCAN' in stages:
+                collscans.append(name)
+                logger.error(f"Query shape '{name}' on '{collection_name}' is a COLLSCAN: {stages}")
+            else:
+                logger.info(f"Query shape '{name}' on '{collection_name}' uses plan {stages}")
+                
+        if collscans and raise_on_collscan:
+            raise QueryPlanError(f"Collection scans detected for query shapes: {', '.join(collscans)}")
+        return plans
+
+    @coalesce_reads
+    async def get_user_recommendations(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve a user's materialized recommendation list.
+        
+        Args:
+            user_id (str): User identifier
+            
+        Returns:
+            Optional[Dict]: 'product_ids', best first, and 'computed_at', None if error or not found
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return None
+            
+        try:
+            return await self.db[RECOMMENDATIONS_COLLECTION].find_one(
+                {"user_id": user_id}, {"_id": 0, "product_ids": 1, "computed_at": 1}
+            )
+        except Exception as e:
+            logger.error(f"Error retrieving recommendations for user {user_id}: {e}")
+            return None
+
+    async def save_user_recommendations(self, user_id: str, product_ids: List[str],
+                                        computed_at: datetime.datetime) -> bool:
+        """
+        Store a user's recommendation list, keeping a newer one if it is already stored.
+        
+        Args:
+            user_id (str): User identifier
+            product_ids (List[str]): Recommended product IDs, best first
+            computed_at (datetime.datetime): When the inputs of the list were read
+            
+        Returns:
+            bool: True if stored, False if a newer list exists or on error
+        """
+        if self.db is None:
+            logger.error("Database not connected")
+            return False
+            
+        try:
+            # Matches only an older list; with a newer one the upsert hits the unique index
+            await self.db[RECOMMENDATIONS_COLLECTION].update_one(
+                {"user_id": user_id, "computed_at": {"$lt": computed_at}},
+                {"$set": {"product_ids": product_ids, "computed_at": computed_at}},
+                upsert=True
+            )
+            return True
+            
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            logger.error(f"Error saving recommendations for user {user_id}: {e}")
+            return False
+
+    @coalesce_reads
     async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve user profile information.
@@ -324,15 +1374,6 @@ class TwiddlesDatabase:
             logger.error(f"Error updating user profile for {user_id}: {e}")
             return False
 
-    async def __aenter__(self):
-        """Async context manager entry."""
-        await self.connect()
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit - cleanup connection."""
-        await self.disconnect()
-
 
 def create_sample_data():
     """Create sample data for testing."""
@@ -558,37 +1599,31 @@ def create_sample_data():
 
 
 async def main():
-    """Main function demonstrating usage."""
+    """
+    Seed the sample users, wishlist and products. Safe to re-run.
+    
+    Larger catalogs are loaded with ``python import_catalog.py <file>``; the sample
+    catalog is also available as data/sample_catalog.jsonl.
+    """
     try:
         # Using async context manager for automatic cleanup
         async with TwiddlesDatabase() as db:
-            # Create sample data
             sample_users, sample_wishlist, sample_products = create_sample_data()
             
-            # Insert sample users
-            user_ids = await db.insert_documents("users", sample_users)
-            if user_ids:
+            # Only insert users that do not exist yet
+            new_users = [user for user in sample_users if await db.get_user_profile(user['user_id']) is None]
+            if new_users:
+                user_ids = await db.insert_documents("users", new_users)
                 print(f"Inserted users with IDs: {user_ids}")
             
-            # # Insert sample products
-            # product_ids = await db.insert_documents("products", sample_products)
-            # if product_ids:
-            #     print(f"Inserted products with IDs: {product_ids}")
+            # Products and wishlist items are upserted, so re-runs update instead of duplicating
+            result = await db.upsert_products(sample_products)
+            if result:
+                print(f"Upserted products: {result['inserted']} inserted, {result['modified']} updated")
             
-            # # Add items to user wishlist
-            # wishlist_ids = await db.add_to_wishlist("user001", sample_wishlist)
-            # if wishlist_ids:
-            #     print(f"Added wishlist items with IDs: {wishlist_ids}")
-            
-            # # Retrieve all products
-            # products = await db.get_all_products()
-            # if products:
-            #     print(f"Found {len(products)} products in database")
-                
-            # # Get user wishlist
-            # wishlist = await db.get_user_wishlist("user001")
-            # if wishlist:
-            #     print(f"User001 has {len(wishlist)} items in wishlist")
+            product_ids = await db.add_to_wishlist("repeat_user_001", sample_wishlist)
+            if product_ids:
+                print(f"Wishlist for repeat_user_001 contains {product_ids}")
                 
             # Test user profile retrieval
             user_profile = await db.get_user_profile("new_user_001")
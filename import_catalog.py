@@ -0,0 +1,325 @@
+"""
+Streaming product catalog import.
+
+Usage:
+    python import_catalog.py catalog.jsonl [--format jsonl|csv] [--batch-size 1000]
+                             [--concurrency 4] [--dry-run] [--diff-limit 20]
+                             [--reject-file rejects.jsonl] [--backend mongo|memory|sqlite]
+
+Rows are read one at a time, validated, and upserted by ``product_id`` with unordered
+bulk writes, several batches in flight at once, so re-running an import never
+duplicates products and catalogs of any size are processed in constant memory.
+``--dry-run`` writes nothing and instead reports which products would be inserted or
+changed, field by field. CSV list columns (ingredients, dietary_info) are separated
+with ``|``.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database import StorageBackend
+from storage import STORAGE_BACKENDS, create_backend
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("product_id", "name", "category", "price")
+NUMBER_FIELDS = ("price", "mrp", "rating")
+INTEGER_FIELDS = ("reviews_count", "stock_quantity")
+BOOLEAN_FIELDS = ("in_stock",)
+LIST_FIELDS = ("ingredients", "dietary_info")
+LIST_SEPARATOR = "|"
+# Bookkeeping fields that never count as a catalog change
+IGNORED_DIFF_FIELDS = ("_id", "created_at", "updated_at")
+
+TRUE_VALUES = {"true", "1", "yes", "y"}
+FALSE_VALUES = {"false", "0", "no", "n"}
+
+
+def read_rows(path: str, file_format: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Stream raw rows from a JSONL or CSV file.
+
+    Args:
+        path (str): Catalog file
+        file_format (str): 'jsonl' or 'csv'
+
+    Yields:
+        Tuple[int, Any]: Line number and the parsed row, or the JSON error message for
+            lines that are not valid JSON
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        if file_format == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, f"invalid JSON: {e}"
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def validate_product(row: Any) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Coerce a raw row into a product document.
+
+    CSV values arrive as strings and are converted to the catalog's types; empty CSV
+    cells are dropped. Unknown columns are kept as they are.
+
+    Args:
+        row (Any): Parsed JSON object or CSV row
+
+    Returns:
+        Tuple[Optional[Dict], List[str]]: The product and an empty list, or None and
+            the validation errors
+    """
+    if not isinstance(row, dict):
+        return None, [row if isinstance(row, str) else "row is not an object"]
+
+    product: Dict[str, Any] = {}
+    errors = []
+    for field, value in row.items():
+        if field is None or value is None or value == "":
+            continue
+        try:
+            if field in NUMBER_FIELDS:
+                if isinstance(value, bool):
+                    raise ValueError(f"not a number: {value!r}")
+                number = float(value)
+                value = int(number) if number.is_integer() and field != "rating" else number
+                if value < 0:
+                    raise ValueError("must not be negative")
+            elif field in INTEGER_FIELDS:
+                value = int(value)
+                if value < 0:
+                    raise ValueError("must not be negative")
+            elif field in BOOLEAN_FIELDS:
+                value = _to_bool(value)
+            elif field in LIST_FIELDS:
+                if isinstance(value, str):
+                    value = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+                elif not isinstance(value, list):
+                    raise ValueError("must be a list")
+            elif isinstance(value, str):
+                value = value.strip()
+        except ValueError as e:
+            errors.append(f"{field}: {e}")
+            continue
+        product[field] = value
+
+    invalid = {error.split(":", 1)[0] for error in errors}
+    for field in REQUIRED_FIELDS:
+        if field not in product and field not in invalid:
+            errors.append(f"{field}: required")
+    if "product_id" in product and not isinstance(product["product_id"], str):
+        errors.append("product_id: must be a string")
+    if "rating" in product and not 0 <= product["rating"] <= 5:
+        errors.append("rating: must be between 0 and 5")
+
+    return (None, errors) if errors else (product, [])
+
+
+def diff_product(existing: Optional[Dict[str, Any]], product: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    """
+    Compare an imported product with the stored one.
+
+    Args:
+        existing (Optional[Dict]): Stored product, None if it does not exist yet
+        product (Dict): Validated product from the import file
+
+    Returns:
+        Dict[str, Tuple]: Changed fields mapped to (stored value, imported value)
+    """
+    existing = existing or {}
+    return {field: (existing.get(field), value) for field, value in product.items()
+            if field not in IGNORED_DIFF_FIELDS and existing.get(field) != value}
+
+
+class CatalogImport:
+    """
+    Validates and upserts a catalog file in concurrent batches.
+    """
+
+    def __init__(self, database: StorageBackend, batch_size: int = 1000, concurrency: int = 4,
+                 dry_run: bool = False, diff_limit: int = 20, reject_file: Optional[str] = None):
+        """
+        Initialize the import.
+
+        Args:
+            database (StorageBackend): Connected storage backend
+            batch_size (int): Products per bulk write
+            concurrency (int): Bulk writes in flight at once
+            dry_run (bool): Report the diff without writing
+            diff_limit (int): Changed products printed in dry-run mode
+            reject_file (Optional[str]): JSONL file receiving rows that fail validation
+        """
+        self.database = database
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.diff_limit = diff_limit
+        self.reject_file = reject_file
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self.counts = {"rows": 0, "valid": 0, "rejected": 0, "duplicates": 0,
+                       "inserted": 0, "matched": 0, "modified": 0, "errors": 0,
+                       "new": 0, "changed": 0, "unchanged": 0}
+        self.diffs: List[Tuple[str, Dict[str, Tuple[Any, Any]]]] = []
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            result = await self.database.upsert_products(batch)
+            if result is None:
+                self.counts["errors"] += len(batch)
+                return
+            for key, value in result.items():
+                self.counts[key] += value
+        finally:
+            self._slots.release()
+
+    async def _diff_batch(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            product_ids = [product["product_id"] for product in batch]
+            stored = await self.database.get_products_by_filter({"product_id": {"$in": product_ids}})
+            if stored is None:
+                self.counts["errors"] += len(batch)
+                return
+            stored_by_id = {product["product_id"]: product for product in stored}
+            for product in batch:
+                existing = stored_by_id.get(product["product_id"])
+                changes = diff_product(existing, product)
+                if existing is None:
+                    self.counts["new"] += 1
+                elif changes:
+                    self.counts["changed"] += 1
+                    if len(self.diffs) < self.diff_limit:
+                        self.diffs.append((product["product_id"], changes))
+                else:
+                    self.counts["unchanged"] += 1
+        finally:
+            self._slots.release()
+
+    async def _submit(self, batch: Dict[str, Dict[str, Any]]) -> None:
+        await self._slots.acquire()
+        products = list(batch.values())
+        work = self._diff_batch(products) if self.dry_run else self._write_batch(products)
+        self._tasks.append(asyncio.ensure_future(work))
+        self._tasks = [task for task in self._tasks if not task.done()]
+
+    async def run(self, path: str, file_format: str) -> Dict[str, Any]:
+        """
+        Import a catalog file.
+
+        Args:
+            path (str): Catalog file
+            file_format (str): 'jsonl' or 'csv'
+
+        Returns:
+            Dict: Row, validation and write counts, elapsed seconds and rows/sec
+        """
+        start = time.perf_counter()
+        rejects = open(self.reject_file, "w", encoding="utf-8") if self.reject_file else None
+        # Keyed by product_id so a product repeated within a batch is written once, last row winning
+        batch: Dict[str, Dict[str, Any]] = {}
+
+        try:
+            for line_number, row in read_rows(path, file_format):
+                self.counts["rows"] += 1
+                product, errors = validate_product(row)
+                if product is None:
+                    self.counts["rejected"] += 1
+                    if self.counts["rejected"] <= 10:
+                        logger.warning(f"Line {line_number} rejected: {'; '.join(errors)}")
+                    if rejects:
+                        rejects.write(json.dumps({"line": line_number, "errors": errors,
+                                                  "row": row}, default=str) + "\n")
+                    continue
+
+                self.counts["valid"] += 1
+                if product["product_id"] in batch:
+                    self.counts["duplicates"] += 1
+                batch[product["product_id"]] = product
+                if len(batch) >= self.batch_size:
+                    await self._submit(batch)
+                    batch = {}
+
+                if self.counts["rows"] % 100000 == 0:
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"{self.counts['rows']} rows read ({self.counts['rows'] / elapsed:.0f} rows/sec)")
+
+            if batch:
+                await self._submit(batch)
+            await asyncio.gather(*self._tasks)
+        finally:
+            if rejects:
+                rejects.close()
+
+        elapsed = time.perf_counter() - start
+        report = {
+            "dry_run": self.dry_run,
+            **self.counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.counts["rows"] / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info(f"Catalog import finished: {report}")
+        return report
+
+
+async def main() -> int:
+    """Parse arguments, run the import and return the process exit code."""
+    parser = argparse.ArgumentParser(description="Import a product catalog, upserting by product_id")
+    parser.add_argument("path", help="Catalog file (JSON Lines or CSV)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="File format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Products per bulk write")
+    parser.add_argument("--concurrency", type=int, default=4, help="Bulk writes in flight at once")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would change without writing")
+    parser.add_argument("--diff-limit", type=int, default=20, help="Changed products to print in dry-run mode")
+    parser.add_argument("--reject-file", help="Write rows failing validation to this JSONL file")
+    parser.add_argument("--backend", choices=STORAGE_BACKENDS,
+                        help="Storage backend (default: TWIDDLES_STORAGE_BACKEND or mongo)")
+    args = parser.parse_args()
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+
+    async with create_backend(args.backend) as db:
+        if not args.dry_run:
+            await db.ensure_indexes(["products"])
+        catalog_import = CatalogImport(db, batch_size=args.batch_size, concurrency=args.concurrency,
+                                       dry_run=args.dry_run, diff_limit=args.diff_limit,
+                                       reject_file=args.reject_file)
+        report = await catalog_import.run(args.path, file_format)
+
+    if args.dry_run:
+        for product_id, changes in catalog_import.diffs:
+            print(f"~ {product_id}: " + ", ".join(f"{field} {old!r} -> {new!r}"
+                                                  for field, (old, new) in changes.items()))
+        print(f"Dry run: {report['new']} new, {report['changed']} changed, {report['unchanged']} unchanged, "
+              f"{report['rejected']} rejected of {report['rows']} rows")
+    else:
+        print(f"Imported {report['valid']} products ({report['inserted']} inserted, {report['modified']} updated, "
+              f"{report['rejected']} rejected, {report['errors']} failed) "
+              f"in {report['elapsed_seconds']}s ({report['rows_per_second']} rows/sec)")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main()))
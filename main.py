@@ -1,8 +1,9 @@
 from dotenv import load_dotenv
+import asyncio
 import os
 import json
 import logging
-from typing import Optional
+from typing import Coroutine, Optional, Set
 
 
 from livekit import agents
@@ -17,9 +18,17 @@ from livekit.plugins import (
     openai
 )
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from catalog_cache import get_catalog_cache
+from connection import get_connection_manager, close_database
+from copurchase import get_copurchase_index
+from recommendations import get_recommendation_refresher
 from prompts import USER_AGENT_INSTRUCTION,NEW_USER_AGENT_INSTRUCTION, get_session_instruction
+from session_cache import SessionToolCache, set_session_cache
+from tool_metrics import get_tool_metrics, instrument_tool, start_metrics_server, start_run
 from tools import (
     get_all_products,
+    search_products,
+    resolve_product_name,
     get_user_wishlist,
     get_product_recommendations,
     submit_product_feedback,
@@ -36,18 +45,53 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# Startup work that nothing awaits; held here so it is not garbage collected mid-run
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _background_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+
+def start_background_task(coro: Coroutine, name: str) -> asyncio.Task:
+    """
+    Run startup work in the background and log it if it fails.
+
+    Args:
+        coro (Coroutine): Work to run
+        name (str): Task name used in the failure log
+
+    Returns:
+        asyncio.Task: The running task
+    """
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+async def cancel_background_tasks() -> None:
+    """Cancel background startup work still running, usable as a job shutdown callback."""
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 
 class Assistant(Agent):
     def __init__(self,user_id:Optional[str]) -> None:
         if not user_id:
             custom_instructions = f"This is a new user"+NEW_USER_AGENT_INSTRUCTION
-            tools = [get_all_products,get_user_wishlist,get_product_recommendations,submit_product_feedback,create_product_order,create_user_profile,add_items_to_wishlist,get_user_info]
+            tools = [get_all_products,search_products,resolve_product_name,get_user_wishlist,get_product_recommendations,submit_product_feedback,create_product_order,create_user_profile,add_items_to_wishlist,get_user_info]
         else:
             custom_instructions = f"The user ID is {user_id}.And the user informaiton is in session instructions"+USER_AGENT_INSTRUCTION
-            tools = [get_all_products,get_user_wishlist,get_product_recommendations,submit_product_feedback,create_product_order,get_user_info,add_items_to_wishlist]
+            tools = [get_all_products,search_products,resolve_product_name,get_user_wishlist,get_product_recommendations,submit_product_feedback,create_product_order,get_user_info,add_items_to_wishlist]
         super().__init__(
             instructions=custom_instructions,
-            tools=tools
+            # Every tool call records latency, round trips, output size and errors
+            tools=[instrument_tool(tool) for tool in tools]
         )
 
 
@@ -149,14 +193,38 @@ async def create_llm_session():
 async def entrypoint(ctx: agents.JobContext):
     try:
         logger.info("Agent starting...")
+        # Open the shared MongoDB pool while the room connection is being set up
+        start_background_task(get_connection_manager().warm_up(), "warm_up")
+        start_background_task(get_catalog_cache().start(), "catalog")
+        # Co-purchase neighbors are read from disk in a thread before the first recommendation
+        start_background_task(get_copurchase_index(), "copurchase")
+        if os.getenv("RECOMMENDATION_REFRESH_ENABLED", "1") != "0":
+            get_recommendation_refresher().start()
+        # Registered first so startup work is cancelled before the stores it uses are closed
+        ctx.add_shutdown_callback(cancel_background_tasks)
+        ctx.add_shutdown_callback(get_catalog_cache().stop)
+        ctx.add_shutdown_callback(get_recommendation_refresher().close)
+        ctx.add_shutdown_callback(close_database)
+        ctx.add_shutdown_callback(get_tool_metrics().close)
         await ctx.connect()
         logger.info("Connected to room successfully")
         
+        # Repeat tool reads in this call are served from here; set before any session task starts
+        session_cache = SessionToolCache.from_env(ctx.room.name)
+        set_session_cache(session_cache)
+        ctx.add_shutdown_callback(session_cache.close)
+        
         metadata = await get_participant_metadata(ctx)
         user_id = metadata.get('user_id', None)
         
         logger.info(f"Agent configured for user_id: {user_id if user_id else "new user"}")
         
+        # Fetch the session bootstrap while the LLM session and room input are set up
+        session_instruction_task = asyncio.create_task(get_session_instruction(user_id))
+        if user_id:
+            # Have a fresh recommendation list stored before the customer asks for one
+            start_background_task(get_recommendation_refresher().prepare(user_id), "prepare_recommendations")
+        
         session = await create_llm_session()
         
         await session.start(
@@ -166,7 +234,7 @@ async def entrypoint(ctx: agents.JobContext):
                 noise_cancellation=noise_cancellation.BVC(),
             ),
         )
-        session_instruction = await get_session_instruction(user_id)
+        session_instruction = await session_instruction_task
         logger.info(f"Session instruction: {session_instruction}")
         
         await session.generate_reply(instructions=session_instruction)
@@ -191,5 +259,9 @@ if __name__ == "__main__":
         logger.error(f"Missing required environment variables: {missing_vars}")
         exit(1)
     
+    # Per-tool metrics merged across job processes, for Prometheus to scrape; job processes
+    # inherit the run, so snapshots of earlier runs are not counted
+    start_run()
+    start_metrics_server(int(os.getenv("TOOL_METRICS_PORT", "9108")))
     logger.info("Starting LiveKit agent worker...")
     agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
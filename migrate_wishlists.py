@@ -0,0 +1,183 @@
+"""
+Migrate legacy per-user ``{user_id}_wishlist`` collections into the single
+``wishlists`` collection.
+
+Usage:
+    python migrate_wishlists.py [--batch-size 500] [--drop-source] [--dry-run]
+
+Documents are copied in ``_id`` order and progress is checkpointed in the
+``migrations`` collection after every batch, so an interrupted run resumes from the
+last completed batch. Items already present in ``wishlists`` are never overwritten.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database import TwiddlesDatabase, WISHLISTS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+LEGACY_SUFFIX = "_wishlist"
+MIGRATIONS_COLLECTION = "migrations"
+MIGRATION_ID = "wishlists_single_collection"
+
+
+class WishlistMigration:
+    """
+    Resumable, batched copy of legacy wishlist collections.
+    """
+
+    def __init__(self, database: TwiddlesDatabase, batch_size: int = 500,
+                 drop_source: bool = False, dry_run: bool = False):
+        """
+        Initialize the migration.
+
+        Args:
+            database (TwiddlesDatabase): Connected database
+            batch_size (int): Number of documents copied per bulk write
+            drop_source (bool): Drop each legacy collection once fully copied
+            dry_run (bool): Only count what would be migrated
+        """
+        self.db = database.db
+        self.batch_size = batch_size
+        self.drop_source = drop_source
+        self.dry_run = dry_run
+        self.documents_migrated = 0
+        self.collections_migrated = 0
+
+    async def _load_checkpoint(self) -> Dict[str, Any]:
+        checkpoint = await self.db[MIGRATIONS_COLLECTION].find_one({"_id": MIGRATION_ID})
+        return checkpoint or {"_id": MIGRATION_ID, "completed": [], "current": None, "last_id": None}
+
+    async def _save_checkpoint(self, update: Dict[str, Any]) -> None:
+        if self.dry_run:
+            return
+        update["updated_at"] = datetime.datetime.utcnow()
+        await self.db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": MIGRATION_ID}, {"$set": update}, upsert=True
+        )
+
+    async def _legacy_collections(self) -> List[str]:
+        names = await self.db.list_collection_names(
+            filter={"name": {"$regex": f"{LEGACY_SUFFIX}$"}}
+        )
+        return sorted(names)
+
+    @staticmethod
+    def _build_operation(user_id: str, document: Dict[str, Any]) -> UpdateOne:
+        fields = {key: value for key, value in document.items()
+                  if key not in ('_id', 'user_id', 'product_id')}
+        if 'added_date' not in fields:
+            # Legacy items without a date were inserted when their ObjectId was minted
+            legacy_id = document['_id']
+            fields['added_date'] = (legacy_id.generation_time.replace(tzinfo=None)
+                                    if isinstance(legacy_id, ObjectId) else datetime.datetime.utcnow())
+        fields['migrated_from'] = f"{user_id}{LEGACY_SUFFIX}"
+        return UpdateOne(
+            {"user_id": user_id, "product_id": document['product_id']},
+            {"$setOnInsert": fields},
+            upsert=True
+        )
+
+    async def _migrate_collection(self, name: str, last_id: Optional[Any]) -> None:
+        user_id = name[:-len(LEGACY_SUFFIX)]
+        source = self.db[name]
+        copied = 0
+        start = time.perf_counter()
+
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = await source.find(query).sort("_id", 1).limit(self.batch_size).to_list(length=self.batch_size)
+            if not batch:
+                break
+
+            operations = [self._build_operation(user_id, document)
+                          for document in batch if document.get('product_id')]
+            skipped = len(batch) - len(operations)
+            if skipped:
+                logger.warning(f"Skipping {skipped} documents without product_id in '{name}'")
+
+            if operations and not self.dry_run:
+                await self.db[WISHLISTS_COLLECTION].bulk_write(operations, ordered=False)
+
+            last_id = batch[-1]['_id']
+            copied += len(operations)
+            self.documents_migrated += len(operations)
+            await self._save_checkpoint({"current": name, "last_id": last_id})
+
+            if len(batch) < self.batch_size:
+                break
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Migrated {copied} items from '{name}' in {elapsed:.2f}s")
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run (or resume) the migration.
+
+        Returns:
+            Dict: Collections and documents migrated, elapsed seconds and docs/sec
+        """
+        start = time.perf_counter()
+        checkpoint = await self._load_checkpoint()
+        completed = set(checkpoint.get("completed", []))
+
+        for name in await self._legacy_collections():
+            if name in completed:
+                continue
+
+            last_id = checkpoint.get("last_id") if checkpoint.get("current") == name else None
+            if last_id is not None:
+                logger.info(f"Resuming '{name}' after _id {last_id}")
+            await self._migrate_collection(name, last_id)
+
+            completed.add(name)
+            self.collections_migrated += 1
+            await self._save_checkpoint({"completed": sorted(completed), "current": None, "last_id": None})
+
+            if self.drop_source and not self.dry_run:
+                await self.db.drop_collection(name)
+                logger.info(f"Dropped legacy collection '{name}'")
+
+        elapsed = time.perf_counter() - start
+        report = {
+            "dry_run": self.dry_run,
+            "collections_migrated": self.collections_migrated,
+            "documents_migrated": self.documents_migrated,
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(self.documents_migrated / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info(f"Wishlist migration finished: {report}")
+        return report
+
+
+async def main():
+    """Parse arguments and run the migration."""
+    parser = argparse.ArgumentParser(description="Move per-user wishlist collections into 'wishlists'")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    parser.add_argument("--drop-source", action="store_true", help="Drop legacy collections once copied")
+    parser.add_argument("--dry-run", action="store_true", help="Count documents without writing")
+    args = parser.parse_args()
+
+    async with TwiddlesDatabase() as db:
+        if db.db is None:
+            logger.error("Database not connected, aborting migration")
+            return
+        if not args.dry_run:
+            await db.ensure_indexes([WISHLISTS_COLLECTION])
+        migration = WishlistMigration(db, batch_size=args.batch_size,
+                                      drop_source=args.drop_source, dry_run=args.dry_run)
+        report = await migration.run()
+        print(f"Migrated {report['documents_migrated']} items from {report['collections_migrated']} collections "
+              f"in {report['elapsed_seconds']}s ({report['documents_per_second']} docs/sec)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
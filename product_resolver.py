@@ -0,0 +1,446 @@
+"""
+Resolution of spoken product names to product IDs.
+
+Speech-to-text with language detection spells the same product differently from one
+call to the next: "orange noir bites" comes back as "orange nwar bytes", "wall nut
+brownie spread" or "ऑरेंज नॉयर बाइट्स". ``ProductNameResolver`` maps such fragments
+to catalog products:
+
+- Devanagari is transliterated to Latin letters (``transliterate()``)
+- every word is reduced to a phonetic key (``phonetic_key()``), a consonant skeleton
+  in which spellings that sound alike agree ("bites", "bytes" and "baaits" are all
+  ``bts``); adjacent words are also keyed together, so "wall nut" finds "walnut"
+- product names are indexed by their keys, and the keys by their letter pairs, so a
+  key one edit away from the spoken one is found without scanning the vocabulary
+- a candidate name scores the share of the spoken words it explains and the share of
+  its own keys, weighted by rarity, that were spoken
+
+Products whose names sound the same are returned together, so the caller can ask which
+one was meant. The catalog cache keeps one resolver per snapshot next to its search
+index and feeds it the same changes.
+"""
+import functools
+import heapq
+import itertools
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from product_search import normalize_term
+
+# A candidate is only accepted on its own above ACCEPT_SCORE, when it explains at least
+# ACCEPT_COVERAGE of the spoken words and leads the next product by ACCEPT_MARGIN
+ACCEPT_SCORE = 0.65
+ACCEPT_COVERAGE = 0.75
+ACCEPT_MARGIN = 0.1
+# Weaker candidates are not worth reading out
+MIN_SCORE = 0.35
+# Keys at least this long may match with edits, shorter ones must match exactly
+FUZZY_MIN_LENGTH = 3
+MIN_KEY_SIMILARITY = 0.6
+# Keys shared by more names than this only add to candidates found through rarer keys;
+# the SHORTLIST_SIZE candidates sharing the most with the fragment are scored in full
+CANDIDATE_LIMIT = 2000
+SHORTLIST_SIZE = 50
+
+# Words around a product name in Hindi, Hinglish and English requests, vowel-folded
+FILLER_WORDS = frozenset({
+    "a", "add", "an", "and", "aur", "bhi", "called", "cart", "chahie", "chahiye", "chaiye", "char",
+    "de", "dedo", "dena", "dijiye", "do", "ek", "five", "for", "four", "get", "give", "haan", "hame",
+    "hamein", "hm", "hmm", "i", "in", "it", "ji", "ka", "ke", "ki", "ko", "like", "me", "mein", "mera",
+    "mere", "meri", "mujhe", "muje", "my", "naam", "nam", "need", "of", "one", "order", "panch",
+    "please", "pls", "plz", "se", "some", "ten", "that", "the", "this", "three", "to", "two", "uh",
+    "um", "vala", "vale", "vali", "vo", "voh", "wala", "wale", "wali", "want", "wishlist", "with",
+    "wo", "woh", "ye", "yeh",
+})
+
+_DEVANAGARI_VOWELS = {
+    "अ": "a", "आ": "aa", "इ": "i", "ई": "ii", "उ": "u", "ऊ": "uu", "ऋ": "ri", "ए": "e", "ऐ": "ai",
+    "ओ": "o", "औ": "au", "ऑ": "o", "ऍ": "e", "ॲ": "a",
+}
+_DEVANAGARI_VOWEL_SIGNS = {
+    "ा": "aa", "ि": "i", "ी": "ii", "ु": "u", "ू": "uu", "ृ": "ri", "े": "e", "ै": "ai", "ो": "o",
+    "ौ": "au", "ॉ": "o", "ॅ": "e",
+}
+_DEVANAGARI_CONSONANTS = {
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n", "च": "ch", "छ": "chh", "ज": "j", "झ": "jh",
+    "ञ": "n", "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n", "त": "t", "थ": "th", "द": "d",
+    "ध": "dh", "न": "n", "प": "p", "फ": "ph", "ब": "b", "भ": "bh", "म": "m", "य": "y", "र": "r",
+    "ल": "l", "व": "v", "श": "sh", "ष": "sh", "स": "s", "ह": "h", "क़": "q", "ख़": "kh", "ग़": "g",
+    "ज़": "z", "ड़": "r", "ढ़": "rh", "फ़": "f", "य़": "y",
+}
+# Consonant plus a separate nukta sign, the form most text arrives in
+_NUKTA_FORMS = {"क": "q", "ग": "g", "ज": "z", "ड": "r", "ढ": "rh", "फ": "f", "य": "y"}
+_NUKTA = "़"
+_VIRAMA = "्"
+_NASALS = {"ँ": "n", "ं": "n"}
+_VISARGA = "ः"
+_DEVANAGARI_DIGITS = {chr(0x0966 + digit): str(digit) for digit in range(10)}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_ID_CHARACTERS = re.compile(r"[^A-Z0-9]")
+_DIGRAPHS = (("chh", "c"), ("ch", "c"), ("sh", "s"), ("ph", "f"), ("kh", "k"), ("gh", "g"),
+             ("bh", "b"), ("dh", "d"), ("th", "t"), ("jh", "j"), ("ck", "k"), ("wh", "w"),
+             ("q", "k"), ("x", "ks"), ("z", "j"))
+_SOFT_C = re.compile(r"c(?=[eiy])")
+_SOFT_G = re.compile(r"g(?=[eiy])")
+# w and v after the first letter are glides ("brownie", "noir" spoken "nwar")
+_GLIDE = re.compile(r"(?<=.)[wv]")
+_INNER_H = re.compile(r"(?<=.)h")
+_VOWELS = re.compile(r"[aeiouy]")
+_REPEATS = re.compile(r"(.)\1+")
+_LONG_VOWELS = (("aa", "a"), ("ee", "i"), ("ii", "i"), ("oo", "u"), ("uu", "u"))
+
+
+def transliterate(text: str) -> str:
+    """
+    Write Devanagari in Latin letters, leaving everything else as is.
+
+    Consonants carry an inherent "a" unless a vowel sign or virama follows; it is
+    dropped at the end of a word, as Hindi does ("नट" is "nat", not "nata").
+
+    Args:
+        text (str): Text in any mix of scripts
+
+    Returns:
+        str: Text with Devanagari replaced by lowercase Latin letters
+    """
+    output: List[str] = []
+    inherent_vowel = False
+    previous = ""
+    for character in text:
+        if character == _NUKTA:
+            if previous in _NUKTA_FORMS:
+                output[-1] = _NUKTA_FORMS[previous]
+            continue
+        if character in _DEVANAGARI_CONSONANTS:
+            if inherent_vowel:
+                output.append("a")
+            output.append(_DEVANAGARI_CONSONANTS[character])
+            inherent_vowel = True
+        elif character in _DEVANAGARI_VOWEL_SIGNS:
+            output.append(_DEVANAGARI_VOWEL_SIGNS[character])
+            inherent_vowel = False
+        elif character == _VIRAMA:
+            inherent_vowel = False
+        elif character in _NASALS or character == _VISARGA or character in _DEVANAGARI_VOWELS:
+            if inherent_vowel:
+                output.append("a")
+            output.append(_NASALS.get(character) or _DEVANAGARI_VOWELS.get(character) or "h")
+            inherent_vowel = False
+        else:
+            # End of a Devanagari word: its final inherent vowel is silent
+            inherent_vowel = False
+            output.append(_DEVANAGARI_DIGITS.get(character, character))
+        previous = character
+    return "".join(output)
+
+
+@functools.lru_cache(maxsize=65536)
+def phonetic_key(word: str) -> str:
+    """
+    Reduce a Latin word to the consonants it sounds like.
+
+    Aspirates lose their "h", soft c and g become "s" and "j", z becomes "j", glides
+    and vowels after the first letter are dropped and repeated letters collapse, so
+    English spellings, Hinglish spellings and transliterated Devanagari agree.
+
+    Args:
+        word (str): Lowercase Latin word
+
+    Returns:
+        str: Phonetic key, starting with "a" for words that start with a vowel
+    """
+    for spelling, sound in _DIGRAPHS:
+        word = word.replace(spelling, sound)
+    word = _SOFT_G.sub("j", _SOFT_C.sub("s", word)).replace("c", "k")
+    word = _INNER_H.sub("", _GLIDE.sub("", word))
+    if not word:
+        return ""
+    first = "a" if word[0] in "aeiouy" else word[0]
+    return _REPEATS.sub(r"\1", first + _VOWELS.sub("", word[1:]))
+
+
+def _fold(word: str) -> str:
+    for spelling, sound in _LONG_VOWELS:
+        word = word.replace(spelling, sound)
+    return word
+
+
+def spoken_words(text: str) -> List[str]:
+    """
+    Split a transcript fragment into the words that can name a product.
+
+    Args:
+        text (str): Transcript fragment in Latin letters, Devanagari or both
+
+    Returns:
+        List[str]: Lowercase Latin words, plurals folded, without quantities and filler words
+    """
+    words = _WORD.findall(transliterate(text).lower())
+    return [normalize_term(word) for word in words if not word.isdigit() and _fold(word) not in FILLER_WORDS]
+
+
+def normalize_product_id(text: str) -> str:
+    """Uppercase a product ID and drop separators, so "tw bt 001" matches "TW-BT-001"."""
+    return _ID_CHARACTERS.sub("", text.upper())
+
+
+def _levenshtein(first: str, second: str) -> int:
+    previous = list(range(len(second) + 1))
+    for i, a in enumerate(first, 1):
+        current = [i]
+        for j, b in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        previous = current
+    return previous[-1]
+
+
+def _pairs(key: str) -> Set[str]:
+    padded = f"^{key}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+# The keys of a product name, in order
+NameKey = Tuple[str, ...]
+
+
+@dataclass
+class NameMatch:
+    """A product whose name matches a spoken fragment."""
+
+    product_id: str
+    name: str
+    # 0..1, 1.0 for an exact product ID
+    score: float
+    # Share of the spoken words the name explains
+    coverage: float
+
+
+@dataclass
+class Resolution:
+    """Result of ProductNameResolver.resolve()."""
+
+    matches: List[NameMatch] = field(default_factory=list)
+    # Set when the best match is clear enough to use without asking
+    product_id: Optional[str] = None
+
+
+class ProductNameResolver:
+    """
+    Phonetic index from product name keys to product IDs.
+
+    Products are indexed by ``product_id``; ``add()`` replaces an existing entry, so the
+    resolver can follow inserts, updates and deletes one document at a time.
+    """
+
+    def __init__(self, products: Iterable[Dict[str, Any]] = ()):
+        """
+        Initialize the resolver.
+
+        Args:
+            products (Iterable[Dict]): Product documents to index
+        """
+        # Names that sound the same share one entry
+        self._names: Dict[NameKey, Set[str]] = {}
+        self._postings: Dict[str, Set[NameKey]] = {}
+        self._pairs: Dict[str, Set[str]] = {}
+        self._ids: Dict[str, str] = {}
+        # Per product: its display name and name key
+        self._entries: Dict[str, Tuple[str, NameKey]] = {}
+        for product in products:
+            self.add(product)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._entries
+
+    def add(self, product: Dict[str, Any]) -> None:
+        """
+        Index a product document, replacing any previous version with the same product_id.
+
+        Args:
+            product (Dict): Product document with product_id and name
+        """
+        product_id = product.get('product_id')
+        if not product_id:
+            return
+        self.remove(product_id)
+        name = product.get('name') if isinstance(product.get('name'), str) else ""
+        words = spoken_words(name) or _WORD.findall(transliterate(name).lower())
+        name_key = tuple(dict.fromkeys(key for key in map(phonetic_key, words) if key))
+        self._entries[product_id] = (name, name_key)
+        self._ids[normalize_product_id(product_id)] = product_id
+        if not name_key:
+            return
+        if name_key not in self._names:
+            self._names[name_key] = set()
+            for key in name_key:
+                if key not in self._postings:
+                    self._postings[key] = set()
+                    for pair in _pairs(key):
+                        self._pairs.setdefault(pair, set()).add(key)
+                self._postings[key].add(name_key)
+        self._names[name_key].add(product_id)
+
+    def remove(self, product_id: str) -> None:
+        """Drop a product from the index; unknown IDs are ignored."""
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        self._ids.pop(normalize_product_id(product_id), None)
+        name_key = entry[1]
+        products = self._names.get(name_key)
+        if products is None:
+            return
+        products.discard(product_id)
+        if products:
+            return
+        del self._names[name_key]
+        for key in name_key:
+            names = self._postings[key]
+            names.discard(name_key)
+            if not names:
+                del self._postings[key]
+                for pair in _pairs(key):
+                    self._pairs[pair].discard(key)
+                    if not self._pairs[pair]:
+                        del self._pairs[pair]
+
+    def _similar_keys(self, key: str) -> Dict[str, float]:
+        """Indexed keys that sound like ``key``, with their similarity."""
+        similar = {key: 1.0} if key in self._postings else {}
+        if len(key) < FUZZY_MIN_LENGTH:
+            return similar
+        pairs = _pairs(key)
+        shared: Dict[str, int] = {}
+        for pair in pairs:
+            for candidate in self._pairs.get(pair, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        for candidate, count in shared.items():
+            longest = max(len(key), len(candidate))
+            # Each edit changes at most two letter pairs
+            if candidate == key or len(candidate) < FUZZY_MIN_LENGTH or count < len(pairs) - 2 * (
+                    longest - math.ceil(MIN_KEY_SIMILARITY * longest)):
+                continue
+            similarity = 1 - _levenshtein(key, candidate) / longest
+            if similarity >= MIN_KEY_SIMILARITY:
+                similar[candidate] = similarity
+        return similar
+
+    def _units(self, words: List[str]) -> List[Tuple[Tuple[int, ...], Dict[str, float]]]:
+        """Spoken words and adjacent word pairs, with the indexed keys each one sounds like."""
+        units = []
+        keys = [phonetic_key(word) for word in words]
+        for position, key in enumerate(keys):
+            if key:
+                units.append(((position,), self._similar_keys(key)))
+        for position in range(len(words) - 1):
+            key = phonetic_key(words[position] + words[position + 1])
+            if key and key not in (keys[position], keys[position + 1]):
+                similar = self._similar_keys(key)
+                if similar:
+                    units.append(((position, position + 1), similar))
+        return units
+
+    def _weight(self, key: str) -> float:
+        """Inverse document frequency of a key over the distinct names."""
+        return math.log(1 + len(self._names) / len(self._postings[key]))
+
+    def _shortlist(self, units: List[Tuple[Tuple[int, ...], Dict[str, float]]]) -> List[NameKey]:
+        """Names sharing the most weight with the spoken keys, the only ones scored in full."""
+        similarities: Dict[str, float] = {}
+        for _, similar in units:
+            for key, similarity in similar.items():
+                similarities[key] = max(similarities.get(key, 0.0), similarity)
+        totals: Dict[NameKey, float] = {}
+        # Rare keys first: they find the candidates, common ones only add to their totals
+        for key in sorted(similarities, key=lambda key: len(self._postings[key])):
+            names = self._postings[key]
+            weight = similarities[key] * self._weight(key)
+            if totals and len(names) > max(len(totals), CANDIDATE_LIMIT):
+                for name_key in totals:
+                    if name_key in names:
+                        totals[name_key] += weight
+            else:
+                for name_key in itertools.islice(names, CANDIDATE_LIMIT):
+                    totals[name_key] = totals.get(name_key, 0.0) + weight
+        return heapq.nlargest(SHORTLIST_SIZE, totals, key=totals.__getitem__)
+
+    def _score(self, name_key: NameKey, units: List[Tuple[Tuple[int, ...], Dict[str, float]]],
+               word_count: int) -> Tuple[float, float]:
+        """Score a name against the spoken units, returning (score, coverage)."""
+        spoken = [0.0] * word_count
+        matched: Dict[str, float] = {}
+        for positions, similar in units:
+            best = 0.0
+            for key in name_key:
+                similarity = similar.get(key, 0.0)
+                if similarity > matched.get(key, 0.0):
+                    matched[key] = similarity
+                best = max(best, similarity)
+            for position in positions:
+                spoken[position] = max(spoken[position], best)
+        weights = [self._weight(key) for key in name_key]
+        covered = sum(weight * matched.get(key, 0.0) for key, weight in zip(name_key, weights)) / sum(weights)
+        coverage = sum(spoken) / word_count
+        return (coverage + covered) / 2, coverage
+
+    def resolve(self, text: str, limit: int = 3) -> Resolution:
+        """
+        Find the products a transcript fragment most likely names.
+
+        Args:
+            text (str): Spoken product name or product ID, in any script
+            limit (int): Maximum number of matches returned
+
+        Returns:
+            Resolution: Best matches first, and the product ID when the best one is clear
+        """
+        product_id = self._ids.get(normalize_product_id(text))
+        if product_id is not None:
+            match = NameMatch(product_id, self._entries[product_id][0], 1.0, 1.0)
+            return Resolution([match], product_id)
+
+        words = spoken_words(text)
+        units = self._units(words)
+        if not units:
+            return Resolution()
+        scored = []
+        for name_key in self._shortlist(units):
+            score, coverage = self._score(name_key, units, len(words))
+            if score >= MIN_SCORE:
+                scored.append((-score, min(self._names[name_key]), coverage, name_key))
+        scored.sort()
+        # One more than returned, to tell whether the best match is clear
+        wanted = max(limit, 2)
+        matches: List[NameMatch] = []
+        for score, _, coverage, name_key in scored:
+            for product_id in heapq.nsmallest(wanted - len(matches), self._names[name_key]):
+                matches.append(NameMatch(product_id, self._entries[product_id][0], round(-score, 3),
+                                         round(coverage, 3)))
+            if len(matches) >= wanted:
+                break
+        if not matches:
+            return Resolution()
+
+        best = matches[0]
+        clear = len(matches) == 1 or best.score - matches[1].score >= ACCEPT_MARGIN
+        accepted = best.score >= ACCEPT_SCORE and best.coverage >= ACCEPT_COVERAGE and clear
+        return Resolution(matches[:limit], best.product_id if accepted else None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get index sizes.
+
+        Returns:
+            Dict: Indexed products, distinct name keys and phonetic keys
+        """
+        return {
+            "products": len(self._entries),
+            "names": len(self._names),
+            "keys": len(self._postings),
+        }
@@ -0,0 +1,439 @@
+"""
+In-memory structured product search.
+
+``ProductSearchIndex`` answers the questions callers actually ask ("spreads under 300",
+"vegan bites with dates") without scanning the catalog:
+
+- an inverted index from name and description terms to product IDs, with a separate
+  one for name terms so products named after the query rank first
+- one set of product IDs per category, dietary label, ingredient term and stock state
+- product IDs sorted by price (then ID), so a price range is two binary searches and a slice
+- product IDs sorted by rating, the tie-breaking order of every result
+
+A search intersects the sets from the most selective one up (all C-level set
+operations) and then takes the best-rated matches, walking the rating order for large
+candidate sets so it can stop after ``limit`` hits. The catalog cache keeps one index
+per snapshot and feeds it every change, so it never needs a rebuild between reloads.
+"""
+import bisect
+import functools
+import heapq
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words that say nothing about which product is meant
+STOP_WORDS = frozenset({
+    "a", "an", "and", "any", "for", "from", "in", "me", "of", "on", "or", "show", "some",
+    "something", "the", "to", "with", "without", "product", "products",
+})
+
+# Searches whose most selective filter matches more products than this walk the rating
+# order (at most WALK_STEPS products) before falling back to intersecting sets
+MATERIALIZE_LIMIT = 2000
+WALK_STEPS = 2000
+
+# \w alone splits Devanagari words at their vowel signs
+_TERM = re.compile(r"[\w\u0900-\u097F]+")
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_term(term: str) -> str:
+    """Lowercase a term and fold simple English plurals ("spreads", "cookies")."""
+    term = term.lower()
+    if len(term) > 4 and term.endswith("ies"):
+        return term[:-3] + "y"
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def tokenize(text: Any) -> List[str]:
+    """
+    Split text into normalized search terms.
+
+    Args:
+        text (Any): Text to split, anything else yields no terms
+
+    Returns:
+        List[str]: Terms in order, stop words removed
+    """
+    if not isinstance(text, str):
+        return []
+    return [normalize_term(term) for term in _TERM.findall(text) if term.lower() not in STOP_WORDS]
+
+
+def label_key(label: Any) -> str:
+    """Normalize a category or dietary label, so "Gluten-free" matches "Gluten Free"."""
+    return _label_key(label) if isinstance(label, str) else ""
+
+
+# Labels and ingredients repeat across the catalog, so their normalization is cached
+@functools.lru_cache(maxsize=16384)
+def _label_key(label: str) -> str:
+    return " ".join(normalize_term(term) for term in _TERM.findall(label))
+
+
+@functools.lru_cache(maxsize=16384)
+def ingredient_terms(ingredient: str) -> Tuple[str, ...]:
+    """Search terms of one ingredient ("California Walnuts" gives "california", "walnut")."""
+    return tuple(tokenize(ingredient))
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+def _labels(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+# Rating order: best rated first, ties broken by review count, then ID
+RankKey = Tuple[float, float, str]
+
+
+@dataclass
+class SearchHits:
+    """Result of ProductSearchIndex.search()."""
+
+    product_ids: List[str]
+    # None when the search stopped early: more products match than were returned
+    total: Optional[int]
+    unmatched_terms: List[str] = field(default_factory=list)
+
+
+class ProductSearchIndex:
+    """
+    Inverted index, facet sets and price and rating orders over product documents.
+
+    Documents are indexed by ``product_id``; ``add()`` replaces an existing entry, so
+    the index can follow inserts, updates and deletes one document at a time.
+    """
+
+    def __init__(self, products: Iterable[Dict[str, Any]] = ()):
+        """
+        Initialize the index.
+
+        Args:
+            products (Iterable[Dict]): Product documents to index
+        """
+        self._terms: Dict[str, Set[str]] = {}
+        self._name_terms: Dict[str, Set[str]] = {}
+        self._categories: Dict[str, Set[str]] = {}
+        self._dietary: Dict[str, Set[str]] = {}
+        self._ingredients: Dict[str, Set[str]] = {}
+        self._in_stock: Dict[bool, Set[str]] = {True: set(), False: set()}
+        self._prices: List[float] = []
+        self._price_ids: List[str] = []
+        self._by_rating: List[RankKey] = []
+        # Per product: every posting it is in, its price entry and its rating entry
+        self._entries: Dict[str, Tuple[List[Set[str]], Optional[float], RankKey]] = {}
+        self.add_all(products)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._entries
+
+    def _price_position(self, price: float, product_id: str) -> int:
+        """Position of (price, product_id) in the price order; equal prices are ordered by ID."""
+        low = bisect.bisect_left(self._prices, price)
+        high = bisect.bisect_right(self._prices, price, low)
+        return bisect.bisect_left(self._price_ids, product_id, low, high)
+
+    def _index(self, product: Dict[str, Any]) -> Optional[Tuple[str, Optional[float], RankKey]]:
+        """Add a product to the term and facet sets; returns its ID, price and rating entry."""
+        product_id = product.get('product_id')
+        if not product_id:
+            return None
+        if product_id in self._entries:
+            self.remove(product_id)
+
+        name_terms = set(tokenize(product.get('name')))
+        keys = [
+            (self._name_terms, name_terms),
+            (self._terms, name_terms.union(tokenize(product.get('description')))),
+            (self._categories, {label_key(product.get('category'))}),
+            (self._dietary, {label_key(label) for label in _labels(product.get('dietary_info') or [])}),
+            (self._ingredients, {term for ingredient in _labels(product.get('ingredients') or [])
+                                 if isinstance(ingredient, str) for term in ingredient_terms(ingredient)}),
+            (self._in_stock, {bool(product.get('in_stock'))}),
+        ]
+        postings: List[Set[str]] = []
+        for index, index_keys in keys:
+            for key in index_keys:
+                if key != "":
+                    ids = index.setdefault(key, set())
+                    ids.add(product_id)
+                    postings.append(ids)
+
+        price = _number(product['price']) if isinstance(product.get('price'), (int, float)) else None
+        rating_key = (-_number(product.get('rating')), -_number(product.get('reviews_count')), product_id)
+        self._entries[product_id] = (postings, price, rating_key)
+        return product_id, price, rating_key
+
+    def add(self, product: Dict[str, Any]) -> None:
+        """
+        Index a product document, replacing any previous version.
+
+        Args:
+            product (Dict): Product document with at least product_id
+        """
+        indexed = self._index(product)
+        if indexed is None:
+            return
+        product_id, price, rating_key = indexed
+        if price is not None:
+            position = self._price_position(price, product_id)
+            self._prices.insert(position, price)
+            self._price_ids.insert(position, product_id)
+        bisect.insort(self._by_rating, rating_key)
+
+    def add_all(self, products: Iterable[Dict[str, Any]]) -> None:
+        """
+        Index many product documents, sorting the price and rating orders once.
+
+        Args:
+            products (Iterable[Dict]): Product documents
+        """
+        # The last version of a product listed twice wins, as with add()
+        latest = {product.get('product_id'): product for product in products}
+        for product in latest.values():
+            self._index(product)
+        by_price = sorted((price, product_id) for product_id, (_, price, _) in self._entries.items()
+                          if price is not None)
+        self._prices = [price for price, _ in by_price]
+        self._price_ids = [product_id for _, product_id in by_price]
+        self._by_rating = sorted(rating_key for _, _, rating_key in self._entries.values())
+
+    def remove(self, product_id: str) -> None:
+        """
+        Drop a product from the index; unknown IDs are ignored.
+
+        Args:
+            product_id (str): Product identifier
+        """
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        postings, price, rating_key = entry
+        for ids in postings:
+            ids.discard(product_id)
+        if price is not None:
+            position = self._price_position(price, product_id)
+            del self._prices[position]
+            del self._price_ids[position]
+        del self._by_rating[bisect.bisect_left(self._by_rating, rating_key)]
+
+    @staticmethod
+    def _intersects(postings: List[Set[str]]) -> bool:
+        """Whether the sets share an element, stopping at the first shared one."""
+        smallest, *rest = sorted(postings, key=len)
+        if any(smallest.isdisjoint(ids) for ids in rest):
+            return False
+        return any(all(product_id in ids for ids in rest) for product_id in smallest)
+
+    def _keyword_postings(self, terms: List[str]) -> Tuple[List[Set[str]], List[str], List[str]]:
+        """Postings of terms some product has all of; the most common terms are dropped until one does."""
+        terms = list(dict.fromkeys(terms))
+        unmatched = []
+        while terms:
+            postings = [self._terms.get(term, set()) for term in terms]
+            if self._intersects(postings):
+                return postings, terms, unmatched
+            # Relax the query by its least informative term, unknown terms first
+            drop = max(range(len(terms)), key=lambda i: (not postings[i], len(postings[i])))
+            unmatched.append(terms.pop(drop))
+        return [set()], [], unmatched
+
+    def _price_range(self, price_bounds: Tuple[float, float]) -> Tuple[int, int]:
+        """Slice of the price order within the inclusive bounds."""
+        low = bisect.bisect_left(self._prices, price_bounds[0])
+        return low, max(low, bisect.bisect_right(self._prices, price_bounds[1]))
+
+    def _walk(self, required: List[Set[str]], price_bounds: Optional[Tuple[float, float]], limit: int,
+              exclude: AbstractSet[str]) -> Optional[Tuple[List[str], Optional[int]]]:
+        """
+        Collect matches in rating order, checking at most WALK_STEPS products.
+
+        Returns:
+            Optional[Tuple[List[str], Optional[int]]]: Up to ``limit`` IDs and the number of
+                matches (None if the walk stopped at ``limit``), or None if the steps ran out
+        """
+        entries = self._entries
+        hits: List[str] = []
+        for steps, (_, _, product_id) in enumerate(self._by_rating):
+            if steps == WALK_STEPS:
+                return None
+            for ids in required:
+                if product_id not in ids:
+                    break
+            else:
+                if price_bounds is not None:
+                    price = entries[product_id][1]
+                    if price is None or not price_bounds[0] <= price <= price_bounds[1]:
+                        continue
+                if product_id in exclude:
+                    continue
+                hits.append(product_id)
+                if len(hits) > limit:
+                    return hits[:limit], None
+        return hits, len(hits) + len(exclude)
+
+    def _walk_pays(self, required: List[Set[str]], price_bounds: Optional[Tuple[float, float]],
+                   limit: int) -> bool:
+        """
+        Whether walking the rating order should find ``limit`` matches within WALK_STEPS.
+
+        Broad filters match many of the best-rated products, so walking beats intersecting
+        sets of tens of thousands of IDs. The number of matches is estimated as if the
+        filters were independent; correlated ones such as words of one name make it an
+        underestimate, which only costs an intersection that is then cheap.
+        """
+        total = len(self._entries)
+        sizes = [len(ids) for ids in required]
+        if price_bounds is not None:
+            low, high = self._price_range(price_bounds)
+            sizes.append(high - low)
+        if not total or min(sizes, default=total) <= MATERIALIZE_LIMIT:
+            return False
+        expected = float(total)
+        for size in sizes:
+            expected *= size / total
+        return expected * WALK_STEPS >= (limit + 1) * total
+
+    def _match(self, required: List[Set[str]], price_bounds: Optional[Tuple[float, float]], limit: int,
+               exclude: AbstractSet[str] = frozenset()) -> Tuple[List[str], Optional[int]]:
+        """
+        Best-rated products in every set of ``required`` and within ``price_bounds``.
+
+        Args:
+            required (List[Set[str]]): Sets a product must be in
+            price_bounds (Optional[Tuple[float, float]]): Inclusive price range, None for any price
+            limit (int): Maximum number of IDs returned
+            exclude (AbstractSet[str]): Matches the caller already returned, skipped
+
+        Returns:
+            Tuple[List[str], Optional[int]]: Up to ``limit`` IDs in rating order and the number
+                of matches, excluded ones included, or None if it was not counted
+        """
+        if self._walk_pays(required, price_bounds, limit):
+            walked = self._walk(sorted(required, key=len), price_bounds, limit, exclude)
+            if walked is not None:
+                return walked
+        candidates = self._candidates(required, price_bounds)
+        return self._best_rated(candidates, limit, exclude), len(candidates)
+
+    def _candidates(self, required: List[Set[str]], price_bounds: Optional[Tuple[float, float]]) -> Set[str]:
+        """Every product in all sets of ``required`` and within ``price_bounds``."""
+        required = sorted(required, key=len)
+        if price_bounds is not None:
+            low, high = self._price_range(price_bounds)
+            if not required or high - low <= len(required[0]):
+                return set(self._price_ids[low:high]).intersection(*required)
+        candidates = required[0].intersection(*required[1:]) if required else set(self._entries)
+        if price_bounds is not None:
+            entries = self._entries
+            candidates = {product_id for product_id in candidates if entries[product_id][1] is not None
+                          and price_bounds[0] <= entries[product_id][1] <= price_bounds[1]}
+        return candidates
+
+    def _best_rated(self, candidates: Set[str], limit: int, exclude: AbstractSet[str]) -> List[str]:
+        """Up to ``limit`` IDs of ``candidates`` not in ``exclude``, in rating order."""
+        if limit <= 0:
+            return []
+        # Walking the rating order finds ``limit`` hits after about limit * N / |candidates|
+        # steps, far fewer than ranking a large candidate set
+        if len(candidates) * len(candidates) >= limit * len(self._entries) * 4:
+            hits = []
+            for _, _, product_id in self._by_rating:
+                if product_id in candidates and product_id not in exclude:
+                    hits.append(product_id)
+                    if len(hits) == limit:
+                        break
+            return hits
+        rank_keys = {product_id: self._entries[product_id][2] for product_id in candidates
+                     if product_id not in exclude}
+        return heapq.nsmallest(limit, rank_keys, key=rank_keys.__getitem__)
+
+    def search(self, query: Optional[str] = None, category: Optional[str] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None,
+               dietary: Iterable[str] = (), ingredients: Iterable[str] = (),
+               in_stock: Optional[bool] = None, limit: int = 5) -> SearchHits:
+        """
+        Find products matching every given filter.
+
+        Args:
+            query (Optional[str]): Keywords matched against name and description; all must
+                                   match, except that terms no product has together with
+                                   the rest are dropped and reported as unmatched
+            category (Optional[str]): Category, case-insensitive
+            min_price (Optional[float]): Lowest price, inclusive
+            max_price (Optional[float]): Highest price, inclusive
+            dietary (Iterable[str]): Dietary labels that must all be present
+            ingredients (Iterable[str]): Ingredients that must all be present
+            in_stock (Optional[bool]): Stock state to require
+            limit (int): Maximum number of IDs returned
+
+        Returns:
+            SearchHits: IDs of the best matches (name matches first, then by rating), the
+                number of matches when it was counted and the query terms that were dropped
+        """
+        required: List[Set[str]] = []
+        if category:
+            required.append(self._categories.get(label_key(category), set()))
+        for label in dietary:
+            required.append(self._dietary.get(label_key(label), set()))
+        for ingredient in ingredients:
+            for term in tokenize(ingredient) or [label_key(ingredient)]:
+                required.append(self._ingredients.get(term, set()))
+        if in_stock is not None:
+            required.append(self._in_stock[bool(in_stock)])
+
+        terms = tokenize(query)
+        unmatched: List[str] = []
+        named: List[Set[str]] = []
+        filters = list(required)
+        if terms:
+            postings, terms, unmatched = self._keyword_postings(terms)
+            required.extend(postings)
+            named = [self._name_terms.get(term, set()) for term in terms]
+
+        price_bounds = None
+        if min_price is not None or max_price is not None:
+            price_bounds = (min_price if min_price is not None else float("-inf"),
+                            max_price if max_price is not None else float("inf"))
+
+        # Products named after every query term first, then the other matches
+        tiered = bool(named) and all(named)
+        if not self._walk_pays(required, price_bounds, limit):
+            # Intersect once and split off the name matches
+            candidates = self._candidates(required, price_bounds)
+            in_name = candidates.intersection(*named) if tiered else set()
+            hits = self._best_rated(in_name, limit, frozenset())
+            hits += self._best_rated(candidates, limit - len(hits), in_name)
+            return SearchHits(hits, len(candidates), unmatched)
+
+        # A term's name postings are a subset of its postings, so they replace them here
+        hits = self._match(filters + named, price_bounds, limit)[0] if tiered else []
+        more, total = self._match(required, price_bounds, limit - len(hits), exclude=set(hits))
+        return SearchHits(hits + more, total, unmatched)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get index sizes.
+
+        Returns:
+            Dict: Indexed products, distinct terms, categories, dietary labels and ingredient terms
+        """
+        return {
+            "products": len(self._entries),
+            "terms": len(self._terms),
+            "categories": len(self._categories),
+            "dietary_labels": len(self._dietary),
+            "ingredient_terms": len(self._ingredients),
+        }
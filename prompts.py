@@ -1,6 +1,8 @@
-from database import TwiddlesDatabase
+from connection import get_database, get_write_buffer
+from resilience import get_database_guard
 import logging
-from typing import Optional
+import time
+from typing import Any, Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 USER_AGENT_INSTRUCTION = """You are Elena, a professional female sales representative calling customers on behalf of Twiddles premium healthy snacking brand. You are making outbound calls to existing and potential customers.
@@ -120,11 +122,13 @@ Show genuine interest in their health and preferences
 Be empathetic and understanding
 
 AVAILABLE TOOLS & USAGE
-get_user_info() - Call ONCE at session start with stored user_id
-get_all_products() - Show general product catalog
+get_user_info() - Only if a detail is missing from the session instruction; never at session start
+get_all_products() - Show general product catalog, one page at a time (pass next_page_token to see more)
+search_products() - Find products by keywords, category, price range, dietary needs, ingredients or stock; use this instead of get_all_products when the customer asks for something specific
+resolve_product_name() - Turn the product name the customer said into a product_id before ordering or adding to the wishlist; if it returns no product_id, ask which candidate they meant
 get_product_recommendations() - Personalized suggestions for returning customers
 submit_product_feedback() - Log complaints and feedback
-create_product_order() - Place orders using STORED user information
+create_product_order() - Place orders using STORED user information; it checks stock and prices the order, so read back the total it returns
 get_user_wishlist() - Retrieve saved items
 add_items_to_wishlist() - Add items to wishlist or cart
 EXAMPLE CONVERSATION FLOW
@@ -303,11 +307,13 @@ If (the user want to order a product):
 ## AVAILABLE TOOLS & USAGE FOR NEW CUSTOMERS
 
 - `create_user_profile()`-- Create profile with collected information (phone, name, location, language, email)
--   get_user_info() - Call ONCE at session start with stored user_id
--   get_all_products() - Show general product catalog
+-   get_user_info() - Only if a detail is missing from the session instruction; never at session start
+-   get_all_products() - Show general product catalog, one page at a time (pass next_page_token to see more)
+-   search_products() - Find products by keywords, category, price range, dietary needs, ingredients or stock; use this instead of get_all_products when the customer asks for something specific
+-   resolve_product_name() - Turn the product name the customer said into a product_id before ordering or adding to the wishlist; if it returns no product_id, ask which candidate they meant
 -   get_product_recommendations() - Personalized suggestions for returning customers
 -   submit_product_feedback() - Log complaints and feedback
--   create_product_order() - Place orders using STORED user information
+-   create_product_order() - Place orders using STORED user information; it checks stock and prices the order, so read back the total it returns
 -   get_user_wishlist() - Retrieve saved items
 -   add_items_to_wishlist()-Add items to card or wishlist
 
@@ -350,16 +356,57 @@ If (the user want to order a product):
 
 **Core Identity:** You are Elena - a genuine, caring female sales professional who introduces people to Twiddles premium healthy snacking and helps them make their first confident purchase through education, trust-building, and excellent service."""
 
+def _format_wishlist(wishlist: List[Dict[str, Any]]) -> str:
+    """Render enriched wishlist items as one short line each."""
+    lines = []
+    for item in wishlist:
+        name = item.get('name') or "Product"
+        details = [f"product_id {item.get('product_id')}"]
+        if item.get('price') is not None:
+            details.append(f"price {item['price']}")
+        details.append(f"quantity {item.get('quantity_desired', 1)}")
+        if item.get('in_stock') is False:
+            details.append("out of stock")
+        lines.append(f"{name} ({', '.join(details)})")
+    return "; ".join(lines)
+
+
+def _format_orders(orders: List[Dict[str, Any]]) -> str:
+    """Render recent orders as one short line each."""
+    lines = []
+    for order in orders:
+        items = ", ".join(f"{item.get('product_id')} x {item.get('quantity')}" for item in order.get('items', []))
+        created_at = order.get('created_at')
+        date = created_at.date().isoformat() if hasattr(created_at, 'date') else created_at
+        total = order.get('total_amount')
+        total = f", total {total:g} rupees" if isinstance(total, (int, float)) else ""
+        lines.append(f"order {order.get('_id')} on {date}, status {order.get('order_status', 'unknown')}: "
+                     f"{items}{total}")
+    return "; ".join(lines)
+
+
 async def get_session_instruction(user_id:Optional[str]) -> str:
     """
     Returns the session instruction for the agent.
     This instruction is used to guide the agent's behavior during the session.
+    Profile, wishlist and recent orders are fetched with a single bootstrap query and
+    the time spent in each step is logged to track time-to-first-greeting.
     """
     if user_id:
         try:
-            database = TwiddlesDatabase()
-            await database.connect()
-            user_info = await database.get_user_profile(user_id)
+            start = time.perf_counter()
+            database = await get_database()
+            connected_at = time.perf_counter()
+            
+            async def read_bootstrap():
+                await (await get_write_buffer()).sync_user(user_id)
+                return await database.get_session_bootstrap(user_id)
+            
+            # Bounded so a slow database cannot hold up the first greeting
+            bootstrap = await get_database_guard().call("session_bootstrap", read_bootstrap)
+            queried_at = time.perf_counter()
+            
+            user_info = bootstrap.get('profile') if bootstrap else None
             if not user_info:
                 user_info = {
                     'user_id': user_id,
@@ -370,14 +417,17 @@ async def get_session_instruction(user_id:Optional[str]) -> str:
                     'location': 'Unknown',
                 }
             
-            wishlist = await database.get_user_wishlist(user_id)
+            wishlist = _format_wishlist(bootstrap['wishlist']) if bootstrap else ""
             if not wishlist:
                 wishlist = "New user so he does not have any wishlist items"
+            recent_orders = _format_orders(bootstrap['recent_orders']) if bootstrap else ""
+            if not recent_orders:
+                recent_orders = "No previous orders"
             
             SESSION_INSTRUCTION = f"""
             Current Session Details:
-                User ID: {user_info['user_id']}
-                User Name: {user_info['name']}
+                User ID: {user_info.get('user_id', user_id)}
+                User Name: {user_info.get('name', 'Guest User')}
                 User Email: {user_info.get('email', 'Not available')}
                 User Customer Type: {user_info.get('customer_type', 'new')}
                 User Preferred Language: {user_info.get('preferred_language', 'en')}
@@ -385,7 +435,18 @@ async def get_session_instruction(user_id:Optional[str]) -> str:
 
             Current Cart Status:
                 Products in the user's wishlist: {wishlist}
+
+            Order History:
+                Recent orders: {recent_orders}
             """
+            finished_at = time.perf_counter()
+            logger.info(
+                f"Session bootstrap for {user_id}: "
+                f"get_database={(connected_at - start) * 1000:.1f} ms, "
+                f"bootstrap_query={(queried_at - connected_at) * 1000:.1f} ms, "
+                f"render={(finished_at - queried_at) * 1000:.1f} ms, "
+                f"total={(finished_at - start) * 1000:.1f} ms"
+            )
             return SESSION_INSTRUCTION
         except Exception as e:
             logger.error("Error fetching session instruction: %s", e)
@@ -0,0 +1,397 @@
+"""
+Product recommendations for a customer, computed live or served precomputed.
+
+``live_recommendations`` ranks in three stages: products other customers ordered
+together with the customer's (``copurchase``), products like the ones they chose (the
+catalog cache's content recommender), then top-rated products. That costs a wishlist
+and an order read plus in-memory ranking on every call, so ``RecommendationRefresher``
+precomputes the ranked list of every active customer in the background into the
+``recommendations`` collection, and ``get_product_recommendations`` reads it with one
+indexed lookup and filters it by category, price and stock against the catalog cache.
+
+A stored list is stale, and the tool computes live while a refresh is queued, when it
+is older than the maximum age, than the last wishlist or order change this worker made
+for the customer (a call stays on one worker, so it always sees its own writes), or
+than the catalog cache's last change. Customers served within the active window are
+refreshed again as soon as the catalog changes.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from catalog_cache import get_catalog_cache
+from connection import get_database, get_write_buffer
+from copurchase import get_copurchase_index
+from database import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Recent orders whose items shape a returning customer's recommendations
+RECOMMENDATION_ORDER_HISTORY = 10
+# Co-purchased products ranked before the category, price and stock filters apply
+COPURCHASE_CANDIDATES = 50
+# Products stored per customer, enough for category and price filters to be met from the list
+MATERIALIZED_SIZE = 50
+
+
+def _to_millis(moment: datetime.datetime) -> datetime.datetime:
+    """Truncate to the millisecond precision of BSON dates."""
+    return moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+
+
+async def live_recommendations(db: StorageBackend, user_id: str, category: Optional[str] = None,
+                               max_price: Optional[float] = None, limit: int = 5,
+                               profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+    """
+    Rank recommendations for a customer from their current wishlist and orders.
+
+    Args:
+        db (StorageBackend): Connected storage backend
+        user_id (str): User identifier
+        category (Optional[str]): Category to recommend from
+        max_price (Optional[float]): Highest price, inclusive
+        limit (int): Maximum number of products returned
+        profile (str): Projection profile from database.PROJECTION_PROFILES
+
+    Returns:
+        Optional[List[Dict]]: In-stock products not in the wishlist or past orders, best
+            first, None if the database reads fail
+    """
+    await (await get_write_buffer()).sync_user(user_id)
+    wishlist, orders = await asyncio.gather(
+        db.get_user_wishlist(user_id),
+        db.get_recent_orders(user_id, limit=RECOMMENDATION_ORDER_HISTORY)
+    )
+    wishlisted = [item.get('product_id') for item in wishlist or []]
+    ordered = [item.get('product_id') for order in orders or []
+               for item in order.get('items') or [] if isinstance(item, dict)]
+    recommended = []
+    cache = get_catalog_cache()
+    if ordered:
+        # Repeat customers: what other customers ordered together with their products
+        co_purchased = (await get_copurchase_index()).recommend(
+            ordered + wishlisted, exclude=wishlisted + ordered, limit=max(limit, COPURCHASE_CANDIDATES)
+        )
+        if co_purchased:
+            recommended = await cache.select_products(
+                co_purchased, category=category, max_price=max_price, limit=limit, profile=profile
+            ) or []
+    if (wishlisted or ordered) and len(recommended) < limit:
+        # Ranked against the whole catalog in memory by the cache's content recommender
+        recommended += await cache.recommend_products(
+            wishlisted + ordered,
+            exclude=wishlisted + ordered + [product['product_id'] for product in recommended],
+            category=category, max_price=max_price, limit=limit - len(recommended), profile=profile
+        ) or []
+    if len(recommended) == limit:
+        return recommended
+
+    # New customers, or too few similar products: fill up with the top-rated ones.
+    # Wishlist exclusion, rating sort and limit run on the server; ordered and
+    # already recommended products are skipped here
+    filter_dict: Dict[str, Any] = {'in_stock': True}
+    if category:
+        filter_dict['category'] = category
+    if max_price:
+        filter_dict['price'] = {'$lte': max_price}
+    seen = set(ordered).union(product['product_id'] for product in recommended)
+    top_rated = await db.get_recommended_products(user_id, filter_dict, limit=limit + len(seen), profile=profile)
+    if top_rated is None:
+        return recommended or None
+    top_rated = [product for product in top_rated if product['product_id'] not in seen]
+    return recommended + top_rated[:limit - len(recommended)]
+
+
+class RecommendationRefresher:
+    """
+    Background refresh of materialized recommendation lists for active customers.
+
+    Refreshes are deduplicated per customer and run a few at a time. Until ``start()``
+    is called nothing is scheduled and ``lookup()`` always misses, so scripts and
+    benchmarks compute live unless they opt in.
+    """
+
+    def __init__(self, max_age_seconds: float = 3600.0, active_seconds: float = 3600.0,
+                 poll_interval_seconds: float = 5.0, change_delay_seconds: float = 2.0,
+                 concurrency: int = 4, size: int = MATERIALIZED_SIZE):
+        """
+        Initialize an idle refresher.
+
+        Args:
+            max_age_seconds (float): Age after which a stored list is stale
+            active_seconds (float): How long a customer counts as active after a lookup
+            poll_interval_seconds (float): How often the catalog is checked for changes
+            change_delay_seconds (float): Wait after a wishlist or order change before
+                refreshing, so a burst of changes in one call costs one refresh
+            concurrency (int): Refreshes run at once
+            size (int): Products stored per customer
+        """
+        self.max_age_seconds = max_age_seconds
+        self.active_seconds = active_seconds
+        self.poll_interval = poll_interval_seconds
+        self.change_delay = change_delay_seconds
+        self.concurrency = concurrency
+        self.size = size
+
+        # Insertion-ordered set of customers waiting for a refresh
+        self._pending: Dict[str, None] = {}
+        # Changed customers and the monotonic time their refresh is due
+        self._deferred: Dict[str, float] = {}
+        self._changed_at: Dict[str, datetime.datetime] = {}
+        self._active: Dict[str, float] = {}
+        self._catalog_changed_at: Optional[datetime.datetime] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.catalog_refreshes = 0
+
+    @classmethod
+    def from_env(cls) -> "RecommendationRefresher":
+        """Build a refresher from RECOMMENDATION_MAX_AGE_SECONDS, _ACTIVE_SECONDS and _REFRESH_CONCURRENCY."""
+        return cls(
+            max_age_seconds=float(os.getenv("RECOMMENDATION_MAX_AGE_SECONDS", "3600")),
+            active_seconds=float(os.getenv("RECOMMENDATION_ACTIVE_SECONDS", "3600")),
+            concurrency=int(os.getenv("RECOMMENDATION_REFRESH_CONCURRENCY", "4")),
+        )
+
+    @property
+    def running(self) -> bool:
+        """True while the background refresh task runs."""
+        return self._task is not None and not self._task.done()
+
+    def _get_wake(self) -> asyncio.Event:
+        # Created on first use so the event binds to the worker's running loop
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def start(self) -> None:
+        """Start the background refresh task if it is not running."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    def schedule(self, user_id: str) -> None:
+        """Queue a refresh of a customer's list; ignored until started or while a change-delayed one waits."""
+        if self.running and user_id not in self._deferred:
+            self._pending[user_id] = None
+            self._get_wake().set()
+
+    def user_changed(self, user_id: str) -> None:
+        """
+        Record a wishlist or order change, making the stored list stale, and refresh it
+        once the customer has stopped changing it for ``change_delay_seconds``.
+
+        Args:
+            user_id (str): Customer whose wishlist or orders changed
+        """
+        self._changed_at[user_id] = datetime.datetime.utcnow()
+        if self.running:
+            self._deferred[user_id] = time.monotonic() + self.change_delay
+            self._get_wake().set()
+
+    def is_fresh(self, user_id: str, entry: Dict[str, Any]) -> bool:
+        """
+        Check whether a stored list still reflects the customer and the catalog.
+
+        Args:
+            user_id (str): Customer the list belongs to
+            entry (Dict): Stored list with 'computed_at'
+
+        Returns:
+            bool: False if the list is too old, or older than a change to the customer's
+                wishlist or orders or to the catalog
+        """
+        computed_at = entry.get('computed_at')
+        if not isinstance(computed_at, datetime.datetime):
+            return False
+        if (datetime.datetime.utcnow() - computed_at).total_seconds() > self.max_age_seconds:
+            return False
+        # Stored dates lose sub-millisecond precision, so a change in the same millisecond counts as newer
+        for changed_at in (self._changed_at.get(user_id), get_catalog_cache().changed_at):
+            if changed_at is not None and computed_at <= _to_millis(changed_at):
+                return False
+        return True
+
+    async def lookup(self, user_id: str, category: Optional[str] = None, max_price: Optional[float] = None,
+                     limit: int = 5, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        """
+        Serve a customer's recommendations from their stored list.
+
+        Args:
+            user_id (str): User identifier
+            category (Optional[str]): Category to recommend from, case-insensitive
+            max_price (Optional[float]): Highest price, inclusive
+            limit (int): Maximum number of products returned
+            profile (str): Projection profile from database.PROJECTION_PROFILES
+
+        Returns:
+            Optional[List[Dict]]: Projected in-stock products, best first; None when the list
+                is missing or stale (a refresh is then queued) or holds too few products
+                matching the filters, in which case the caller computes live
+        """
+        if not self.running:
+            return None
+        self._active[user_id] = time.monotonic()
+        entry = await (await get_database()).get_user_recommendations(user_id)
+        if entry is None or not self.is_fresh(user_id, entry):
+            self.misses += 1
+            self.schedule(user_id)
+            return None
+
+        product_ids = entry.get('product_ids') or []
+        products = await get_catalog_cache().select_products(product_ids, category=category, max_price=max_price,
+                                                             limit=limit, profile=profile)
+        # A list shorter than the stored size already holds every candidate, so fewer matches are all there is
+        if products is None or (len(products) < limit and len(product_ids) >= self.size):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return products
+
+    async def prepare(self, user_id: str) -> None:
+        """
+        Mark a customer active at session start and refresh their list if it is missing or stale.
+
+        Args:
+            user_id (str): User identifier
+        """
+        if not self.running:
+            return
+        self._active[user_id] = time.monotonic()
+        try:
+            entry = await (await get_database()).get_user_recommendations(user_id)
+            if entry is None or not self.is_fresh(user_id, entry):
+                self.schedule(user_id)
+        except Exception as e:
+            logger.error(f"Error checking stored recommendations for user {user_id}: {e}")
+
+    async def refresh(self, user_id: str) -> bool:
+        """
+        Recompute and store a customer's list.
+
+        Args:
+            user_id (str): User identifier
+
+        Returns:
+            bool: True if a list was stored
+        """
+        # Taken before the inputs are read, so changes made meanwhile leave the list stale
+        computed_at = _to_millis(datetime.datetime.utcnow())
+        try:
+            db = await get_database()
+            products = await live_recommendations(db, user_id, limit=self.size, profile="voice-summary")
+            if products is None:
+                self.refresh_failures += 1
+                return False
+            stored = await db.save_user_recommendations(
+                user_id, [product['product_id'] for product in products], computed_at
+            )
+            self.refreshes += stored
+            return stored
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"Error refreshing recommendations for user {user_id}: {e}")
+            return False
+
+    def _check_catalog(self) -> None:
+        changed_at = get_catalog_cache().changed_at
+        if changed_at is None or changed_at == self._catalog_changed_at:
+            return
+        first_seen = self._catalog_changed_at is None
+        self._catalog_changed_at = changed_at
+        if not first_seen:
+            self.catalog_refreshes += 1
+            for user_id in self._active:
+                self._pending[user_id] = None
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        self._active = {user_id: seen for user_id, seen in self._active.items()
+                        if now - seen <= self.active_seconds}
+        # Any list older than the maximum age is stale anyway
+        oldest = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.max_age_seconds)
+        self._changed_at = {user_id: changed for user_id, changed in self._changed_at.items() if changed >= oldest}
+
+    def _release_deferred(self) -> float:
+        """Queue changed customers whose delay has passed; returns seconds until the next is due."""
+        now = time.monotonic()
+        timeout = self.poll_interval
+        for user_id, due in list(self._deferred.items()):
+            if due <= now:
+                del self._deferred[user_id]
+                self._pending[user_id] = None
+            else:
+                timeout = min(timeout, due - now)
+        return timeout
+
+    async def _run(self) -> None:
+        wake = self._get_wake()
+        timeout = self.poll_interval
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            timeout = self._release_deferred()
+            self._prune()
+            self._check_catalog()
+            while self._pending:
+                batch = list(self._pending)[:self.concurrency]
+                for user_id in batch:
+                    del self._pending[user_id]
+                await asyncio.gather(*(self.refresh(user_id) for user_id in batch))
+
+    async def close(self) -> None:
+        """Stop the background task; queued refreshes are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._pending.clear()
+        self._deferred.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get refresher counters.
+
+        Returns:
+            Dict: Lookup hits and misses, refreshes, failures, catalog-triggered rounds,
+                queued refreshes and active customers
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "catalog_refreshes": self.catalog_refreshes,
+            "pending": len(self._pending) + len(self._deferred),
+            "active_users": len(self._active),
+        }
+
+
+_refresher: Optional[RecommendationRefresher] = None
+
+
+def get_recommendation_refresher() -> RecommendationRefresher:
+    """Get or create the process-wide recommendation refresher (not started)."""
+    global _refresher
+    if _refresher is None:
+        _refresher = RecommendationRefresher.from_env()
+    return _refresher
+
+
+def set_recommendation_refresher(refresher: RecommendationRefresher) -> None:
+    """Replace the process-wide recommendation refresher, e.g. with one configured for a benchmark."""
+    global _refresher
+    _refresher = refresher
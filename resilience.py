@@ -0,0 +1,280 @@
+"""
+Deadlines, retries and circuit breaking for database calls made inside tools.
+
+A voice turn cannot wait on a stalled database node. Tools run their database work
+through ``DatabaseGuard.call()`` with a latency budget from ``TOOL_BUDGETS_MS``:
+idempotent reads are retried with jittered backoff while the budget lasts, writes
+get a single attempt, and after repeated failures the circuit opens so further calls
+fail immediately with ``DatabaseUnavailable`` and the tool can answer from cache or
+with a degraded message instead.
+
+Work served from the in-process catalog cache runs on a separate "catalog" circuit: a
+slow first catalog load or index build can open it, but never fails orders or
+wishlist writes on the "database" circuit.
+
+Every ``DatabaseUnavailable`` the guard raises is recorded in ``degraded_calls`` for
+the tool call in progress, so ``tool_metrics`` counts the degraded reply as an error,
+unless the caller said it has a fallback that answers in full.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Latency budget per tool for all of its database work, in milliseconds
+TOOL_BUDGETS_MS = {
+    "get_all_products": 1500,
+    "get_user_wishlist": 1200,
+    "get_product_recommendations": 1500,
+    "get_user_info": 1200,
+    "create_product_order": 3000,
+    "session_bootstrap": 2000,
+}
+DEFAULT_BUDGET_MS = 1500
+
+# Guard calls that gave up in the tool call running in the current context (see tool_metrics)
+degraded_calls: ContextVar[Optional[List[str]]] = ContextVar("degraded_calls", default=None)
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when a guarded database call times out, fails or is rejected by an open circuit."""
+
+    def __init__(self, operation: str, reason: str):
+        super().__init__(f"Database unavailable for {operation}: {reason}")
+        self.operation = operation
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls pass through. After ``failure_threshold`` consecutive failures the
+    circuit opens and rejects calls for ``reset_timeout`` seconds, then lets a single
+    probe through (half-open); the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, name: str = "database"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.open_seconds_total = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed, False if it should fail fast."""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half-open"
+        if self.state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            self.open_seconds_total += time.monotonic() - self.opened_at
+            logger.info(f"{self.name.capitalize()} circuit closed after {time.monotonic() - self.opened_at:.1f} s")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half-open":
+            # Each failed probe starts a new open period; book the one that just ended
+            now = time.monotonic()
+            self.open_seconds_total += now - self.opened_at
+            self.state = "open"
+            self.opened_at = now
+            self.times_opened += 1
+            self._probe_in_flight = False
+            logger.warning(f"{self.name.capitalize()} circuit re-opened after failed probe")
+        elif self.state == "closed" and self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(f"{self.name.capitalize()} circuit opened after {self.consecutive_failures} consecutive failures")
+
+    def release_probe(self) -> None:
+        """Let another call probe if the current probe was abandoned without an outcome."""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        open_seconds = self.open_seconds_total
+        if self.opened_at is not None:
+            open_seconds += time.monotonic() - self.opened_at
+        return {
+            "state": self.state,
+            "times_opened": self.times_opened,
+            "open_seconds_total": round(open_seconds, 3),
+            "rejected": self.rejected,
+        }
+
+
+class DatabaseGuard:
+    """
+    Runs database calls under a deadline, with retries and a circuit breaker.
+
+    Calls pick a circuit: "database" (the default) for round trips to the storage
+    backend, shared by every tool, or "catalog" for reads served from the catalog cache.
+
+    Storage backends log errors and return None instead of raising, so by default a
+    None result counts as a failure; pass ``none_is_failure=False`` for lookups where
+    None means "not found".
+    """
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None,
+                 max_retries: int = 2,
+                 backoff_base_ms: float = 50,
+                 catalog_breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize the guard.
+
+        Args:
+            breaker (Optional[CircuitBreaker]): Circuit shared by all database calls
+            max_retries (int): Extra attempts for idempotent calls
+            backoff_base_ms (float): Base of the exponential, fully jittered backoff
+            catalog_breaker (Optional[CircuitBreaker]): Circuit for reads served from the catalog cache
+        """
+        self.breaker = breaker or CircuitBreaker()
+        self.breakers = {"database": self.breaker,
+                         "catalog": catalog_breaker or CircuitBreaker(name="catalog")}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base_ms / 1000
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "DatabaseGuard":
+        """Build a guard from DB_MAX_RETRIES, DB_CIRCUIT_FAILURE_THRESHOLD and DB_CIRCUIT_RESET_SECONDS."""
+        failure_threshold = int(os.getenv("DB_CIRCUIT_FAILURE_THRESHOLD", "5"))
+        reset_timeout = float(os.getenv("DB_CIRCUIT_RESET_SECONDS", "10"))
+        return cls(
+            CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout),
+            max_retries=int(os.getenv("DB_MAX_RETRIES", "2")),
+            catalog_breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout,
+                                           name="catalog"),
+        )
+
+    def _count(self, operation: str, counter: str) -> None:
+        counters = self.counters.setdefault(
+            operation, {"calls": 0, "timeouts": 0, "retries": 0, "failures": 0, "rejected": 0}
+        )
+        counters[counter] += 1
+
+    async def call(self, operation: str, fn: Callable[[], Awaitable[Any]],
+                   budget_ms: Optional[float] = None,
+                   idempotent: bool = True,
+                   none_is_failure: bool = True,
+                   circuit: str = "database",
+                   has_fallback: bool = False) -> Any:
+        """
+        Run a database call within a latency budget.
+
+        Args:
+            operation (str): Name used for counters and budgets, usually the tool name
+            fn (Callable): Zero-argument coroutine function doing the database work
+            budget_ms (Optional[float]): Total time allowed, TOOL_BUDGETS_MS[operation] if None
+            idempotent (bool): Whether the call may be retried
+            none_is_failure (bool): Treat a None result as a failed call
+            circuit (str): "database" for storage round trips, "catalog" for catalog cache reads
+            has_fallback (bool): The caller answers in full from another source if this call
+                                 fails, so the failure is not recorded in degraded_calls
+
+        Returns:
+            Any: The call's result
+
+        Raises:
+            DatabaseUnavailable: If the circuit is open, the budget ran out or every attempt failed
+        """
+        if budget_ms is None:
+            budget_ms = TOOL_BUDGETS_MS.get(operation, DEFAULT_BUDGET_MS)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget_ms / 1000
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        breaker = self.breakers[circuit]
+        self._count(operation, "calls")
+        reason = "failed"
+
+        for attempt in range(attempts):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if not breaker.allow():
+                self._count(operation, "rejected")
+                self._degrade(operation, circuit, "circuit open", has_fallback)
+                raise DatabaseUnavailable(operation, "circuit open")
+            # Leave room for the remaining attempts instead of spending the whole budget on one
+            attempt_timeout = remaining / (attempts - attempt)
+            try:
+                async with asyncio.timeout(attempt_timeout):
+                    result = await fn()
+                if result is None and none_is_failure:
+                    reason = "failed"
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                    return result
+            except TimeoutError:
+                reason = "timed out"
+                self._count(operation, "timeouts")
+                breaker.record_failure()
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                reason = f"failed: {e}"
+                breaker.record_failure()
+
+            if attempt + 1 < attempts:
+                backoff = random.uniform(0, self.backoff_base * 2 ** attempt)
+                if loop.time() + backoff >= deadline:
+                    break
+                self._count(operation, "retries")
+                await asyncio.sleep(backoff)
+
+        self._count(operation, "failures")
+        logger.warning(f"{operation} {circuit} call {reason} within {budget_ms:.0f} ms budget")
+        self._degrade(operation, circuit, reason, has_fallback)
+        raise DatabaseUnavailable(operation, reason)
+
+    @staticmethod
+    def _degrade(operation: str, circuit: str, reason: str, has_fallback: bool) -> None:
+        calls = degraded_calls.get()
+        if calls is not None and not has_fallback:
+            calls.append(f"{operation} {circuit} call {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get guard counters.
+
+        Returns:
+            Dict: Database and catalog circuit states and per-operation calls, timeouts,
+                retries, failures and rejections
+        """
+        return {"circuit": self.breaker.stats(), "catalog_circuit": self.breakers["catalog"].stats(),
+                "operations": {k: dict(v) for k, v in self.counters.items()}}
+
+
+_guard: Optional[DatabaseGuard] = None
+
+
+def get_database_guard() -> DatabaseGuard:
+    """Get or create the process-wide database guard."""
+    global _guard
+    if _guard is None:
+        _guard = DatabaseGuard.from_env()
+    return _guard
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dataclasses import dataclass
 from pydantic import BaseModel,Field,EmailStr
@@ -11,6 +12,7 @@ from livekit.api import ListRoomsRequest,LiveKitAPI,AccessToken
 from livekit import api
 import os
 
+from tool_metrics import render_prometheus
 
 app = FastAPI()
 
@@ -58,4 +60,10 @@ async def get_rooms():
     lkapi = LiveKitAPI()
     rooms = await lkapi.room.list_rooms(ListRoomsRequest())
     await lkapi.aclose()
-    return [room.name for room in rooms]
\ No newline at end of file
+    return [room.name for room in rooms]
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-tool metrics written by the agent worker's job processes, in Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,217 @@
+"""
+Per-session memoization of tool results.
+
+Within one call the LLM tends to ask for the same profile, wishlist or catalog page
+several times. Each agent session gets a ``SessionToolCache`` (installed with
+``set_session_cache()`` in the job entrypoint, and inherited by every task the session
+spawns) that keeps finished tool results keyed by tool name and arguments. Entries
+carry tags such as ``wishlist:<user_id>``; the tools that write call ``invalidate()``
+with the same tags, so a repeat read after a write always goes to the database.
+Changes made elsewhere, such as catalog updates from the change feed, are picked up
+with ``sync_tag()`` before a lookup. Outside a session (scripts, benchmarks) every helper is a no-op.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Tuple[Any, ...]]
+
+
+def profile_tag(user_id: str) -> str:
+    return f"profile:{user_id}"
+
+
+def wishlist_tag(user_id: str) -> str:
+    return f"wishlist:{user_id}"
+
+
+def orders_tag(user_id: str) -> str:
+    return f"orders:{user_id}"
+
+
+CATALOG_TAG = "catalog"
+
+
+class SessionToolCache:
+    """
+    Tool results for one agent session, invalidated by tag.
+
+    Every invalidation bumps a generation counter. A read records the generation
+    before going to the database and its result is only stored if none of its tags
+    were invalidated in the meantime, so a write racing a slow read cannot leave a
+    stale result behind.
+    """
+
+    def __init__(self, session_id: str, ttl_seconds: float = 300.0, max_entries: int = 256):
+        """
+        Initialize the cache.
+
+        Args:
+            session_id (str): Identifier used in logs, usually the room name
+            ttl_seconds (float): Age after which an entry is read again, bounding how long
+                                 changes made outside this session stay invisible
+            max_entries (int): Least recently used entries beyond this are dropped
+        """
+        self.session_id = session_id
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str, Set[str]]]" = OrderedDict()
+        self._generation = 0
+        self._tag_generations: Dict[str, int] = {}
+        self._tag_versions: Dict[str, Any] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls, session_id: str) -> "SessionToolCache":
+        """Build a cache with SESSION_CACHE_TTL_SECONDS and SESSION_CACHE_MAX_ENTRIES."""
+        return cls(session_id,
+                   ttl_seconds=float(os.getenv("SESSION_CACHE_TTL_SECONDS", "300")),
+                   max_entries=int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "256")))
+
+    def _count(self, tool: str, counter: str) -> None:
+        counters = self.counters.setdefault(tool, {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0})
+        counters[counter] += 1
+
+    def lookup(self, tool: str, args: Tuple[Any, ...]) -> Tuple[Optional[str], int]:
+        """
+        Look up a tool result.
+
+        Args:
+            tool (str): Tool name
+            args (Tuple): Tool arguments, in signature order
+
+        Returns:
+            Tuple[Optional[str], int]: The cached result or None, and the generation to
+                pass to store() after a miss
+        """
+        key = (tool, args)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            self._entries.move_to_end(key)
+            self._count(tool, "hits")
+            return entry[1], self._generation
+        if entry is not None:
+            del self._entries[key]
+        self._count(tool, "misses")
+        return None, self._generation
+
+    def store(self, tool: str, args: Tuple[Any, ...], result: str, generation: int,
+              tags: Iterable[str]) -> None:
+        """
+        Store a tool result unless one of its tags was invalidated since ``generation``.
+
+        Args:
+            tool (str): Tool name
+            args (Tuple): Tool arguments, in signature order
+            result (str): Tool output
+            generation (int): Generation returned by the lookup() that missed
+            tags (Iterable[str]): Tags whose invalidation drops this entry
+        """
+        tags = set(tags)
+        if any(self._tag_generations.get(tag, -1) >= generation for tag in tags):
+            return
+        self._entries[(tool, args)] = (time.monotonic(), result, tags)
+        self._entries.move_to_end((tool, args))
+        self._count(tool, "stores")
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying any of the tags."""
+        for tag in tags:
+            self._tag_generations[tag] = self._generation
+        self._generation += 1
+        stale = [key for key, (_, _, entry_tags) in self._entries.items() if entry_tags.intersection(tags)]
+        for key in stale:
+            del self._entries[key]
+            self._count(key[0], "invalidated")
+
+    def sync_tag(self, tag: str, version: Any) -> None:
+        """
+        Invalidate a tag when the version of the data behind it has moved.
+
+        Args:
+            tag (str): Tag of the entries derived from the data
+            version (Any): Current version of the data, such as CatalogCache.generation
+        """
+        if tag in self._tag_versions and self._tag_versions[tag] != version:
+            self.invalidate(tag)
+        self._tag_versions[tag] = version
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit and miss counters.
+
+        Returns:
+            Dict: Session ID, entry count, overall hit rate and per-tool counters with hit rates
+        """
+        tools = {}
+        for tool, counters in self.counters.items():
+            lookups = counters["hits"] + counters["misses"]
+            tools[tool] = {**counters, "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0}
+        hits = sum(counters["hits"] for counters in self.counters.values())
+        lookups = hits + sum(counters["misses"] for counters in self.counters.values())
+        return {
+            "session_id": self.session_id,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "tools": tools,
+        }
+
+    async def close(self) -> None:
+        """Log the session's cache statistics and drop all entries."""
+        logger.info(f"Session tool cache stats: {self.stats()}")
+        self._entries.clear()
+
+
+_session_cache: ContextVar[Optional[SessionToolCache]] = ContextVar("session_tool_cache", default=None)
+
+
+def get_session_cache() -> Optional[SessionToolCache]:
+    """Get the current session's tool cache, None outside an agent session."""
+    return _session_cache.get()
+
+
+def set_session_cache(cache: Optional[SessionToolCache]) -> None:
+    """Install a tool cache for the current session and every task it starts afterwards."""
+    _session_cache.set(cache)
+
+
+def cached_result(tool: str, *args: Any) -> Tuple[Optional[str], int]:
+    """SessionToolCache.lookup() on the current session, a miss outside a session."""
+    cache = get_session_cache()
+    if cache is None:
+        return None, 0
+    return cache.lookup(tool, args)
+
+
+def remember_result(tool: str, args: Tuple[Any, ...], result: str, generation: int, *tags: str) -> str:
+    """
+    SessionToolCache.store() on the current session.
+
+    Returns:
+        str: The result, unchanged
+    """
+    cache = get_session_cache()
+    if cache is not None:
+        cache.store(tool, args, result, generation, tags)
+    return result
+
+
+def invalidate(*tags: str) -> None:
+    """SessionToolCache.invalidate() on the current session."""
+    cache = get_session_cache()
+    if cache is not None:
+        cache.invalidate(*tags)
+
+
+def sync_tag(tag: str, version: Any) -> None:
+    """SessionToolCache.sync_tag() on the current session."""
+    cache = get_session_cache()
+    if cache is not None:
+        cache.sync_tag(tag, version)
@@ -0,0 +1,114 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+When many sessions in a worker ask for the same data at the same moment (a campaign
+starting, several tools firing at session start), only the first caller runs the
+query; everyone else awaits the same in-flight result. Once a shared call finishes,
+every caller gets its own copy of the documents, so one session editing its result
+never shows up in another's.
+"""
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn call arguments (dicts, lists) into a hashable key."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _copy_result(value: Any) -> Any:
+    """Copy every dict and list in a result, so callers can mutate it independently."""
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy_result(item) for key, item in value.items()}
+    return value
+
+
+class _Flight:
+    """An in-flight call and how many callers joined it."""
+
+    __slots__ = ("future", "joined")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.joined = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key.
+
+    The shared call is shielded from cancellation, so a session hanging up does not
+    cancel the query other sessions are waiting on. A call nobody joined hands its
+    result over as is; once anyone joined, every caller, the first included, gets its
+    own copy.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``fn`` unless a call with the same key is already in flight.
+
+        Args:
+            key (Hashable): Identity of the request
+            fn (Callable): Zero-argument coroutine function performing the read
+
+        Returns:
+            Any: The result, a private copy if the call was shared
+        """
+        self.calls += 1
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            flight.joined += 1
+            return _copy_result(await asyncio.shield(flight.future))
+
+        self.executions += 1
+        flight = _Flight(asyncio.ensure_future(fn()))
+        self._inflight[key] = flight
+        # Runs before any caller resumes, so no one can join once the result is out
+        flight.future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        result = await asyncio.shield(flight.future)
+        return _copy_result(result) if flight.joined else result
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            Dict: Total calls, queries executed, calls coalesced and queries in flight
+        """
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+
+def coalesce_reads(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Route an async read method through its instance's ``single_flight``.
+
+    Calls with the same method name and arguments that overlap in time share one
+    execution.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        key = (method.__name__, _freeze(args), _freeze(kwargs))
+        return await self.single_flight.do(key, lambda: method(self, *args, **kwargs))
+    return wrapper
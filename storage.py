@@ -0,0 +1,666 @@
+"""
+Alternative storage backends implementing ``database.StorageBackend``.
+
+``InMemoryDatabase`` keeps every collection in process memory with an optional
+simulated round-trip latency, and ``SQLiteDatabase`` stores BSON documents in a local
+SQLite file. Both share the query logic in ``DocumentStore`` so the tool layer can be
+exercised and benchmarked with the database cost isolated and controllable.
+Select a backend for the agent with TWIDDLES_STORAGE_BACKEND (mongo, memory, sqlite).
+"""
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+from abc import abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import bson
+from bson import ObjectId
+
+from database import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    RECOMMENDATIONS_COLLECTION,
+    WISHLISTS_COLLECTION,
+    StorageBackend,
+    TwiddlesDatabase,
+    apply_projection,
+    decode_page_token,
+    encode_page_token,
+    match_document,
+    record_round_trip,
+)
+from singleflight import coalesce_reads
+
+logger = logging.getLogger(__name__)
+
+# Fields with an equality lookup index in every backend
+INDEXED_FIELDS = ("user_id", "product_id")
+
+Sort = List[Tuple[str, int]]
+
+
+def _clone(value: Any) -> Any:
+    """Copy nested dicts and lists so stored documents cannot be mutated by callers."""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
+
+def _to_stored(value: Any) -> Any:
+    """Copy a value for storage, converting aware datetimes to naive UTC like BSON does."""
+    if isinstance(value, dict):
+        return {key: _to_stored(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_stored(item) for item in value]
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _sort_documents(documents: List[Dict[str, Any]], sort: Optional[Sort]) -> List[Dict[str, Any]]:
+    """Sort documents like MongoDB: missing values first when ascending."""
+    for field, direction in reversed(sort or []):
+        documents.sort(
+            key=lambda document: (field in document and document[field] is not None, document.get(field)),
+            reverse=direction < 0
+        )
+    return documents
+
+
+class DocumentStore(StorageBackend):
+    """
+    StorageBackend built from four document primitives.
+
+    Subclasses implement ``_find``, ``_insert``, ``_upsert`` and ``_update``; every
+    tool-facing operation, including recommendations and session bootstrap, is
+    expressed on top of them with the same semantics as the MongoDB pipelines.
+    """
+
+    @abstractmethod
+    async def _find(self, collection_name: str, filter_dict: Dict[str, Any],
+                    sort: Optional[Sort] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return copies of matching documents."""
+
+    @abstractmethod
+    async def _insert(self, collection_name: str, documents: List[Dict[str, Any]]) -> List[Any]:
+        """Insert documents, assigning ObjectIds where _id is missing, and return the IDs."""
+
+    @abstractmethod
+    async def _upsert(self, collection_name: str, key: Dict[str, Any],
+                      set_fields: Dict[str, Any], set_on_insert: Dict[str, Any]) -> bool:
+        """Update the document matching key or insert it. Returns True if inserted."""
+
+    @abstractmethod
+    async def _update(self, collection_name: str, filter_dict: Dict[str, Any],
+                      set_fields: Dict[str, Any]) -> int:
+        """Set fields on the first matching document. Returns the number modified."""
+
+    async def ensure_indexes(self, collections: Optional[List[str]] = None) -> bool:
+        """Lookup indexes are built in; nothing to create."""
+        return True
+
+    async def insert_documents(self, collection_name: str, documents: List[Dict[str, Any]]) -> Optional[List[str]]:
+        try:
+            inserted_ids = await self._insert(collection_name, documents)
+            logger.info(f"Successfully inserted {len(inserted_ids)} documents into '{collection_name}'")
+            return [str(inserted_id) for inserted_id in inserted_ids]
+        except Exception as e:
+            logger.error(f"Error inserting documents into '{collection_name}': {e}")
+            return None
+
+    async def upsert_products(self, products: List[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+        now = datetime.datetime.utcnow()
+        counts = {"inserted": 0, "matched": 0, "modified": 0, "errors": 0}
+        for product in products:
+            fields = {key: value for key, value in product.items() if key not in ('_id', 'created_at', 'updated_at')}
+            try:
+                existing = await self._find('products', {"product_id": product['product_id']}, limit=1)
+                if existing and all(existing[0].get(key) == value for key, value in fields.items()):
+                    counts["matched"] += 1
+                    continue
+                fields['updated_at'] = now
+                inserted = await self._upsert('products', {"product_id": product['product_id']},
+                                              fields, {"created_at": product.get('created_at', now)})
+                counts["inserted" if inserted else "matched"] += 1
+                counts["modified"] += 0 if inserted else 1
+            except Exception as e:
+                logger.error(f"Error upserting product {product.get('product_id')}: {e}")
+                counts["errors"] += 1
+        return counts
+
+    @coalesce_reads
+    async def get_all_products(self, profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        return await self.get_products_by_filter({}, profile)
+
+    @coalesce_reads
+    async def get_products_by_filter(self, filter_dict: Dict[str, Any],
+                                     profile: str = "full") -> Optional[List[Dict[str, Any]]]:
+        try:
+            products = await self._find('products', filter_dict)
+            return [apply_projection(product, profile) for product in products]
+        except Exception as e:
+            logger.error(f"Error retrieving filtered products: {e}")
+            return None
+
+    async def iter_products(self, filter_dict: Optional[Dict[str, Any]] = None,
+                            profile: str = "full",
+                            batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        for product in await self._find('products', filter_dict or {}):
+            yield apply_projection(product, profile)
+
+    async def get_products_page(self, filter_dict: Optional[Dict[str, Any]] = None,
+                                profile: str = "full",
+                                page_size: int = DEFAULT_PAGE_SIZE,
+                                page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        try:
+            page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+            query = dict(filter_dict or {})
+            if page_token:
+                after = decode_page_token(page_token)
+                products = [product for product in await self._find('products', query)
+                            if product.get('product_id') is not None and product['product_id'] > after]
+            else:
+                products = await self._find('products', query)
+            products = _sort_documents(products, [("product_id", 1)])[:page_size + 1]
+
+            next_page_token = None
+            if len(products) > page_size:
+                products = products[:page_size]
+                next_page_token = encode_page_token(products[-1]['product_id'])
+            return {"products": [apply_projection(product, profile) for product in products],
+                    "next_page_token": next_page_token}
+        except Exception as e:
+            logger.error(f"Error retrieving product page: {e}")
+            return None
+
+    @coalesce_reads
+    async def get_recommended_products(self, user_id: str, filter_dict: Dict[str, Any],
+                                       limit: int = 5,
+                                       profile: str = "voice-detail") -> Optional[List[Dict[str, Any]]]:
+        try:
+            wishlisted = {item.get('product_id')
+                          for item in await self._find(WISHLISTS_COLLECTION, {"user_id": user_id})}
+            candidates = [product for product in await self._find('products', filter_dict)
+                          if product.get('product_id') not in wishlisted]
+            ranked = _sort_documents(candidates, [("rating", -1), ("product_id", 1)])[:limit]
+            return [apply_projection(product, profile) for product in ranked]
+        except Exception as e:
+            logger.error(f"Error retrieving recommendations for user {user_id}: {e}")
+            return None
+
+    @coalesce_reads
+    async def get_recent_orders(self, user_id: str, limit: int = 3) -> Optional[List[Dict[str, Any]]]:
+        try:
+            orders = await self._find('orders', {"user_id": user_id}, sort=[("created_at", -1)], limit=limit)
+            for order in orders:
+                order['_id'] = str(order['_id'])
+            return orders
+        except Exception as e:
+            logger.error(f"Error retrieving recent orders for user {user_id}: {e}")
+            return None
+
+    @coalesce_reads
+    async def get_session_bootstrap(self, user_id: str, order_limit: int = 3) -> Optional[Dict[str, Any]]:
+        try:
+            profile = await self.get_user_profile(user_id)
+            items = await self._find(WISHLISTS_COLLECTION, {"user_id": user_id})
+            product_ids = [item.get('product_id') for item in items]
+            products = {product['product_id']: product
+                        for product in await self._find('products', {"product_id": {"$in": product_ids}})}
+
+            wishlist = []
+            for item in items:
+                entry = {key: item[key] for key in ('product_id', 'quantity_desired', 'priority', 'added_date')
+                         if key in item}
+                product = products.get(item.get('product_id'), {})
+                entry.update({key: product[key] for key in ('name', 'price', 'in_stock') if key in product})
+                wishlist.append(entry)
+
+            recent_orders = [
+                {key: order[key] for key in ('_id', 'items', 'total_amount', 'order_status', 'created_at')
+                 if key in order}
+                for order in await self.get_recent_orders(user_id, order_limit) or []
+            ]
+            return {"profile": profile, "wishlist": wishlist, "recent_orders": recent_orders}
+        except Exception as e:
+            logger.error(f"Error loading session bootstrap for user {user_id}: {e}")
+            return None
+
+    async def iter_orders(self, after_order_id: Optional[str] = None,
+                          batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        query = {"_id": {"$gt": ObjectId(after_order_id)}} if after_order_id else {}
+        for order in await self._find('orders', query, sort=[("_id", 1)]):
+            yield {"_id": str(order['_id']),
+                   "items": [{"product_id": item.get('product_id')} if isinstance(item, dict) else item
+                             for item in order.get('items') or []]}
+
+    async def _insert_one_with_timestamp(self, collection_name: str, document: Dict[str, Any]) -> Optional[str]:
+        if 'created_at' not in document:
+            document['created_at'] = datetime.datetime.utcnow()
+        try:
+            inserted_ids = await self._insert(collection_name, [document])
+            return str(inserted_ids[0])
+        except Exception as e:
+            logger.error(f"Error inserting into '{collection_name}': {e}")
+            return None
+
+    async def create_order(self, order_data: Dict[str, Any]) -> Optional[str]:
+        return await self._insert_one_with_timestamp('orders', order_data)
+
+    async def _adjust_stock(self, product_id: str, quantity: float) -> bool:
+        # Compare-and-set on the quantity read, retried if another order changed it meanwhile
+        while True:
+            products = await self._find('products', {"product_id": product_id}, limit=1)
+            stock = products[0].get('stock_quantity') if products else None
+            if not isinstance(stock, (int, float)) or stock + quantity < 0:
+                return False
+            remaining = stock + quantity
+            if await self._update('products', {"product_id": product_id, "stock_quantity": stock},
+                                  {"stock_quantity": remaining, "in_stock": remaining > 0}):
+                return True
+
+    async def reserve_stock(self, items: List[Dict[str, Any]]) -> Optional[List[str]]:
+        try:
+            reserved, short = [], []
+            for item in items:
+                if await self._adjust_stock(item['product_id'], -item['quantity']):
+                    reserved.append(item)
+                else:
+                    short.append(item['product_id'])
+        except Exception as e:
+            logger.error(f"Error reserving stock: {e}")
+            short = None
+        if short != [] and reserved:
+            await self.release_stock(reserved)
+        return short
+
+    async def release_stock(self, items: List[Dict[str, Any]]) -> bool:
+        failed = []
+        for item in items:
+            try:
+                if not await self._adjust_stock(item['product_id'], item['quantity']):
+                    failed.append(item['product_id'])
+            except Exception as e:
+                logger.error(f"Error releasing stock for product {item['product_id']}: {e}")
+                failed.append(item['product_id'])
+        if failed:
+            logger.error(f"Error releasing reserved stock for products {failed}")
+        return not failed
+
+    async def add_feedback(self, feedback_data: Dict[str, Any]) -> Optional[str]:
+        return await self._insert_one_with_timestamp('feedback', feedback_data)
+
+    @coalesce_reads
+    async def get_user_wishlist(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            return await self._find(WISHLISTS_COLLECTION, {"user_id": user_id})
+        except Exception as e:
+            logger.error(f"Error retrieving wishlist for user {user_id}: {e}")
+            return None
+
+    async def iter_user_wishlist(self, user_id: str, batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        for item in await self._find(WISHLISTS_COLLECTION, {"user_id": user_id}):
+            yield item
+
+    async def add_to_wishlist(self, user_id: str, wishlist_items: List[Dict[str, Any]]) -> Optional[List[str]]:
+        if not wishlist_items or any(not item.get('product_id') for item in wishlist_items):
+            logger.error(f"Wishlist items for user {user_id} must each have a product_id")
+            return None
+        now = datetime.datetime.utcnow()
+        try:
+            for item in wishlist_items:
+                fields = {key: value for key, value in item.items()
+                          if key not in ('_id', 'user_id', 'product_id', 'added_date')}
+                fields['updated_at'] = now
+                await self._upsert(WISHLISTS_COLLECTION,
+                                   {"user_id": user_id, "product_id": item['product_id']},
+                                   fields, {"added_date": item.get('added_date', now)})
+            return [item['product_id'] for item in wishlist_items]
+        except Exception as e:
+            logger.error(f"Error adding wishlist items for user {user_id}: {e}")
+            return None
+
+    @coalesce_reads
+    async def get_user_recommendations(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            entries = await self._find(RECOMMENDATIONS_COLLECTION, {"user_id": user_id}, limit=1)
+            if not entries:
+                return None
+            return {key: entries[0][key] for key in ('product_ids', 'computed_at') if key in entries[0]}
+        except Exception as e:
+            logger.error(f"Error retrieving recommendations for user {user_id}: {e}")
+            return None
+
+    async def save_user_recommendations(self, user_id: str, product_ids: List[str],
+                                        computed_at: datetime.datetime) -> bool:
+        computed_at = _to_stored(computed_at)
+        try:
+            stored = await self._find(RECOMMENDATIONS_COLLECTION, {"user_id": user_id}, limit=1)
+            if stored and stored[0].get('computed_at') is not None and stored[0]['computed_at'] >= computed_at:
+                return False
+            await self._upsert(RECOMMENDATIONS_COLLECTION, {"user_id": user_id},
+                               {"product_ids": list(product_ids), "computed_at": computed_at}, {})
+            return True
+        except Exception as e:
+            logger.error(f"Error saving recommendations for user {user_id}: {e}")
+            return False
+
+    @coalesce_reads
+    async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            users = await self._find('users', {"user_id": user_id}, limit=1)
+            if not users:
+                return None
+            user = users[0]
+            if '_id' in user:
+                user['_id'] = str(user['_id'])
+            return user
+        except Exception as e:
+            logger.error(f"Error retrieving user profile for {user_id}: {e}")
+            return None
+
+    async def create_user_profile(self, user_data: Dict[str, Any]) -> Optional[str]:
+        return await self._insert_one_with_timestamp('users', user_data)
+
+    async def update_user_profile(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        update_data['updated_at'] = datetime.datetime.utcnow()
+        try:
+            modified = await self._update('users', {"user_id": user_id}, update_data)
+            if not modified:
+                logger.warning(f"No user found with ID {user_id} to update")
+            return modified > 0
+        except Exception as e:
+            logger.error(f"Error updating user profile for {user_id}: {e}")
+            return False
+
+
+class InMemoryDatabase(DocumentStore):
+    """
+    Process-local backend holding every collection in dictionaries.
+
+    Equality lookups on user_id and product_id go through hash indexes. ``latency_ms``
+    adds a fixed simulated round trip to every operation so benchmarks can model a
+    remote database deterministically.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        """
+        Initialize an empty store.
+
+        Args:
+            latency_ms (float): Simulated round-trip time added to every operation
+        """
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.round_trips = 0
+        self._collections: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._indexes: Dict[str, Dict[str, Dict[Any, set]]] = {}
+        self._next_key = 0
+
+    async def connect(self) -> bool:
+        return True
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        record_round_trip()
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def _index(self, collection_name: str, key: int, document: Dict[str, Any]) -> None:
+        indexes = self._indexes.setdefault(collection_name, {})
+        for field in INDEXED_FIELDS:
+            value = document.get(field)
+            if value is not None and not isinstance(value, (dict, list)):
+                indexes.setdefault(field, {}).setdefault(value, set()).add(key)
+
+    def _unindex(self, collection_name: str, key: int, document: Dict[str, Any]) -> None:
+        indexes = self._indexes.get(collection_name, {})
+        for field in INDEXED_FIELDS:
+            value = document.get(field)
+            if value is not None and not isinstance(value, (dict, list)):
+                indexes.get(field, {}).get(value, set()).discard(key)
+
+    def _candidates(self, collection_name: str, filter_dict: Dict[str, Any]) -> Iterable[Tuple[int, Dict[str, Any]]]:
+        documents = self._collections.get(collection_name, {})
+        indexes = self._indexes.get(collection_name, {})
+        for field in INDEXED_FIELDS:
+            condition = filter_dict.get(field)
+            if condition is None or field not in indexes:
+                continue
+            if isinstance(condition, dict):
+                if set(condition) != {"$in"}:
+                    continue
+                keys = set().union(*(indexes[field].get(value, set()) for value in condition["$in"]))
+            else:
+                keys = indexes[field].get(condition, set())
+            return [(key, documents[key]) for key in sorted(keys)]
+        return documents.items()
+
+    def _match(self, collection_name: str, filter_dict: Dict[str, Any]) -> List[Tuple[int, Dict[str, Any]]]:
+        return [(key, document) for key, document in self._candidates(collection_name, filter_dict)
+                if match_document(document, filter_dict)]
+
+    async def _find(self, collection_name: str, filter_dict: Dict[str, Any],
+                    sort: Optional[Sort] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        documents = [_clone(document) for _, document in self._match(collection_name, filter_dict)]
+        documents = _sort_documents(documents, sort)
+        return documents[:limit] if limit is not None else documents
+
+    def _store(self, collection_name: str, document: Dict[str, Any]) -> Any:
+        document = _to_stored(document)
+        document.setdefault('_id', ObjectId())
+        key = self._next_key
+        self._next_key += 1
+        self._collections.setdefault(collection_name, {})[key] = document
+        self._index(collection_name, key, document)
+        return document['_id']
+
+    async def _insert(self, collection_name: str, documents: List[Dict[str, Any]]) -> List[Any]:
+        await self._round_trip()
+        return [self._store(collection_name, document) for document in documents]
+
+    async def _upsert(self, collection_name: str, key: Dict[str, Any],
+                      set_fields: Dict[str, Any], set_on_insert: Dict[str, Any]) -> bool:
+        await self._round_trip()
+        matches = self._match(collection_name, key)
+        if matches:
+            self._set(collection_name, *matches[0], set_fields)
+            return False
+        self._store(collection_name, {**key, **set_on_insert, **set_fields})
+        return True
+
+    def _set(self, collection_name: str, key: int, document: Dict[str, Any], set_fields: Dict[str, Any]) -> None:
+        self._unindex(collection_name, key, document)
+        document.update(_to_stored(set_fields))
+        self._index(collection_name, key, document)
+
+    async def _update(self, collection_name: str, filter_dict: Dict[str, Any],
+                      set_fields: Dict[str, Any]) -> int:
+        await self._round_trip()
+        matches = self._match(collection_name, filter_dict)
+        if not matches:
+            return 0
+        self._set(collection_name, *matches[0], set_fields)
+        return 1
+
+
+class SQLiteDatabase(DocumentStore):
+    """
+    Local file backend storing each collection as a SQLite table of BSON documents.
+
+    user_id and product_id are mirrored into indexed columns for equality lookups;
+    remaining filter conditions are evaluated in Python. Queries run on a worker
+    thread so the event loop is never blocked on disk I/O.
+    """
+
+    def __init__(self, path: str = "twiddles.sqlite3"):
+        """
+        Initialize the backend without opening the file.
+
+        Args:
+            path (str): SQLite database file, ':memory:' for a private in-memory database
+        """
+        super().__init__()
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._tables: set = set()
+
+    async def connect(self) -> bool:
+        try:
+            if self._connection is None:
+                self._connection = sqlite3.connect(self.path, check_same_thread=False)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            logger.info(f"Opened SQLite database {self.path}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open SQLite database {self.path}: {e}")
+            return False
+
+    async def disconnect(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self._tables = set()
+
+    async def _run(self, fn, *args):
+        if self._connection is None:
+            raise RuntimeError("Database not connected")
+
+        def locked():
+            with self._lock:
+                return fn(*args)
+        record_round_trip()
+        return await asyncio.to_thread(locked)
+
+    def _table(self, collection_name: str) -> str:
+        table = '"' + collection_name.replace('"', '""') + '"'
+        if collection_name not in self._tables:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, product_id TEXT, doc BLOB NOT NULL)"
+            )
+            for field in INDEXED_FIELDS:
+                index = '"' + f"{collection_name}_{field}".replace('"', '""') + '"'
+                self._connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({field})")
+            self._tables.add(collection_name)
+        return table
+
+    @staticmethod
+    def _key_columns(document: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        return tuple(document[field] if isinstance(document.get(field), str) else None
+                     for field in INDEXED_FIELDS)
+
+    def _select(self, collection_name: str, filter_dict: Dict[str, Any]) -> List[Tuple[int, Dict[str, Any]]]:
+        table = self._table(collection_name)
+        clauses, params = [], []
+        for field in INDEXED_FIELDS:
+            condition = filter_dict.get(field)
+            if isinstance(condition, str):
+                clauses.append(f"{field} = ?")
+                params.append(condition)
+            elif isinstance(condition, dict) and set(condition) == {"$in"} and \
+                    all(isinstance(value, str) for value in condition["$in"]):
+                clauses.append(f"{field} IN ({', '.join('?' * len(condition['$in'])) or 'NULL'})")
+                params.extend(condition["$in"])
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection.execute(f"SELECT seq, doc FROM {table}{where} ORDER BY seq", params)
+        return [(seq, document) for seq, document in ((seq, bson.decode(blob)) for seq, blob in rows)
+                if match_document(document, filter_dict)]
+
+    async def _find(self, collection_name: str, filter_dict: Dict[str, Any],
+                    sort: Optional[Sort] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        documents = [document for _, document in await self._run(self._select, collection_name, filter_dict)]
+        documents = _sort_documents(documents, sort)
+        return documents[:limit] if limit is not None else documents
+
+    def _insert_rows(self, collection_name: str, documents: List[Dict[str, Any]]) -> List[Any]:
+        table = self._table(collection_name)
+        inserted_ids = []
+        rows = []
+        for document in documents:
+            document = dict(document)
+            document.setdefault('_id', ObjectId())
+            inserted_ids.append(document['_id'])
+            rows.append((*self._key_columns(document), bson.encode(document)))
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT INTO {table} (user_id, product_id, doc) VALUES (?, ?, ?)", rows
+            )
+        return inserted_ids
+
+    async def _insert(self, collection_name: str, documents: List[Dict[str, Any]]) -> List[Any]:
+        return await self._run(self._insert_rows, collection_name, documents)
+
+    def _write_back(self, collection_name: str, seq: int, document: Dict[str, Any]) -> None:
+        table = self._table(collection_name)
+        self._connection.execute(
+            f"UPDATE {table} SET user_id = ?, product_id = ?, doc = ? WHERE seq = ?",
+            (*self._key_columns(document), bson.encode(document), seq)
+        )
+
+    def _upsert_row(self, collection_name: str, key: Dict[str, Any],
+                    set_fields: Dict[str, Any], set_on_insert: Dict[str, Any]) -> bool:
+        with self._connection:
+            matches = self._select(collection_name, key)
+            if matches:
+                seq, document = matches[0]
+                document.update(set_fields)
+                self._write_back(collection_name, seq, document)
+                return False
+        self._insert_rows(collection_name, [{**key, **set_on_insert, **set_fields}])
+        return True
+
+    async def _upsert(self, collection_name: str, key: Dict[str, Any],
+                      set_fields: Dict[str, Any], set_on_insert: Dict[str, Any]) -> bool:
+        return await self._run(self._upsert_row, collection_name, key, set_fields, set_on_insert)
+
+    def _update_row(self, collection_name: str, filter_dict: Dict[str, Any], set_fields: Dict[str, Any]) -> int:
+        with self._connection:
+            matches = self._select(collection_name, filter_dict)
+            if not matches:
+                return 0
+            seq, document = matches[0]
+            document.update(set_fields)
+            self._write_back(collection_name, seq, document)
+            return 1
+
+    async def _update(self, collection_name: str, filter_dict: Dict[str, Any],
+                      set_fields: Dict[str, Any]) -> int:
+        return await self._run(self._update_row, collection_name, filter_dict, set_fields)
+
+
+STORAGE_BACKENDS = ("mongo", "memory", "sqlite")
+
+
+def create_backend(kind: Optional[str] = None) -> StorageBackend:
+    """
+    Build a storage backend by name.
+
+    Args:
+        kind (Optional[str]): 'mongo', 'memory' or 'sqlite'; TWIDDLES_STORAGE_BACKEND if None.
+            The SQLite file is taken from TWIDDLES_SQLITE_PATH.
+
+    Returns:
+        StorageBackend: Unconnected backend
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    kind = kind or os.getenv("TWIDDLES_STORAGE_BACKEND", "mongo")
+    if kind == "mongo":
+        return TwiddlesDatabase()
+    if kind == "memory":
+        return InMemoryDatabase(latency_ms=float(os.getenv("TWIDDLES_MEMORY_LATENCY_MS", "0")))
+    if kind == "sqlite":
+        return SQLiteDatabase(os.getenv("TWIDDLES_SQLITE_PATH", "twiddles.sqlite3"))
+    raise ValueError(f"Unknown storage backend '{kind}', expected one of {STORAGE_BACKENDS}")
@@ -0,0 +1,230 @@
+"""
+Conformance checks shared by every storage backend.
+
+Usage:
+    python storage_conformance.py [--backend memory --backend sqlite --backend mongo]
+
+Each backend is loaded with the sample data from ``database.create_sample_data()`` and
+must give the same answers for the reads and writes the tools rely on. The MongoDB
+run uses a throwaway database (TWIDDLES_CONFORMANCE_DB, default
+'twiddles_conformance') that is dropped before and after the checks.
+Exits with status 1 if any check fails.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import sys
+from typing import List, Tuple
+
+from database import StorageBackend, TwiddlesDatabase, create_sample_data
+from storage import STORAGE_BACKENDS, InMemoryDatabase, SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class ConformanceRun:
+    """Collects check results for one backend."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.results: List[Tuple[str, bool]] = []
+
+    def check(self, description: str, passed: bool) -> None:
+        self.results.append((description, bool(passed)))
+        print(f"  [{'ok' if passed else 'FAIL'}] {description}")
+
+    @property
+    def failures(self) -> int:
+        return sum(1 for _, passed in self.results if not passed)
+
+
+async def _seed(db: StorageBackend) -> None:
+    users, wishlist, products = create_sample_data()
+    await db.insert_documents("users", users)
+    await db.insert_documents("products", products)
+    await db.add_to_wishlist("repeat_user_001", wishlist)
+
+
+async def run_checks(db: StorageBackend, run: ConformanceRun) -> None:
+    """Run every check against a connected, empty backend."""
+    await _seed(db)
+
+    products = await db.get_all_products()
+    run.check("all products are returned", products is not None and len(products) == 8)
+
+    summary = await db.get_all_products(profile="voice-summary")
+    run.check("voice-summary profile drops heavy fields",
+              summary and all('description' not in p and 'ingredients' not in p for p in summary))
+
+    bites = await db.get_products_by_filter({"category": "Bites", "in_stock": True})
+    run.check("filter on category and stock",
+              sorted(p['product_id'] for p in bites or []) == ["TW-BT-001", "TW-BT-002", "TW-BT-004"])
+
+    cheap = await db.get_products_by_filter({"price": {"$lte": 300}})
+    run.check("range filter on price", cheap is not None and all(p['price'] <= 300 for p in cheap))
+
+    streamed = [product async for product in db.iter_products({"category": "Spreads"})]
+    run.check("iter_products streams filtered products", len(streamed) == 3)
+
+    seen, token = [], None
+    while True:
+        page = await db.get_products_page(page_size=3, page_token=token)
+        seen.extend(p['product_id'] for p in page['products'])
+        token = page['next_page_token']
+        if token is None:
+            break
+    run.check("pagination visits every product once in product_id order",
+              seen == sorted(p['product_id'] for p in products))
+    run.check("invalid page token is rejected", await db.get_products_page(page_token="not-a-token") is None)
+
+    wishlist = await db.get_user_wishlist("repeat_user_001")
+    added_date = {item['product_id']: item['added_date'] for item in wishlist or []}
+    await db.add_to_wishlist("repeat_user_001", [{"product_id": "TW-BT-001", "quantity_desired": 5}])
+    wishlist = await db.get_user_wishlist("repeat_user_001")
+    updated = [item for item in wishlist if item['product_id'] == "TW-BT-001"]
+    run.check("wishlist upsert does not duplicate items", len(wishlist) == 4 and len(updated) == 1)
+    run.check("wishlist upsert updates fields and keeps added_date",
+              updated and updated[0]['quantity_desired'] == 5
+              and updated[0]['added_date'] == added_date.get("TW-BT-001"))
+    run.check("iter_user_wishlist matches get_user_wishlist",
+              len([item async for item in db.iter_user_wishlist("repeat_user_001")]) == 4)
+
+    recommended = await db.get_recommended_products("repeat_user_001", {"in_stock": True}, limit=3)
+    run.check("recommendations exclude wishlisted products and rank by rating",
+              [p['product_id'] for p in recommended or []] == ["TW-SP-003", "TW-BT-004", "TW-SP-002"])
+
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    for days_ago in (3, 1, 2, 4):
+        await db.create_order({
+            "user_id": "repeat_user_001",
+            "items": [{"product_id": "TW-SP-001", "quantity": days_ago}],
+            "order_status": "placed",
+            "created_at": now - datetime.timedelta(days=days_ago),
+        })
+    orders = await db.get_recent_orders("repeat_user_001", limit=3)
+    run.check("recent orders are newest first and limited",
+              [o['items'][0]['quantity'] for o in orders or []] == [1, 2, 3])
+    run.check("order ids are strings", orders and all(isinstance(o['_id'], str) for o in orders))
+
+    streamed_orders = [order async for order in db.iter_orders(batch_size=2)]
+    run.check("iter_orders streams every order's product IDs",
+              len(streamed_orders) == 4
+              and all(o['items'] == [{"product_id": "TW-SP-001"}] for o in streamed_orders))
+    resumed = [order async for order in db.iter_orders(after_order_id=streamed_orders[1]['_id'])]
+    run.check("iter_orders resumes after an order ID in _id order",
+              [o['_id'] for o in resumed] == [o['_id'] for o in streamed_orders[2:]])
+
+    bootstrap = await db.get_session_bootstrap("repeat_user_001", order_limit=2)
+    run.check("bootstrap returns the profile",
+              bootstrap and bootstrap['profile'] and bootstrap['profile']['name'] == "Meera Joshi"
+              and isinstance(bootstrap['profile']['_id'], str))
+    enriched = {item['product_id']: item for item in (bootstrap or {}).get('wishlist', [])}
+    run.check("bootstrap wishlist is enriched with product name and price",
+              len(enriched) == 4 and enriched.get("TW-SP-001", {}).get('price') == 299)
+    run.check("bootstrap includes the latest orders", len((bootstrap or {}).get('recent_orders', [])) == 2)
+
+    unknown = await db.get_session_bootstrap("nobody")
+    run.check("bootstrap for an unknown user is empty",
+              unknown == {"profile": None, "wishlist": [], "recent_orders": []})
+
+    run.check("missing recommendation list is None", await db.get_user_recommendations("repeat_user_001") is None)
+    stored = await db.save_user_recommendations("repeat_user_001", ["TW-SP-003", "TW-BT-004"], now)
+    run.check("recommendation list is stored and read back",
+              stored and await db.get_user_recommendations("repeat_user_001")
+              == {"product_ids": ["TW-SP-003", "TW-BT-004"], "computed_at": now})
+    stale = await db.save_user_recommendations("repeat_user_001", ["TW-BT-001"],
+                                               now - datetime.timedelta(minutes=1))
+    run.check("an older recommendation list does not replace a newer one",
+              not stale and (await db.get_user_recommendations("repeat_user_001"))['product_ids'][0] == "TW-SP-003")
+    fresh = await db.save_user_recommendations("repeat_user_001", ["TW-BT-001"], now + datetime.timedelta(minutes=1))
+    run.check("a newer recommendation list replaces the stored one",
+              fresh and (await db.get_user_recommendations("repeat_user_001"))['product_ids'] == ["TW-BT-001"])
+
+    await db.upsert_products([{"product_id": "TW-BT-002", "stock_quantity": 3},
+                              {"product_id": "TW-SP-002", "stock_quantity": 5}])
+    short = await db.reserve_stock([{"product_id": "TW-SP-002", "quantity": 2},
+                                    {"product_id": "TW-BT-002", "quantity": 4}])
+    stock = {p['product_id']: p for p in await db.get_products_by_filter(
+        {"product_id": {"$in": ["TW-BT-002", "TW-SP-002"]}}, "order") or []}
+    run.check("a short line reserves nothing",
+              short == ["TW-BT-002"] and stock["TW-SP-002"].get('stock_quantity') == 5
+              and stock["TW-BT-002"].get('stock_quantity') == 3)
+    reserved = await db.reserve_stock([{"product_id": "TW-SP-002", "quantity": 2},
+                                       {"product_id": "TW-BT-002", "quantity": 3}])
+    stock = {p['product_id']: p for p in await db.get_products_by_filter(
+        {"product_id": {"$in": ["TW-BT-002", "TW-SP-002"]}}, "order") or []}
+    run.check("stock is reserved and sold-out products go out of stock",
+              reserved == [] and stock["TW-SP-002"].get('stock_quantity') == 3
+              and stock["TW-BT-002"].get('stock_quantity') == 0 and stock["TW-BT-002"].get('in_stock') is False)
+    await db.release_stock([{"product_id": "TW-BT-002", "quantity": 3}])
+    restocked = await db.get_products_by_filter({"product_id": "TW-BT-002"}, "order")
+    run.check("released stock is back in stock",
+              restocked and restocked[0].get('stock_quantity') == 3 and restocked[0].get('in_stock') is True)
+    results = await asyncio.gather(*(db.reserve_stock([{"product_id": "TW-SP-002", "quantity": 1}])
+                                     for _ in range(5)))
+    remaining = await db.get_products_by_filter({"product_id": "TW-SP-002"}, "order")
+    run.check("concurrent reservations never oversell",
+              sum(result == [] for result in results) == 3 and remaining
+              and remaining[0].get('stock_quantity') == 0)
+
+    feedback_id = await db.add_feedback({"user_id": "new_user_001", "product_id": "TW-BT-001", "rating": 5})
+    run.check("feedback insert returns an id", isinstance(feedback_id, str))
+
+    user_id = await db.create_user_profile({"user_id": "conformance_user", "name": "Test", "location": "Pune"})
+    run.check("user profile insert returns an id", isinstance(user_id, str))
+    run.check("user profile update reports success",
+              await db.update_user_profile("conformance_user", {"location": "Mumbai"}))
+    profile = await db.get_user_profile("conformance_user")
+    run.check("user profile update is visible", profile and profile['location'] == "Mumbai"
+              and 'updated_at' in profile)
+    run.check("updating a missing user reports failure",
+              not await db.update_user_profile("missing_user", {"location": "Goa"}))
+
+    before = db.single_flight.executions
+    results = await asyncio.gather(*(db.get_products_by_filter({}, "voice-summary") for _ in range(10)))
+    run.check("concurrent identical reads are coalesced",
+              db.single_flight.executions - before == 1 and all(len(r) == 8 for r in results))
+
+
+async def _with_backend(name: str) -> ConformanceRun:
+    run = ConformanceRun(name)
+    print(f"{name}:")
+    if name == "memory":
+        db: StorageBackend = InMemoryDatabase()
+    elif name == "sqlite":
+        db = SQLiteDatabase(":memory:")
+    else:
+        db = TwiddlesDatabase(os.getenv("TWIDDLES_CONFORMANCE_DB", "twiddles_conformance"))
+
+    async with db:
+        if isinstance(db, TwiddlesDatabase):
+            if db.db is None:
+                run.check("connected to MongoDB", False)
+                return run
+            await db.client.drop_database(db.database_name)
+            await db.ensure_indexes()
+        try:
+            await run_checks(db, run)
+        finally:
+            if isinstance(db, TwiddlesDatabase):
+                await db.client.drop_database(db.database_name)
+    return run
+
+
+async def main(backends: List[str]) -> int:
+    """Run the checks for each backend and return the process exit code."""
+    runs = [await _with_backend(name) for name in backends]
+    for run in runs:
+        print(f"{run.name}: {len(run.results) - run.failures}/{len(run.results)} checks passed")
+    return 1 if any(run.failures for run in runs) else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Run storage backend conformance checks")
+    parser.add_argument("--backend", action="append", choices=STORAGE_BACKENDS,
+                        help="Backend to check, repeatable (default: memory and sqlite)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.backend or ["memory", "sqlite"])))
@@ -0,0 +1,108 @@
+"""
+Outcomes of create_product_order's order insert and what happens to the reserved stock.
+
+Runs the tool against an InMemoryDatabase loaded with database.create_sample_data():
+    python -m unittest discover tests
+"""
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import connection
+import resilience
+import tools
+from catalog_cache import CatalogCache, set_catalog_cache
+from copurchase import CoPurchaseBuilder, set_copurchase_index
+from database import create_sample_data
+from recommendations import RecommendationRefresher, set_recommendation_refresher
+from resilience import CircuitBreaker, DatabaseGuard
+from storage import InMemoryDatabase
+
+PRODUCT_ID = "TW-SP-002"
+STOCK = 5
+ITEMS = json.dumps([{"product_id": PRODUCT_ID, "quantity": 2}])
+
+
+class OrderDatabase(InMemoryDatabase):
+    """In-memory backend whose order insert can fail or stall."""
+
+    def __init__(self):
+        super().__init__()
+        self.order_result = "ok"
+
+    async def create_order(self, order_data):
+        if self.order_result == "none":
+            return None
+        if self.order_result == "stall":
+            await asyncio.sleep(1)
+        return await super().create_order(order_data)
+
+
+class CreateProductOrderTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.db = OrderDatabase()
+        users, wishlist, products = create_sample_data()
+        await self.db.insert_documents("users", users)
+        await self.db.insert_documents("products", products)
+        await self.db.upsert_products([{"product_id": PRODUCT_ID, "stock_quantity": STOCK}])
+        connection.set_database(self.db)
+
+        async def load_catalog():
+            return await self.db.get_all_products(profile="full")
+        cache = CatalogCache(load_catalog)
+        await cache.start()
+        set_catalog_cache(cache)
+        set_copurchase_index(CoPurchaseBuilder().index())
+        set_recommendation_refresher(RecommendationRefresher())
+        self.guard = DatabaseGuard(CircuitBreaker(reset_timeout=0.05))
+        guard_patch = mock.patch.object(resilience, "_guard", self.guard)
+        guard_patch.start()
+        self.addCleanup(guard_patch.stop)
+
+    async def _order(self) -> str:
+        result = await tools.create_product_order("repeat_user_001", ITEMS, "12 MG Road, Pune")
+        # Stock is given back after the reply
+        await asyncio.gather(*tools._releases)
+        return result
+
+    async def _stock(self) -> int:
+        products = await self.db.get_products_by_filter({"product_id": PRODUCT_ID})
+        return products[0]["stock_quantity"]
+
+    async def _orders(self) -> int:
+        return len(await self.db.get_recent_orders("repeat_user_001", limit=50) or [])
+
+    async def test_placed_order_keeps_its_stock(self):
+        orders = await self._orders()
+        result = json.loads(await self._order())
+        self.assertIn("order_id", result)
+        self.assertEqual(await self._stock(), STOCK - 2)
+        self.assertEqual(await self._orders(), orders + 1)
+
+    async def test_failed_insert_releases_stock(self):
+        self.db.order_result = "none"
+        orders = await self._orders()
+        result = await self._order()
+        self.assertIn("no order was placed", result)
+        self.assertEqual(await self._stock(), STOCK)
+        self.assertEqual(await self._orders(), orders)
+
+    async def test_insert_rejected_by_open_circuit_releases_stock(self):
+        # The reservation gets through, then the circuit rejects the insert and the first release
+        with mock.patch.object(self.guard.breaker, "allow", side_effect=[True, False, False, True]):
+            result = await self._order()
+        self.assertIn("no order was placed", result)
+        self.assertEqual(await self._stock(), STOCK)
+
+    async def test_timed_out_insert_keeps_stock_reserved(self):
+        self.db.order_result = "stall"
+        with mock.patch.dict(resilience.TOOL_BUDGETS_MS, {"create_product_order": 200}):
+            result = await self._order()
+        self.assertIn("may or may not have been placed", result)
+        self.assertEqual(await self._stock(), STOCK - 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
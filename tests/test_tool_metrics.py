@@ -0,0 +1,62 @@
+"""
+Error counting in tool_metrics.instrument_tool.
+
+    python -m unittest discover tests
+"""
+import tempfile
+import unittest
+from unittest import mock
+
+from livekit.agents.llm import function_tool
+
+import tool_metrics
+from resilience import CircuitBreaker, DatabaseGuard, DatabaseUnavailable
+
+
+def _guard_with_open_circuit() -> DatabaseGuard:
+    guard = DatabaseGuard(CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    guard.breaker.record_failure()
+    return guard
+
+
+async def _read():
+    return {"ok": True}
+
+
+class InstrumentToolErrorTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.metrics = tool_metrics.ToolMetrics(directory.name)
+        patch = mock.patch.object(tool_metrics, "_metrics", self.metrics)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def _call(self, has_fallback: bool) -> str:
+        guard = _guard_with_open_circuit()
+
+        @function_tool
+        async def lookup() -> str:
+            """Look something up."""
+            try:
+                await guard.call("lookup", _read, has_fallback=has_fallback)
+            except DatabaseUnavailable:
+                return "Lookups are temporarily unavailable. Please try again in a moment."
+            return "found"
+
+        return await tool_metrics.instrument_tool(lookup)()
+
+    async def test_degraded_reply_counts_as_error(self):
+        result = await self._call(has_fallback=False)
+        self.assertIn("temporarily unavailable", result)
+        self.assertEqual(self.metrics.tools["lookup"]["errors"], 1)
+
+    async def test_failure_with_fallback_is_not_an_error(self):
+        await self._call(has_fallback=True)
+        self.assertEqual(self.metrics.tools["lookup"]["calls"], 1)
+        self.assertEqual(self.metrics.tools["lookup"]["errors"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,437 @@
+"""
+Per-tool latency, database round trip and payload metrics in Prometheus text format.
+
+``instrument_tool()`` wraps a function tool so every call records its latency, the
+database round trips it made, the bytes it returned to the LLM and whether it failed:
+raised, returned an error message, or answered with a degraded reply because the
+database guard gave up (``resilience.degraded_calls``).
+Round trips are counted in ``database.round_trip_counter`` by
+``connection.RoundTripListener`` for MongoDB and by the in-process storage backends.
+
+LiveKit runs each job in its own process and the token server is another process, so
+every process writes its counters to a snapshot file and ``render_prometheus()`` merges
+them. The worker serves the result on ``TOOL_METRICS_PORT`` (see
+``start_metrics_server()``) and ``server.py`` on ``GET /metrics``.
+
+Snapshots live in a run directory under ``TOOL_METRICS_DIR`` that the worker creates with
+``start_run()`` and its job processes inherit through ``TOOL_METRICS_RUN``. Each file is
+named after the process id and a token drawn when the process started, so a reused pid
+never overwrites or extends another process's counters. The worker folds the files of
+job processes that have exited into the run's ``retired.json`` and deletes them, which
+keeps the totals monotonic without the directory growing, and ``start_run()`` removes
+the directories of earlier runs whose worker is gone.
+"""
+import functools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from livekit.agents.llm import function_tool, is_function_tool
+from livekit.agents.llm.tool_context import get_function_info
+
+from database import round_trip_counter
+from resilience import degraded_calls
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+OUTPUT_BYTES_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+METRICS_DIR = os.getenv("TOOL_METRICS_DIR", os.path.join(tempfile.gettempdir(), "twiddles-tool-metrics"))
+RUN_ENV_VAR = "TOOL_METRICS_RUN"
+RETIRED_FILE = "retired.json"
+FLUSH_INTERVAL_SECONDS = 1.0
+# Drawn once per process start; the pid alone is reused by later processes
+PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+def _histogram(buckets: Tuple[float, ...]) -> Dict[str, Any]:
+    return {"counts": [0] * (len(buckets) + 1), "sum": 0.0}
+
+
+def _empty_metrics() -> Dict[str, Any]:
+    return {"calls": 0, "errors": 0, "round_trips": 0,
+            "latency": _histogram(LATENCY_BUCKETS_SECONDS),
+            "output_bytes": _histogram(OUTPUT_BYTES_BUCKETS)}
+
+
+def _observe(histogram: Dict[str, Any], buckets: Tuple[float, ...], value: float) -> None:
+    index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+    histogram["counts"][index] += 1
+    histogram["sum"] += value
+
+
+def _merge(merged: Dict[str, Dict[str, Any]], snapshot: Dict[str, Dict[str, Any]]) -> None:
+    for tool, metrics in snapshot.items():
+        total = merged.setdefault(tool, _empty_metrics())
+        for counter in ("calls", "errors", "round_trips"):
+            total[counter] += metrics[counter]
+        for histogram in ("latency", "output_bytes"):
+            total[histogram]["sum"] += metrics[histogram]["sum"]
+            total[histogram]["counts"] = [a + b for a, b in zip(total[histogram]["counts"],
+                                                               metrics[histogram]["counts"])]
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_pid(name: str) -> Optional[int]:
+    """Pid in a run directory name (run-<pid>-<token>) or snapshot name (tools-<pid>-<token>.json)."""
+    try:
+        return int(name.split("-")[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Any) -> None:
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+    os.replace(temporary, path)
+
+
+def start_run(root: str = METRICS_DIR) -> str:
+    """
+    Start a metrics run for this worker and remove the runs of workers that are gone.
+
+    Call once in the worker's main process before job processes are started; they
+    inherit the run through the TOOL_METRICS_RUN environment variable.
+
+    Args:
+        root (str): Directory holding the run directories
+
+    Returns:
+        str: Run name
+    """
+    run = f"run-{os.getpid()}-{PROCESS_TOKEN}"
+    os.environ[RUN_ENV_VAR] = run
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        pid = _owner_pid(name)
+        # Snapshot files left directly in the root by earlier versions are dropped as well
+        if name.startswith("tools-") or (name.startswith("run-") and name != run
+                                         and (pid is None or not _pid_alive(pid))):
+            path = os.path.join(root, name)
+            try:
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove stale tool metrics {path}: {e}")
+    return run
+
+
+def run_directory(root: str = METRICS_DIR) -> str:
+    """Snapshot directory of the current run, starting a run for this process if none was inherited."""
+    return os.path.join(root, os.environ.get(RUN_ENV_VAR) or start_run(root))
+
+
+class ToolMetrics:
+    """
+    Per-tool counters and histograms for this process, persisted to METRICS_DIR.
+
+    Calls are recorded on the event loop while the metrics endpoint flushes from its
+    own thread, so both take a lock.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize the registry.
+
+        Args:
+            directory (Optional[str]): Snapshot directory shared by the run, run_directory() if None
+        """
+        self.directory = directory or run_directory()
+        self.path = os.path.join(self.directory, f"tools-{os.getpid()}-{PROCESS_TOKEN}.json")
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def observe(self, tool: str, seconds: float, round_trips: int, output_bytes: int, error: bool) -> None:
+        """
+        Record one tool call.
+
+        Args:
+            tool (str): Tool name
+            seconds (float): Wall time of the call
+            round_trips (int): Database round trips made by the call
+            output_bytes (int): UTF-8 size of the result returned to the LLM
+            error (bool): Whether the call raised, returned an error message or gave a degraded reply
+        """
+        with self._lock:
+            metrics = self.tools.setdefault(tool, _empty_metrics())
+            metrics["calls"] += 1
+            metrics["errors"] += int(error)
+            metrics["round_trips"] += round_trips
+            _observe(metrics["latency"], LATENCY_BUCKETS_SECONDS, seconds)
+            _observe(metrics["output_bytes"], OUTPUT_BYTES_BUCKETS, output_bytes)
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write this process's counters to its snapshot file."""
+        self._last_flush = time.monotonic()
+        with self._lock:
+            if not self.tools:
+                return
+            snapshot = json.dumps(self.tools)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                handle.write(snapshot)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.error(f"Failed to write tool metrics to {self.path}: {e}")
+
+    async def close(self) -> None:
+        """Flush on shutdown, usable as a job shutdown callback."""
+        self.flush()
+
+
+_metrics: Optional[ToolMetrics] = None
+
+
+def get_tool_metrics() -> ToolMetrics:
+    """Get or create the process-wide tool metrics registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = ToolMetrics()
+    return _metrics
+
+
+def instrument_tool(tool: Any) -> Any:
+    """
+    Wrap a function tool so its calls are recorded in the tool metrics.
+
+    Args:
+        tool: Function tool created with @function_tool; anything else is returned as is
+
+    Returns:
+        A function tool with the same name, description and parameters
+    """
+    if not is_function_tool(tool):
+        return tool
+    name = get_function_info(tool).name
+
+    # Without copying __dict__, so the wrapper does not inherit the tool's own attributes;
+    # signature and type hints are resolved through __wrapped__
+    @functools.wraps(tool, updated=())
+    async def instrumented(*args, **kwargs):
+        counter = [0]
+        degraded: List[str] = []
+        token = round_trip_counter.set(counter)
+        degraded_token = degraded_calls.set(degraded)
+        start = time.perf_counter()
+        result = None
+        error = True
+        try:
+            result = await tool(*args, **kwargs)
+            # Degraded replies read like answers, so the guard's record decides, not the text
+            error = bool(degraded) or (isinstance(result, str) and result.startswith("Error"))
+            return result
+        finally:
+            degraded_calls.reset(degraded_token)
+            round_trip_counter.reset(token)
+            output_bytes = len(str(result).encode("utf-8")) if result is not None else 0
+            get_tool_metrics().observe(name, time.perf_counter() - start, counter[0], output_bytes, error)
+
+    return function_tool(instrumented, name=name, description=get_function_info(tool).description)
+
+
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Skipping unreadable tool metrics file {path}: {e}")
+        return {}
+
+
+def _retire_exited(directory: str) -> None:
+    """
+    Fold the snapshots of exited job processes into the run's retired counters.
+
+    Only the process that started the run does this, so retired.json has one writer.
+    Folded files are recorded in retired.json before they are deleted, and readers skip
+    recorded files, so no scrape counts a file twice or misses it.
+    """
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    retired = _load(retired_path) or {"tools": {}, "folded": []}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    # Names stay recorded until the file is gone, in case a previous pass stopped before deleting it
+    folded = [name for name in retired["folded"] if name in names]
+    exited = [name for name in names if name.startswith("tools-") and name.endswith(".json")
+              and name not in folded and not _pid_alive(_owner_pid(name))]
+    for name in exited:
+        snapshot = _load(os.path.join(directory, name))
+        if snapshot is not None:
+            _merge(retired["tools"], snapshot)
+            folded.append(name)
+    if exited or folded != retired["folded"]:
+        retired["folded"] = folded
+        try:
+            _write_json(retired_path, retired)
+        except OSError as e:
+            logger.error(f"Failed to write retired tool metrics to {retired_path}: {e}")
+            return
+    for name in folded:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove retired tool metrics file {name}: {e}")
+
+
+def _collect_run(directory: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    try:
+        names = [name for name in os.listdir(directory) if name.startswith("tools-") and name.endswith(".json")]
+    except FileNotFoundError:
+        return merged
+    retired = _load(os.path.join(directory, RETIRED_FILE)) or {"tools": {}, "folded": []}
+    _merge(merged, retired["tools"])
+    for name in names:
+        if name in retired["folded"]:
+            continue
+        snapshot = _load(os.path.join(directory, name))
+        if snapshot is None:
+            # Folded and deleted since the listing; retired.json now holds it
+            return None
+        _merge(merged, snapshot)
+    return merged
+
+
+def collect_snapshots(directories: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Merge the snapshot files of every process.
+
+    Args:
+        directories (Optional[List[str]]): Run directories; by default the current run, or
+            every run whose worker is alive when this process is not part of a run
+
+    Returns:
+        Dict: Per-tool counters summed over all processes
+    """
+    if _metrics is not None:
+        _metrics.flush()
+    if directories is None:
+        run = os.environ.get(RUN_ENV_VAR)
+        try:
+            runs = [run] if run else [name for name in os.listdir(METRICS_DIR) if name.startswith("run-")
+                                      and _pid_alive(_owner_pid(name))]
+        except FileNotFoundError:
+            runs = []
+        directories = [os.path.join(METRICS_DIR, name) for name in runs]
+    merged: Dict[str, Dict[str, Any]] = {}
+    for directory in directories:
+        if _owner_pid(os.path.basename(directory)) == os.getpid():
+            _retire_exited(directory)
+        for _ in range(3):
+            run_metrics = _collect_run(directory)
+            if run_metrics is not None:
+                _merge(merged, run_metrics)
+                break
+    return merged
+
+
+def _render_histogram(lines: List[str], metric: str, tool: str, histogram: Dict[str, Any],
+                      buckets: Tuple[float, ...]) -> None:
+    cumulative = 0
+    for bound, count in zip(list(buckets) + ["+Inf"], histogram["counts"]):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{tool="{tool}",le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_sum{{tool="{tool}"}} {histogram["sum"]}')
+    lines.append(f'{metric}_count{{tool="{tool}"}} {cumulative}')
+
+
+def render_prometheus(tools: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    Render tool metrics in the Prometheus text exposition format.
+
+    Args:
+        tools (Optional[Dict]): Per-tool metrics, collect_snapshots() if None
+
+    Returns:
+        str: Exposition text
+    """
+    tools = collect_snapshots() if tools is None else tools
+    lines = []
+    for metric, counter, help_text in (
+        ("twiddles_tool_calls_total", "calls", "Tool calls"),
+        ("twiddles_tool_errors_total", "errors", "Tool calls that raised, returned an error or gave a degraded reply"),
+        ("twiddles_tool_db_round_trips_total", "round_trips", "Database round trips made by tool calls"),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for tool, metrics in sorted(tools.items()):
+            lines.append(f'{metric}{{tool="{tool}"}} {metrics[counter]}')
+    for metric, histogram, buckets, help_text in (
+        ("twiddles_tool_latency_seconds", "latency", LATENCY_BUCKETS_SECONDS, "Tool call latency"),
+        ("twiddles_tool_output_bytes", "output_bytes", OUTPUT_BYTES_BUCKETS, "Tool result size sent to the LLM"),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for tool, metrics in sorted(tools.items()):
+            _render_histogram(lines, metric, tool, metrics[histogram], buckets)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics from a daemon thread.
+
+    Args:
+        port (int): Port to listen on, 0 to disable
+        host (str): Interface to bind
+
+    Returns:
+        Optional[ThreadingHTTPServer]: The running server, None if disabled or the port is taken
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Failed to start tool metrics endpoint on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="tool-metrics", daemon=True).start()
+    logger.info(f"Serving tool metrics on http://{host}:{port}/metrics")
+    return server
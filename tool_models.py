@@ -0,0 +1,248 @@
+"""
+Typed inputs and results of the agent's tools.
+
+Input models replace hand-written argument checks: a tool validates its arguments
+with one ``model_validate`` call and reports a ``ValidationError`` to the LLM with
+``validation_message()``. Result models take database documents as they come back
+from the driver and keep only the fields the LLM needs; unknown keys such as ``_id``
+are ignored instead of being stringified in place. Their field types round numbers,
+shorten long text and print timestamps to the minute when the result is serialized
+by ``tool_output.format_tool_output()``.
+"""
+from datetime import datetime
+from typing import Annotated, Any, List, Literal, Optional
+
+from pydantic import (AfterValidator, BaseModel, BeforeValidator, ConfigDict, Field, Json, PlainSerializer,
+                      StringConstraints, ValidationError, model_validator)
+
+MAX_TEXT_CHARS = 160
+NUMBER_DIGITS = 2
+
+
+def _shorten(text: str) -> Optional[str]:
+    """Cut text at a word boundary and mark the cut; empty text becomes None."""
+    text = text.strip()
+    if len(text) <= MAX_TEXT_CHARS:
+        return text or None
+    cut = text[:MAX_TEXT_CHARS].rsplit(" ", 1)[0] or text[:MAX_TEXT_CHARS]
+    return cut.rstrip(" ,.;:-") + "…"
+
+
+def _whole(value: float) -> Any:
+    return int(value) if value.is_integer() else value
+
+
+def _split_terms(value: Any) -> Any:
+    """Accept a comma-separated string where a list of terms is expected."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return value
+
+
+def _number(value: float) -> Any:
+    return _whole(round(value, NUMBER_DIGITS))
+
+
+RequiredText = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+ShortText = Annotated[str, AfterValidator(_shorten)]
+Number = Annotated[float, PlainSerializer(_number)]
+TermList = Annotated[List[str], BeforeValidator(_split_terms)]
+Timestamp = Annotated[datetime, PlainSerializer(lambda value: value.isoformat(timespec="minutes"),
+                                                return_type=str)]
+
+
+class ToolModel(BaseModel):
+    """Base for tool models: unknown fields, including Mongo's ``_id``, are dropped."""
+
+    model_config = ConfigDict(extra="ignore")
+
+
+# Inputs
+
+class UserRequest(ToolModel):
+    user_id: RequiredText
+
+
+class RecommendationRequest(UserRequest):
+    category: Optional[str] = None
+    max_price: Optional[float] = Field(default=None, ge=0)
+
+
+class ProfileRequest(ToolModel):
+    name: RequiredText
+    phone: RequiredText
+    location: Optional[str] = None
+    email: Optional[str] = None
+    preferred_language: str = "English"
+
+
+class WishlistAddRequest(UserRequest):
+    product_id: RequiredText
+    quantity_desired: int = Field(default=1, ge=1)
+    priority: Literal["high", "medium", "low"] = "medium"
+
+
+class OrderItem(ToolModel):
+    product_id: RequiredText
+    # Whole quantities are stored as integers
+    quantity: Annotated[float, Field(gt=0), AfterValidator(_whole)]
+
+
+class OrderRequest(UserRequest):
+    # The LLM passes items as a JSON string, parsed and validated here in one pass
+    items: Json[Annotated[List[OrderItem], Field(min_length=1)]]
+    shipping_address: RequiredText
+    payment_method: str = "online"
+    special_instructions: Optional[str] = None
+
+
+class FeedbackRequest(UserRequest):
+    product_id: RequiredText
+    rating: float = Field(ge=1.0, le=5.0)
+    review_text: RequiredText
+    order_id: Optional[str] = None
+
+
+class SearchRequest(ToolModel):
+    query: Optional[str] = None
+    category: Optional[str] = None
+    min_price: Optional[float] = Field(default=None, ge=0)
+    max_price: Optional[float] = Field(default=None, ge=0)
+    dietary_info: TermList = []
+    ingredients: TermList = []
+    in_stock: Optional[bool] = None
+    limit: int = Field(default=5, ge=1, le=10)
+
+    @model_validator(mode="after")
+    def _price_range(self) -> "SearchRequest":
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price must not be greater than max_price")
+        return self
+
+
+class ResolveRequest(ToolModel):
+    spoken_name: RequiredText
+    limit: int = Field(default=3, ge=1, le=5)
+
+
+def validation_message(error: ValidationError) -> str:
+    """
+    Describe a validation error in one line the LLM can act on.
+
+    Args:
+        error (ValidationError): Error raised by an input model
+
+    Returns:
+        str: Message such as ``Error: items[2].quantity: Input should be greater than 0``
+    """
+    problems = []
+    for detail in error.errors(include_url=False):
+        location = ""
+        for part in detail["loc"]:
+            location += f"[{part + 1}]" if isinstance(part, int) else f".{part}" if location else str(part)
+        problems.append(f"{location}: {detail['msg']}" if location else detail["msg"])
+    return "Error: " + "; ".join(problems)
+
+
+# Results
+
+class RecommendedProduct(ToolModel):
+    product_id: str
+    name: Optional[ShortText] = None
+    category: Optional[str] = None
+    price: Optional[Number] = None
+    size: Optional[str] = None
+    description: Optional[ShortText] = None
+    dietary_info: Optional[List[str]] = None
+    rating: Optional[Number] = None
+
+
+class Product(RecommendedProduct):
+    ingredients: Optional[List[str]] = None
+    in_stock: Optional[bool] = None
+
+
+class WishlistItem(ToolModel):
+    product_id: str
+    quantity_desired: Optional[int] = None
+    priority: Optional[str] = None
+    notes: Optional[ShortText] = None
+    added_date: Optional[Timestamp] = None
+
+
+class UserProfile(ToolModel):
+    user_id: str
+    name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    location: Optional[str] = None
+    preferred_language: Optional[str] = None
+    customer_type: Optional[str] = None
+    registration_date: Optional[Timestamp] = None
+
+
+class ProductPage(ToolModel):
+    products_count: int
+    products: List[Product]
+    next_page_token: Optional[str] = None
+
+
+class SearchResult(ToolModel):
+    total_matches: Optional[int] = None
+    more_available: Optional[bool] = None
+    products: List[Product]
+    unmatched_terms: Optional[List[str]] = None
+
+
+class ResolvedProduct(Product):
+    confidence: Number
+
+
+class ResolveResult(ToolModel):
+    # Set only when one product clearly matches; otherwise the customer has to choose
+    product_id: Optional[str] = None
+    candidates: List[ResolvedProduct]
+
+
+class WishlistResult(ToolModel):
+    wishlist_count: int
+    wishlist_items: List[WishlistItem]
+
+
+class RecommendationResult(ToolModel):
+    total_recommendations: int
+    recommended_products: List[RecommendedProduct]
+    note: Optional[str] = None
+
+
+class UserInfoResult(ToolModel):
+    status: str = "success"
+    user_profile: UserProfile
+
+
+class WishlistAddResult(ToolModel):
+    status: str = "success"
+    message: str
+    product_id: str
+
+
+class OrderedItem(ToolModel):
+    name: Optional[str] = None
+    quantity: Number
+    line_total: Number
+
+
+class OrderResult(ToolModel):
+    status: str = "success"
+    message: str = "Order created successfully"
+    order_id: str
+    items: List[OrderedItem] = []
+    total_amount: Optional[Number] = None
+
+
+class FeedbackResult(ToolModel):
+    status: str = "success"
+    message: str = "Feedback submitted successfully"
+    feedback_id: str
@@ -0,0 +1,158 @@
+"""
+Compact, token-budgeted serialization of tool results.
+
+Whatever a tool returns is sent back to the LLM as input on every following turn, so
+every byte of it adds to time-to-first-token for the rest of the call. Tools build a
+result model from ``tool_models``, which keeps only the fields the LLM needs, and
+``format_tool_output()`` serializes it with orjson: without whitespace and None
+values, and with list results trimmed to the tool's entry in ``TOOL_TOKEN_BUDGETS``.
+Set ``TOOL_OUTPUT_MODE=verbose`` for indented output without budgets. Either way the
+size of every result is logged and counted per tool (see ``output_stats()``).
+"""
+import logging
+import math
+import os
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from bson import Decimal128, ObjectId
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_MODES = ("compact", "verbose")
+OUTPUT_MODE = os.getenv("TOOL_OUTPUT_MODE", "compact")
+if OUTPUT_MODE not in OUTPUT_MODES:
+    logger.warning(f"Unknown TOOL_OUTPUT_MODE '{OUTPUT_MODE}', using compact")
+    OUTPUT_MODE = "compact"
+
+# Estimated LLM tokens allowed per result; list results are trimmed to fit
+TOOL_TOKEN_BUDGETS = {
+    "get_all_products": 1200,
+    "search_products": 700,
+    "resolve_product_name": 300,
+    "get_user_wishlist": 500,
+    "get_product_recommendations": 600,
+    "get_user_info": 250,
+}
+DEFAULT_TOKEN_BUDGET = 400
+
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM tokens as one per four UTF-8 bytes, so Devanagari counts as costlier."""
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def _bson_default(value: Any) -> Any:
+    """Encode the BSON types orjson does not know natively."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any, indent: bool = False) -> str:
+    """
+    Serialize a value to JSON with orjson.
+
+    Args:
+        value (Any): Plain data, which may contain ObjectId, Decimal128 and datetimes
+                     (naive ones are UTC, as the driver returns them)
+        indent (bool): Indent with two spaces
+
+    Returns:
+        str: JSON text, non-ASCII characters unescaped
+    """
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(value, default=_bson_default, option=option).decode("utf-8")
+
+
+def _fit_budget(payload: Dict[str, Any], records_key: str, budget: int,
+                on_truncate: Optional[Callable[[Dict[str, Any], List[Any]], None]]) -> Tuple[str, int]:
+    """Drop records from the end of payload[records_key] until the serialized payload fits."""
+    records = payload[records_key]
+    total = len(records)
+    text = dumps(payload)
+    excess = len(text.encode("utf-8")) - budget * 4
+    # Keep at least one record, an empty page is never more useful than a long one
+    while excess > 0 and len(records) > 1:
+        excess -= len(orjson.dumps(records[-1])) + 1
+        records = records[:-1]
+        if excess <= 0 or len(records) == 1:
+            payload = {**payload, records_key: records, "omitted": total - len(records)}
+            if on_truncate:
+                on_truncate(payload, records)
+            text = dumps(payload)
+            excess = len(text.encode("utf-8")) - budget * 4
+    return text, total - len(records)
+
+
+def format_tool_output(tool: str, result: BaseModel, records_key: Optional[str] = None,
+                       on_truncate: Optional[Callable[[Dict[str, Any], List[Any]], None]] = None) -> str:
+    """
+    Serialize a tool result in the configured output mode and record its size.
+
+    Args:
+        tool (str): Tool name, used for budgets and stats
+        result (BaseModel): Result model from tool_models
+        records_key (Optional[str]): Field holding the list that may be trimmed to the token budget
+        on_truncate (Optional[Callable]): Called with the trimmed payload and the records kept,
+                                          so the tool can fix up fields such as a page token
+
+    Returns:
+        str: Serialized result
+    """
+    payload = result.model_dump(exclude_none=True)
+    if OUTPUT_MODE == "verbose":
+        return record_output(tool, dumps(payload, indent=True))
+
+    budget = TOOL_TOKEN_BUDGETS.get(tool, DEFAULT_TOKEN_BUDGET)
+    if records_key and isinstance(payload.get(records_key), list):
+        text, omitted = _fit_budget(payload, records_key, budget, on_truncate)
+    else:
+        text, omitted = dumps(payload), 0
+    return record_output(tool, text, omitted)
+
+
+def record_output(tool: str, text: str, omitted: int = 0) -> str:
+    """
+    Log and count the size of a tool result.
+
+    Args:
+        tool (str): Tool name
+        text (str): Result returned to the LLM
+        omitted (int): Records dropped to stay within the token budget
+
+    Returns:
+        str: The result, unchanged
+    """
+    tokens = estimate_tokens(text)
+    stats = _stats.setdefault(tool, {"calls": 0, "tokens_total": 0, "tokens_max": 0, "truncated": 0})
+    stats["calls"] += 1
+    stats["tokens_total"] += tokens
+    stats["tokens_max"] = max(stats["tokens_max"], tokens)
+    if omitted:
+        stats["truncated"] += 1
+        logger.info(f"{tool} result: ~{tokens} tokens, {omitted} records over the "
+                    f"{TOOL_TOKEN_BUDGETS.get(tool, DEFAULT_TOKEN_BUDGET)} token budget omitted")
+    else:
+        logger.info(f"{tool} result: ~{tokens} tokens")
+    return text
+
+
+def output_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Get per-tool output size counters.
+
+    Returns:
+        Dict: Calls, total and largest estimated tokens and budget truncations per tool
+    """
+    return {tool: dict(stats) for tool, stats in _stats.items()}
@@ -1,120 +1,243 @@
 from livekit.agents.llm import function_tool
-from typing import Optional, List, Dict, Any
+from pydantic import ValidationError
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Set, Tuple
 import asyncio
-import json
 import logging
 from datetime import datetime
 import uuid
 import datetime
 from datetime import timezone
 
-from database import TwiddlesDatabase
+from catalog_cache import get_catalog_cache
+from connection import get_database, get_write_buffer, close_database
+from copurchase import get_copurchase_index, order_products
+from database import DEFAULT_PAGE_SIZE, StorageBackend, decode_page_token, encode_page_token
+from recommendations import get_recommendation_refresher, live_recommendations
+from resilience import DatabaseUnavailable, get_database_guard
+from session_cache import (CATALOG_TAG, cached_result, invalidate, orders_tag, profile_tag, remember_result,
+                           sync_tag, wishlist_tag)
+from tool_models import (FeedbackRequest, FeedbackResult, OrderRequest, OrderResult, ProductPage,
+                         ProfileRequest, RecommendationRequest, RecommendationResult, ResolveRequest,
+                         ResolveResult, SearchRequest, SearchResult, UserInfoResult, UserRequest,
+                         WishlistAddRequest, WishlistAddResult, WishlistResult, validation_message)
+from tool_output import format_tool_output, record_output
 
 logger = logging.getLogger(__name__)
 
-_db_instance: Optional[TwiddlesDatabase] = None
-
-async def get_database() -> TwiddlesDatabase:
-    """Get or create database instance."""
-    global _db_instance
-    if _db_instance is None:
-        _db_instance = TwiddlesDatabase()
-        await _db_instance.connect()
-    return _db_instance
+# Projection profile (database.PROJECTION_PROFILES) requested by each product tool
+CATALOG_PROFILE = "voice-summary"
+CATALOG_DETAIL_PROFILE = "voice-detail"
+RECOMMENDATION_PROFILE = "voice-detail"
+ORDER_PROFILE = "order"
 
 @function_tool
-async def get_all_products() -> str:
+async def get_all_products(include_details: bool = False,
+                           page_token: Optional[str] = None,
+                           page_size: int = DEFAULT_PAGE_SIZE) -> str:
     """
-    Retrieve all products from the Twiddles database.
+    Retrieve products from the Twiddles catalog, one page at a time.
+    
+    Args:
+        include_details (bool): Also return size, description, ingredients and dietary
+                                information. Leave False to list names, prices, stock and ratings.
+        page_token (Optional[str]): next_page_token from a previous call to get the next page.
+                                    Leave empty for the first page.
+        page_size (int): Number of products per page (maximum 50)
     
     Returns:
-        str: JSON string containing all products with their details including name, price, 
-             description, ingredients, stock status, and ratings
+        str: JSON string with 'products' (name, category, price, stock status and rating,
+             plus description and ingredients when requested) and 'next_page_token',
+             which is null on the last page
              
     Example:
         products = await get_all_products()
+        more_products = await get_all_products(page_token="eyJhZnRlciI6ICJUVy1CVC0wMDQifQ==")
     """
     try:
-        db = await get_database()
-        
-        # Now using async database operations
-        products = await db.get_all_products()
-        
-        if products is None:
-            return "Error: Unable to retrieve products from database"
-        
+        arguments = (include_details, page_token, page_size)
+        cached, generation = _cached_catalog_result("get_all_products", *arguments)
+        if cached is not None:
+            return cached
+        
+        profile = CATALOG_DETAIL_PROFILE if include_details else CATALOG_PROFILE
+        if page_token:
+            # Reject bad tokens up front so they are not retried as database failures
+            decode_page_token(page_token)
+        
+        async def read_cached_page():
+            return await get_catalog_cache().get_products_page(
+                profile=profile, page_size=page_size, page_token=page_token
+            )
+        
+        async def read_page():
+            db = await get_database()
+            return await db.get_products_page(profile=profile, page_size=page_size, page_token=page_token)
+        
+        page = await _read_catalog("get_all_products", read_cached_page)
+        if page is None:
+            # Catalog cache unavailable, page straight from MongoDB
+            try:
+                page = await get_database_guard().call("get_all_products", read_page)
+            except DatabaseUnavailable:
+                return "The product catalog is temporarily unavailable. Please try again in a moment."
+        
+        products = page['products']
         if not products:
             return "No products found in the database"
         
-        # Convert ObjectId to string for JSON serialization
-        for product in products:
-            if '_id' in product:
-                product['_id'] = str(product['_id'])
-        
-        return json.dumps(products, indent=2, default=str)
-        
+        def resume_after_last(trimmed, kept):
+            # Products cut to fit the token budget start the next page instead of being skipped
+            trimmed['products_count'] = len(kept)
+            trimmed['next_page_token'] = encode_page_token(kept[-1]['product_id'])
+            trimmed.pop('omitted', None)
+        
+        output = format_tool_output("get_all_products", ProductPage(
+            products_count=len(products),
+            products=products,
+            next_page_token=page['next_page_token']
+        ), records_key='products', on_truncate=resume_after_last)
+        return remember_result("get_all_products", arguments, output, generation, CATALOG_TAG)
+        
+    except ValueError as e:
+        return f"Error: {str(e)}. Call get_all_products without a page_token to start again."
     except Exception as e:
         logger.error(f"Error in get_all_products: {e}")
         return f"Error occurred while retrieving products: {str(e)}"
 
 
-# @function_tool
-# async def search_products(category: Optional[str] = None, 
-#                          in_stock: Optional[bool] = None,
-#                          max_price: Optional[float] = None,
-#                          brand: Optional[str] = None) -> str:
-#     """
-#     Search for products based on specific criteria.
+@function_tool
+async def search_products(query: Optional[str] = None,
+                          category: Optional[str] = None,
+                          min_price: Optional[float] = None,
+                          max_price: Optional[float] = None,
+                          dietary_info: Optional[str] = None,
+                          ingredients: Optional[str] = None,
+                          in_stock: Optional[bool] = None,
+                          limit: int = 5) -> str:
+    """
+    Search the Twiddles catalog for the few products that match what the customer asked for.
+    Prefer this over get_all_products whenever the customer names a kind of product, a
+    price, a diet or an ingredient.
     
-#     Args:
-#         category (Optional[str]): Product category (e.g., "Spreads", "Bites", "Combo")
-#         in_stock (Optional[bool]): Filter by stock availability (True/False)
-#         max_price (Optional[float]): Maximum price filter
-#         brand (Optional[str]): Brand name filter
-        
-#     Returns:
-#         str: JSON string containing filtered products matching the criteria
-        
-#     Example:
-#         products = await search_products(category="Spreads", in_stock=True, max_price=300)
-#     """
-#     try:
-#         db = get_database()
-        
-#         # Build filter dictionary
-#         filter_dict = {}
-#         if category:
-#             filter_dict['category'] = category
-#         if in_stock is not None:
-#             filter_dict['in_stock'] = in_stock
-#         if max_price is not None:
-#             filter_dict['price'] = {'$lte': max_price}
-#         if brand:
-#             filter_dict['brand'] = brand
-        
-#         loop = asyncio.get_event_loop()
-#         products = await loop.run_in_executor(None, db.get_products_by_filter, filter_dict)
-        
-#         if products is None:
-#             return "Error: Unable to search products in database"
-        
-#         if not products:
-#             return f"No products found matching the criteria: {filter_dict}"
-        
-#         # Convert ObjectId to string for JSON serialization
-#         for product in products:
-#             if '_id' in product:
-#                 product['_id'] = str(product['_id'])
-        
-#         return json.dumps({
-#             'filter_applied': filter_dict,
-#             'products_found': len(products),
-#             'products': products
-#         }, indent=2, default=str)
-        
-#     except Exception as e:
-#         logger.error(f"Error in search_products: {e}")
-#         return f"Error occurred while searching products: {str(e)}"
+    Args:
+        query (Optional[str]): Keywords from the product name or description (e.g., "chocolate crunch")
+        category (Optional[str]): Product category (e.g., "Spreads", "Bites", "Combo")
+        min_price (Optional[float]): Minimum price in rupees
+        max_price (Optional[float]): Maximum price in rupees
+        dietary_info (Optional[str]): Comma-separated dietary labels that must all apply
+                                      (e.g., "Vegan, Gluten Free")
+        ingredients (Optional[str]): Comma-separated ingredients that must all be present (e.g., "Dates, Almonds")
+        in_stock (Optional[bool]): True for available products only
+        limit (int): Number of products to return (maximum 10)
+        
+    Returns:
+        str: JSON string with the best matching 'products' (name matches first, then by rating),
+             'total_matches' or, for broad searches, 'more_available', and 'unmatched_terms',
+             query words that were ignored because no product matched them together with the rest
+        
+    Example:
+        spreads = await search_products(category="Spreads", max_price=300, in_stock=True)
+    """
+    try:
+        try:
+            request = SearchRequest(query=query or None, category=category or None, min_price=min_price,
+                                    max_price=max_price, dietary_info=dietary_info,
+                                    ingredients=ingredients, in_stock=in_stock, limit=limit)
+        except ValidationError as e:
+            return validation_message(e)
+        
+        arguments = tuple(tuple(value) if isinstance(value, list) else value
+                          for value in request.model_dump().values())
+        cached, generation = _cached_catalog_result("search_products", *arguments)
+        if cached is not None:
+            return cached
+        
+        async def search():
+            # Served from the catalog cache's search index; only its first load reads MongoDB
+            return await get_catalog_cache().search_products(
+                query=request.query, category=request.category, min_price=request.min_price,
+                max_price=request.max_price, dietary=request.dietary_info,
+                ingredients=request.ingredients, in_stock=request.in_stock,
+                limit=request.limit, profile=CATALOG_DETAIL_PROFILE
+            )
+        
+        try:
+            hits = await get_database_guard().call("search_products", search, circuit="catalog")
+        except DatabaseUnavailable:
+            hits = None
+        if hits is None:
+            return "Product search is temporarily unavailable. Please try again in a moment."
+        
+        if not hits['products']:
+            output = "No products found matching the search. Try fewer filters or a broader category."
+        else:
+            output = format_tool_output("search_products", SearchResult(
+                total_matches=hits['total'],
+                # Broad searches stop counting once they have enough products
+                more_available=True if hits['total'] is None else None,
+                products=hits['products'],
+                unmatched_terms=hits['unmatched_terms'] or None
+            ), records_key='products')
+        return remember_result("search_products", arguments, output, generation, CATALOG_TAG)
+        
+    except Exception as e:
+        logger.error(f"Error in search_products: {e}")
+        return f"Error occurred while searching products: {str(e)}"
+
+@function_tool
+async def resolve_product_name(spoken_name: str, limit: int = 3) -> str:
+    """
+    Find the catalog product the customer named. Speech recognition often misspells product
+    names or writes them in Hindi script; use this to turn what the customer said into a
+    product_id before ordering or adding to the wishlist.
+    
+    Args:
+        spoken_name (str): The product name as heard (e.g., "orange noir bites", "वॉलनट ब्राउनी स्प्रेड")
+        limit (int): Number of candidates to return (maximum 5)
+        
+    Returns:
+        str: JSON string with 'product_id' when one product clearly matches, and 'candidates'
+             with name, price, stock and 'confidence' from 0 to 1. Without 'product_id',
+             ask the customer which candidate they meant.
+        
+    Example:
+        match = await resolve_product_name("orange nwar bites")
+    """
+    try:
+        try:
+            request = ResolveRequest(spoken_name=spoken_name, limit=limit)
+        except ValidationError as e:
+            return validation_message(e)
+        
+        arguments = (request.spoken_name, request.limit)
+        cached, generation = _cached_catalog_result("resolve_product_name", *arguments)
+        if cached is not None:
+            return cached
+        
+        async def resolve():
+            return await get_catalog_cache().resolve_product(request.spoken_name, limit=request.limit,
+                                                             profile=CATALOG_PROFILE)
+        
+        try:
+            resolution = await get_database_guard().call("resolve_product_name", resolve, circuit="catalog")
+        except DatabaseUnavailable:
+            resolution = None
+        if resolution is None:
+            return "Product lookup is temporarily unavailable. Please try again in a moment."
+        
+        if not resolution['candidates']:
+            output = (f"No product sounds like '{request.spoken_name}'. Ask the customer to repeat "
+                      f"the name, or use search_products.")
+        else:
+            output = format_tool_output("resolve_product_name", ResolveResult(
+                product_id=resolution['product_id'],
+                candidates=resolution['candidates']
+            ), records_key='candidates')
+        return remember_result("resolve_product_name", arguments, output, generation, CATALOG_TAG)
+        
+    except Exception as e:
+        logger.error(f"Error in resolve_product_name: {e}")
+        return f"Error occurred while resolving product name: {str(e)}"
 
 @function_tool
 async def get_user_wishlist(user_id: str) -> str:
@@ -132,30 +255,34 @@ async def get_user_wishlist(user_id: str) -> str:
         wishlist = await get_user_wishlist("user001")
     """
     try:
-        if not user_id:
-            return "Error: User ID is required"
+        try:
+            user_id = UserRequest(user_id=user_id).user_id
+        except ValidationError as e:
+            return validation_message(e)
+        
+        cached, generation = cached_result("get_user_wishlist", user_id)
+        if cached is not None:
+            return cached
         
         db = await get_database()
         
-        # Now using async database operations
-        wishlist = await db.get_user_wishlist(user_id)
+        async def read_wishlist():
+            await (await get_write_buffer()).sync_user(user_id)
+            return await db.get_user_wishlist(user_id)
         
-        if wishlist is None:
-            return f"Error: Unable to retrieve wishlist for user {user_id}"
+        try:
+            wishlist = await get_database_guard().call("get_user_wishlist", read_wishlist)
+        except DatabaseUnavailable:
+            return "The wishlist is temporarily unavailable. Please try again in a moment."
         
         if not wishlist:
-            return f"No wishlist items found for user {user_id}"
-        
-        # Convert ObjectId to string for JSON serialization
-        for item in wishlist:
-            if '_id' in item:
-                item['_id'] = str(item['_id'])
-        
-        return json.dumps({
-            'user_id': user_id,
-            'wishlist_count': len(wishlist),
-            'wishlist_items': wishlist
-        }, indent=2, default=str)
+            output = f"No wishlist items found for user {user_id}"
+        else:
+            output = format_tool_output("get_user_wishlist", WishlistResult(
+                wishlist_count=len(wishlist),
+                wishlist_items=wishlist
+            ), records_key='wishlist_items')
+        return remember_result("get_user_wishlist", (user_id,), output, generation, wishlist_tag(user_id))
         
     except Exception as e:
         logger.error(f"Error in get_user_wishlist: {e}")
@@ -177,23 +304,21 @@ async def create_user_profile(user_name: str,
         email (str): The email of the user optional
         preferred_language (str): The preferred language of the user
     """
-    user_information = {
-        "name": user_name,
-        "phone": phone_number,
-        "preferred_language": preferred_language
-    }
-    db = await get_database()
-    if location:
-        user_information["location"] = location
-    
-    if email:
-        user_information["email"] = email
+    try:
+        profile = ProfileRequest(name=user_name, phone=phone_number, location=location or None,
+                                 email=email or None, preferred_language=preferred_language)
+    except ValidationError as e:
+        return validation_message(e)
+    user_information = profile.model_dump(exclude_none=True)
+    # Acknowledged once queued; the write-behind buffer persists it in the next batch
+    write_buffer = await get_write_buffer()
     
     user_information["registration_date"] = datetime.datetime.now(timezone.utc)
     user_information["customer_type"] = "new"
     
-    user_id = await db.create_user_profile(user_information)
-    return user_id
+    user_id = await write_buffer.create_user_profile(user_information)
+    invalidate(profile_tag(user_id))
+    return record_output("create_user_profile", user_id)
     
 
 @function_tool
@@ -208,46 +333,49 @@ async def add_items_to_wishlist(user_id: str, product_id: str,
     
     Args:
         user_id (str): Unique identifier for the user
-        product_id (str): Product ID to add to wishlist
+        product_id (str): Product ID to add to wishlist; a product name is resolved
+                          if it clearly matches one product
         quantity_desired (int): Desired quantity
         
     Returns:
-        str: Success message with the added item ID or error message
+        str: Success message with the added product ID or error message
         
     Example:
         result = await add_items_to_wishlist("user001", "TW-BT-001", 2)
     """
     try:
-        if not user_id or not product_id:
-            return "Error: User ID and Product ID are required"
+        try:
+            request = WishlistAddRequest(user_id=user_id, product_id=product_id,
+                                         quantity_desired=quantity_desired, priority=priority)
+        except ValidationError as e:
+            return validation_message(e)
         
-        if priority not in ["high", "medium", "low"]:
-            return "Error: Priority must be 'high', 'medium', or 'low'"
+        product_id, problem = await _resolve_product_reference(request.product_id)
+        if problem is not None:
+            return f"Error: {problem}"
+        request.product_id = product_id
         
-        db = get_database()
+        write_buffer = await get_write_buffer()
         
         # Create wishlist item
         wishlist_item = {
-            "product_id": product_id,
+            "product_id": request.product_id,
             "added_date": datetime.datetime.now(timezone.utc),
-           
-            "quantity_desired": quantity_desired,
-           
+            "quantity_desired": request.quantity_desired,
         }
         
-        # Now using async database operations
-        item_ids = await db.add_to_wishlist(user_id, [wishlist_item])
+        # Queued for the next write-behind batch, reads of this wishlist flush it first
+        product_ids = await write_buffer.add_to_wishlist(request.user_id, [wishlist_item])
         
-        if item_ids is None:
+        invalidate(wishlist_tag(request.user_id))
+        get_recommendation_refresher().user_changed(request.user_id)
+        if product_ids is None:
             return f"Error: Unable to add item to wishlist for user {user_id}"
         
-        return json.dumps({
-            'status': 'success',
-            'message': f'Item added to wishlist for user {user_id}',
-            'item_id': item_ids[0],
-            'product_id': product_id,
-            'added_item': wishlist_item
-        }, indent=2, default=str)
+        return format_tool_output("add_items_to_wishlist", WishlistAddResult(
+            message=f'Item added to wishlist for user {request.user_id}',
+            product_id=request.product_id
+        ))
         
     except Exception as e:
         logger.error(f"Error in add_items_to_wishlist: {e}")
@@ -266,12 +394,14 @@ async def create_product_order(user_id: str,
         user_id (str): User id which was mention in the session data
         items (str): JSON string of items with product_id and quantity
                     Example: '[{"product_id": "TW-BT-001", "quantity": 2}]'
+                    Product names are resolved if they clearly match one product
         shipping_address (str): Delivery address which is mention in the session data
         payment_method (str): Payment method ("online", "cod") which is mention in the session data if not default online
         special_instructions (str): Any special delivery instructions
         
     Returns:
-        str: JSON string with order confirmation details and order ID
+        str: JSON string with the order ID, each item's name, quantity and line total,
+             and the order total in rupees to confirm with the customer
         
     Example:
         order = await create_product_order("user001", 
@@ -279,58 +409,99 @@ async def create_product_order(user_id: str,
                                          "123 Main St, City")
     """
     try:
-        if not user_id or not items or not shipping_address:
-            return "Error: User ID, items, and shipping address are required"
-        
-        # Parse items from JSON string
         try:
-            parsed_items = json.loads(items)
-        except json.JSONDecodeError as e:
-            return f"Error: Invalid JSON format for items. Expected format: '[{{\"product_id\": \"TW-BT-001\", \"quantity\": 2}}]'. Error: {str(e)}"
-        
-        # Validate parsed items
-        if not isinstance(parsed_items, list) or not parsed_items:
-            return "Error: Items must be a non-empty list after parsing JSON"
-        
-        # Validate each item structure
-        for i, item in enumerate(parsed_items):
-            if not isinstance(item, dict):
-                return f"Error: Item {i+1} must be a dictionary with product_id and quantity"
-            if "product_id" not in item or "quantity" not in item:
-                return f"Error: Item {i+1} must contain both 'product_id' and 'quantity' fields"
-            if not isinstance(item.get("quantity"), (int, float)) or item.get("quantity") <= 0:
-                return f"Error: Item {i+1} quantity must be a positive number"
+            request = OrderRequest(user_id=user_id, items=items or "[]", shipping_address=shipping_address,
+                                   payment_method=payment_method,
+                                   special_instructions=special_instructions or None)
+        except ValidationError as e:
+            return (f"{validation_message(e)}. Expected items like "
+                    f"'[{{\"product_id\": \"TW-BT-001\", \"quantity\": 2}}]'")
+        
+        problems = []
+        for position, item in enumerate(request.items, 1):
+            product_id, problem = await _resolve_product_reference(item.product_id)
+            if problem is not None:
+                problems.append(f"items[{position}]: {problem}")
+            item.product_id = product_id
+        if problems:
+            return "Error: " + " ".join(problems)
+        
+        # One line per product, keeping the position of its first mention for messages
+        quantities: Dict[str, Any] = {}
+        positions: Dict[str, int] = {}
+        for position, item in enumerate(request.items, 1):
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            positions.setdefault(item.product_id, position)
         
         db = await get_database()
         
+        async def read_cached_products():
+            return await get_catalog_cache().get_products(list(quantities), profile=ORDER_PROFILE)
+        
+        async def read_products():
+            return await db.get_products_by_filter({"product_id": {"$in": list(quantities)}}, ORDER_PROFILE)
+        
+        products = await _read_catalog("create_product_order", read_cached_products)
+        if products is None:
+            # Catalog cache unavailable, one $in lookup for every line
+            try:
+                products = await get_database_guard().call("create_product_order", read_products)
+            except DatabaseUnavailable:
+                return "Error: Ordering is temporarily unavailable and no order was placed. Please try again shortly."
+        
+        lines, reservations, problems = _price_order_lines(quantities, positions, products)
+        if problems:
+            return "Error: " + " ".join(problems) + " No order was placed."
+        
+        if reservations:
+            reserving: List[asyncio.Task] = []
+            
+            def reserve():
+                # Shielded, so a reservation the deadline cuts off still finishes and can be undone
+                reserving.append(asyncio.ensure_future(db.reserve_stock(reservations)))
+                return asyncio.shield(reserving[0])
+            
+            try:
+                short = await get_database_guard().call("create_product_order", reserve, idempotent=False)
+            except DatabaseUnavailable:
+                if reserving:
+                    _release_when_reserved(db, reservations, reserving[0])
+                return "Error: Ordering is temporarily unavailable and no order was placed. Please try again shortly."
+            if short:
+                names = ", ".join(_product_label(line) for line in lines if line['product_id'] in short)
+                return (f"Error: Not enough stock left for {names}. No order was placed; "
+                        f"offer a smaller quantity or another product.")
+        
         order_data = {
-            "user_id": user_id,
-            "items": parsed_items,  # Use parsed items list
-            "shipping_address": shipping_address,
-            "payment_method": payment_method,
-            "special_instructions": special_instructions if special_instructions else None,
+            **request.model_dump(exclude={'items'}),
+            "items": lines,
+            "total_amount": round(sum(line['line_total'] for line in lines), 2),
             "order_status": "pending",
             "created_at": datetime.datetime.now(timezone.utc)
         }
         
-        order_id = await db.create_order(order_data)
-        
-        if order_id is None:
-            return "Error: Unable to create order"
-        
-        return json.dumps({
-            'status': 'success',
-            'message': 'Order created successfully',
-            'order_id': order_id,
-            'order_details': {
-                'user_id': user_id,
-                'items': parsed_items,
-                'shipping_address': shipping_address,
-                'payment_method': payment_method,
-                'special_instructions': special_instructions,
-                'order_status': 'pending'
-            }
-        }, indent=2, default=str)
+        try:
+            # Orders are not idempotent, so they get a single attempt and are never retried
+            order_id = await get_database_guard().call(
+                "create_product_order", lambda: db.create_order(order_data), idempotent=False
+            )
+        except DatabaseUnavailable as e:
+            if e.reason == "timed out":
+                # The insert may still land, so the order's stock stays reserved
+                invalidate(orders_tag(request.user_id))
+                return ("Error: The order could not be confirmed in time and may or may not have been placed. "
+                        "Do not place it again; ask the user to check their orders before retrying.")
+            # Rejected by the open circuit or failed (create_order returned None): nothing was written
+            _release_in_background(db, reservations)
+            return "Error: Ordering is temporarily unavailable and no order was placed. Please try again shortly."
+        
+        invalidate(orders_tag(request.user_id))
+        (await get_copurchase_index()).add_order(order_products(order_data), str(order_id))
+        get_recommendation_refresher().user_changed(request.user_id)
+        
+        return format_tool_output("create_product_order", OrderResult(
+            order_id=str(order_id), items=lines, total_amount=order_data['total_amount']
+        ))
         
     except Exception as e:
         logger.error(f"Error in create_product_order: {e}")
@@ -359,43 +530,28 @@ async def submit_product_feedback(user_id: str,
                                                "Great taste and quality!")
     """
     try:
-        if not user_id or not product_id or not review_text:
-            return "Error: User ID, Product ID, and review text are required"
-        
-        # Convert rating string to float for validation
         try:
-            rating_float = float(rating)
-        except ValueError:
-            return "Error: Rating must be a valid number"
+            request = FeedbackRequest(user_id=user_id, product_id=product_id, rating=rating,
+                                      review_text=review_text, order_id=order_id or None)
+        except ValidationError as e:
+            return validation_message(e)
         
-        if not (1.0 <= rating_float <= 5.0):
-            return "Error: Rating must be between 1.0 and 5.0"
-        
-        db = await get_database()
+        write_buffer = await get_write_buffer()
         
         # Create feedback data
         feedback_data = {
-            "user_id": user_id,
-            "product_id": product_id,
-            "rating": rating_float,  # Use the converted float value
-            "review_text": review_text,
-            "order_id": order_id,
+            **request.model_dump(),
             "created_at": datetime.datetime.now(timezone.utc),
-            "verified_purchase": order_id is not None
+            "verified_purchase": request.order_id is not None
         }
         
-        # Now using async database operations
-        feedback_id = await db.add_feedback(feedback_data)
+        # Acknowledged once queued; the write-behind buffer persists it in the next batch
+        feedback_id = await write_buffer.add_feedback(feedback_data)
         
         if feedback_id is None:
             return "Error: Unable to submit feedback"
         
-        return json.dumps({
-            'status': 'success',
-            'message': 'Feedback submitted successfully',
-            'feedback_id': feedback_id,
-            'feedback_details': feedback_data
-        }, indent=2, default=str)
+        return format_tool_output("submit_product_feedback", FeedbackResult(feedback_id=str(feedback_id)))
         
     except Exception as e:
         logger.error(f"Error in submit_product_feedback: {e}")
@@ -406,7 +562,9 @@ async def get_product_recommendations(user_id: str,
                                     category: Optional[str] = None,
                                     max_price: Optional[str] = None) -> str:
     """
-    Get product recommendations for a user based on their wishlist and preferences.
+    Get product recommendations for a user: products other customers ordered together with
+    the ones they ordered, then products whose ingredients and dietary labels are most like
+    those in their wishlist and past orders, or top-rated products for new users.
     
     Args:
         user_id (str): Unique identifier for the user
@@ -420,59 +578,68 @@ async def get_product_recommendations(user_id: str,
         recommendations = await get_product_recommendations("user001", "Spreads", 300)
     """
     try:
-        if not user_id:
-            return "Error: User ID is required"
+        try:
+            request = RecommendationRequest(user_id=user_id, category=category or None,
+                                            max_price=max_price or None)
+        except ValidationError as e:
+            return validation_message(e)
+        user_id = request.user_id
         
-        db = await get_database()
-        max_price = float(max_price) if max_price else None
+        arguments = (user_id, request.category, request.max_price)
+        cached, generation = _cached_catalog_result("get_product_recommendations", *arguments)
+        if cached is not None:
+            return cached
         
-        # Get user's wishlist to understand preferences
-        wishlist = await db.get_user_wishlist(user_id)
+        db = await get_database()
         
-        # Build recommendation filter based on wishlist and parameters
+        # Build recommendation filter based on parameters
         filter_dict = {'in_stock': True}  # Only recommend available products
         
-        if category:
-            filter_dict['category'] = category
-        if max_price:
-            filter_dict['price'] = {'$lte': max_price}
-        
-        # Get products matching criteria
-        products = await db.get_products_by_filter(filter_dict)
-        
-        if products is None:
+        if request.category:
+            filter_dict['category'] = request.category
+        if request.max_price:
+            filter_dict['price'] = {'$lte': request.max_price}
+        
+        async def read_recommendations():
+            # A fresh precomputed list is one indexed lookup, filtered against the catalog cache
+            recommended = await get_recommendation_refresher().lookup(
+                user_id, category=request.category, max_price=request.max_price,
+                limit=5, profile=RECOMMENDATION_PROFILE
+            )
+            if recommended is not None:
+                return recommended
+            return await live_recommendations(db, user_id, category=request.category,
+                                              max_price=request.max_price, limit=5,
+                                              profile=RECOMMENDATION_PROFILE)
+        
+        degraded = False
+        try:
+            recommended_products = await get_database_guard().call(
+                "get_product_recommendations", read_recommendations
+            )
+        except DatabaseUnavailable:
+            recommended_products = await _cached_recommendations(filter_dict)
+            degraded = True
+        
+        if recommended_products is None:
             return "Error: Unable to get product recommendations"
         
-        if not products:
+        if not recommended_products:
             return "No products found matching recommendation criteria"
         
-        # Filter out products already in wishlist
-        wishlist_product_ids = []
-        if wishlist:
-            wishlist_product_ids = [item.get('product_id') for item in wishlist]
-        
-        recommended_products = [
-            product for product in products 
-            if product.get('product_id') not in wishlist_product_ids
-        ]
-        
-        # Sort by rating (highest first)
-        recommended_products.sort(key=lambda x: x.get('rating', 0), reverse=True)
-        
-        # Limit to top 5 recommendations
-        recommended_products = recommended_products[:5]
-        
-        # Convert ObjectId to string for JSON serialization
-        for product in recommended_products:
-            if '_id' in product:
-                product['_id'] = str(product['_id'])
-        
-        return json.dumps({
-            'user_id': user_id,
-            'recommendation_criteria': filter_dict,
-            'total_recommendations': len(recommended_products),
-            'recommended_products': recommended_products
-        }, indent=2, default=str)
+        response = RecommendationResult(
+            total_recommendations=len(recommended_products),
+            recommended_products=recommended_products
+        )
+        if degraded:
+            response.note = "Top-rated products from the cached catalog; wishlist items may be included"
+            return format_tool_output("get_product_recommendations", response,
+                                      records_key='recommended_products')
+        output = format_tool_output("get_product_recommendations", response,
+                                    records_key='recommended_products')
+        # Recommendations exclude wishlist items, so wishlist changes invalidate them too
+        return remember_result("get_product_recommendations", arguments, output, generation,
+                               wishlist_tag(user_id), orders_tag(user_id), CATALOG_TAG)
         
     except Exception as e:
         logger.error(f"Error in get_product_recommendations: {e}")
@@ -495,13 +662,26 @@ async def get_user_info(user_id: str) -> str:
         user_info = await get_user_info("new_user_001")
     """
     try:
-        if not user_id:
-            return "Error: User ID is required"
+        try:
+            user_id = UserRequest(user_id=user_id).user_id
+        except ValidationError as e:
+            return validation_message(e)
+        
+        cached, generation = cached_result("get_user_info", user_id)
+        if cached is not None:
+            return cached
         
         db = await get_database()
         
-        # Now using async database operations
-        user_profile = await db.get_user_profile(user_id)
+        async def read_profile():
+            await (await get_write_buffer()).sync_user(user_id)
+            return await db.get_user_profile(user_id)
+        
+        try:
+            # None means "no such user" here, so only timeouts and errors count as failures
+            user_profile = await get_database_guard().call("get_user_info", read_profile, none_is_failure=False)
+        except DatabaseUnavailable:
+            return "User details are temporarily unavailable. Continue with the session details you already have."
         
         if user_profile is None:
             return f"Error: Unable to retrieve user profile for {user_id}"
@@ -509,27 +689,186 @@ async def get_user_info(user_id: str) -> str:
         if not user_profile:
             return f"No user profile found for user ID: {user_id}"
         
-        # Convert datetime objects to string for JSON serialization
-        if 'registration_date' in user_profile:
-            user_profile['registration_date'] = user_profile['registration_date'].isoformat()
-        if 'created_at' in user_profile:
-            user_profile['created_at'] = user_profile['created_at'].isoformat()
-        if 'updated_at' in user_profile:
-            user_profile['updated_at'] = user_profile['updated_at'].isoformat()
-        
-        return json.dumps({
-            'status': 'success',
-            'user_profile': user_profile
-        }, indent=2, default=str)
+        output = format_tool_output("get_user_info", UserInfoResult(user_profile=user_profile))
+        return remember_result("get_user_info", (user_id,), output, generation, profile_tag(user_id))
         
     except Exception as e:
         logger.error(f"Error in get_user_info: {e}")
         return f"Error occurred while retrieving user info for {user_id}: {str(e)}"
 
+async def _cached_recommendations(filter_dict: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Top-rated products from the catalog cache, used when the database is unavailable."""
+    cache = get_catalog_cache()
+    if cache.age_seconds() is None:
+        # Never loaded: loading would hit the same unavailable database
+        return None
+    products = await cache.get_products_by_filter(filter_dict, profile=RECOMMENDATION_PROFILE)
+    if products is None:
+        return None
+    products.sort(key=lambda product: (-product.get('rating', 0), product.get('product_id', '')))
+    return products[:5]
+
+def _cached_catalog_result(tool: str, *args: Any) -> Tuple[Optional[str], int]:
+    """
+    Look up a session result tagged with CATALOG_TAG.
+
+    The change feed updates the process-wide catalog cache outside any session, so the
+    session's catalog results are dropped here once the catalog generation has moved.
+    """
+    sync_tag(CATALOG_TAG, get_catalog_cache().generation)
+    return cached_result(tool, *args)
+
+
+async def _read_catalog(operation: str, read: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Read from the catalog cache on the guard's catalog circuit.
+
+    A slow first load or index build then never counts against the database circuit
+    that orders and wishlist writes depend on. There is no retry: the caller falls
+    back to a database read instead.
+
+    Args:
+        operation (str): Tool name, used for budgets and counters
+        read (Callable): Zero-argument coroutine function reading the catalog cache
+
+    Returns:
+        Any: The read's result, None if the cache could not serve it
+    """
+    try:
+        return await get_database_guard().call(operation, read, idempotent=False, circuit="catalog",
+                                               has_fallback=True)
+    except DatabaseUnavailable:
+        return None
+
+
+async def _resolve_product_reference(reference: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Check a product_id passed to a write tool, resolving spoken product names.
+
+    The LLM sometimes passes what the customer said ("orange noir bites") or a misheard
+    ID instead of a catalog product_id. While the catalog cannot be read the reference is
+    passed through unchanged, so writes never fail on validation alone.
+
+    Args:
+        reference (str): product_id argument as passed by the LLM
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The product ID to use, or None and a problem
+            naming the candidates to confirm with the customer
+    """
+    async def resolve():
+        return await get_catalog_cache().resolve_product(reference, profile=CATALOG_PROFILE)
+    
+    try:
+        # Unresolved references are passed on as product IDs
+        resolution = await get_database_guard().call("resolve_product_name", resolve, circuit="catalog",
+                                                     has_fallback=True)
+    except DatabaseUnavailable:
+        resolution = None
+    if resolution is None:
+        return reference, None
+    if resolution['product_id'] is not None:
+        return resolution['product_id'], None
+    if not resolution['candidates']:
+        return None, (f"No product matches '{reference}'. Ask the customer to repeat the product "
+                      f"name, or use search_products.")
+    options = "; ".join(f"{candidate.get('name')} ({candidate['product_id']})"
+                        for candidate in resolution['candidates'])
+    return None, (f"'{reference}' is not a product ID and could be: {options}. "
+                  f"Confirm with the customer and pass the product_id.")
+
+def _product_label(product: Dict[str, Any]) -> str:
+    """Name and ID of a product for messages to the LLM."""
+    name = product.get('name')
+    return f"{name} ({product['product_id']})" if name else product['product_id']
+
+
+def _price_order_lines(quantities: Dict[str, Any], positions: Dict[str, int],
+                       products: List[Dict[str, Any]]
+                       ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+    """
+    Check order lines against the catalog and price them.
+
+    Args:
+        quantities (Dict[str, Any]): Quantity ordered per product ID, in order
+        positions (Dict[str, int]): 1-based position of each product in the request
+        products (List[Dict]): Catalog products in the ORDER_PROFILE projection
+
+    Returns:
+        Tuple: Priced lines (product_id, name, quantity, unit_price, line_total), the
+            lines to reserve for products that track stock_quantity, and the problems
+            found, one per line that cannot be ordered
+    """
+    by_id = {product['product_id']: product for product in products}
+    lines, reservations, problems = [], [], []
+    for product_id, quantity in quantities.items():
+        product = by_id.get(product_id)
+        position = positions[product_id]
+        if product is None:
+            problems.append(f"items[{position}]: No product with ID '{product_id}'. "
+                            f"Use resolve_product_name or search_products to find it.")
+            continue
+        price = product.get('price')
+        stock = product.get('stock_quantity')
+        if not product.get('in_stock'):
+            problems.append(f"items[{position}]: {_product_label(product)} is out of stock.")
+        elif not isinstance(price, (int, float)):
+            problems.append(f"items[{position}]: {_product_label(product)} has no price and cannot be ordered.")
+        elif isinstance(stock, (int, float)) and stock < quantity:
+            problems.append(f"items[{position}]: only {stock:g} of {_product_label(product)} left in stock.")
+        else:
+            lines.append({"product_id": product_id, "name": product.get('name'), "quantity": quantity,
+                          "unit_price": price, "line_total": round(price * quantity, 2)})
+            if isinstance(stock, (int, float)):
+                reservations.append({"product_id": product_id, "quantity": quantity})
+    return lines, reservations, problems
+
+
+# Stock releases running after the tool call that started them has returned
+_releases: Set[asyncio.Task] = set()
+
+
+def _release_when_reserved(db: StorageBackend, reservations: List[Dict[str, Any]],
+                           reservation: asyncio.Task) -> None:
+    """Give back a timed-out reservation once it completes, if it reserved the stock."""
+    def on_done(task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None or task.result() != []:
+            # Short or failed reservations have already given back what they took
+            return
+        _release_in_background(db, reservations)
+    
+    reservation.add_done_callback(on_done)
+
+
+def _release_in_background(db: StorageBackend, reservations: List[Dict[str, Any]]) -> None:
+    """Give back stock reserved for an order that was not stored, without holding up the reply."""
+    if not reservations:
+        return
+    release = asyncio.ensure_future(_release_stock(db, reservations))
+    _releases.add(release)
+    release.add_done_callback(_releases.discard)
+
+
+async def _release_stock(db: StorageBackend, reservations: List[Dict[str, Any]],
+                         attempts: int = 3) -> None:
+    """Give back reserved stock, waiting out an open circuit between attempts."""
+    guard = get_database_guard()
+    released = False
+    for attempt in range(attempts):
+        try:
+            released = await guard.call(
+                "create_product_order", lambda: db.release_stock(reservations), idempotent=False
+            )
+        except DatabaseUnavailable as e:
+            if e.reason == "circuit open" and attempt + 1 < attempts:
+                # The breaker lets a probe through once its reset timeout has passed
+                await asyncio.sleep(guard.breaker.reset_timeout)
+                continue
+        break
+    if not released:
+        logger.error(f"Stock reserved for an unplaced order was not released: {reservations}")
+
 # Cleanup function to close database connection
 async def cleanup_database():
-    """Close database connection when done."""
-    global _db_instance
-    if _db_instance is not None:
-        await _db_instance.disconnect()
-        _db_instance = None
\ No newline at end of file
+    """Close the shared database connection when done."""
+    await close_database()
\ No newline at end of file
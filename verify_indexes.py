@@ -0,0 +1,50 @@
+"""
+Index bootstrap and query-plan diagnostics.
+
+Usage:
+    python verify_indexes.py [--no-create]
+
+Creates the indexes in ``database.INDEX_SPECS`` (unless ``--no-create``), then runs
+``explain()`` on every query shape the tools issue and exits with status 1 if any of
+them is planned as a collection scan.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from database import TwiddlesDatabase, QueryPlanError
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> int:
+    """Bootstrap indexes, verify query plans and return the process exit code."""
+    parser = argparse.ArgumentParser(description="Verify that tool queries are index-backed")
+    parser.add_argument("--no-create", action="store_true", help="Only verify, do not create indexes")
+    args = parser.parse_args()
+
+    async with TwiddlesDatabase() as db:
+        if db.db is None:
+            logger.error("Database not connected")
+            return 2
+
+        if not args.no_create and not await db.ensure_indexes():
+            logger.error("Index bootstrap failed")
+            return 1
+
+        try:
+            plans = await db.verify_query_plans()
+        except QueryPlanError as e:
+            logger.error(str(e))
+            return 1
+
+        for name, stages in plans.items():
+            print(f"{name}: {' <- '.join(stages)}")
+        print("All query shapes are index-backed")
+        return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,310 @@
+"""
+Write-behind buffering for low-criticality writes.
+
+Feedback, new user profiles and wishlist additions are acknowledged as soon as they
+are queued, so the conversation turn does not wait on a majority-acknowledged write.
+A background task groups queued writes into one ``insert_documents`` (insert_many)
+per collection and one wishlist ``bulk_write`` per user, flushing when the batch size
+or the flush interval is reached and once more on shutdown. Orders are never
+buffered: ``create_order`` stays synchronous so the user hears a confirmed order ID.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+from database import WISHLISTS_COLLECTION, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Queue of pending inserts and wishlist upserts for one storage backend.
+
+    Document IDs are generated client-side when a write is queued, so callers get the
+    same ID they would have received from a synchronous insert. Reads that must see
+    a user's own writes call ``sync_user()`` first, which flushes only when that user
+    has something pending.
+    """
+
+    def __init__(self, database: StorageBackend,
+                 batch_size: int = 100,
+                 flush_interval_ms: float = 250,
+                 max_queue_size: int = 10000,
+                 max_attempts: int = 3):
+        """
+        Initialize an empty buffer; call ``start()`` to begin background flushing.
+
+        Args:
+            database (StorageBackend): Backend the batches are written to
+            batch_size (int): Queued writes that trigger an immediate flush
+            flush_interval_ms (float): Longest time a write waits in the queue
+            max_queue_size (int): Queue depth at which writers wait for a flush
+            max_attempts (int): Flush attempts per write before it is dropped
+        """
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.max_attempts = max_attempts
+
+        self._inserts: Dict[str, List[Dict[str, Any]]] = {}
+        self._wishlist: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._pending_users: Set[str] = set()
+        self._attempts: Dict[int, int] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+
+    @classmethod
+    def from_env(cls, database: StorageBackend) -> "WriteBehindBuffer":
+        """Build a buffer from WRITE_BEHIND_BATCH_SIZE, _FLUSH_INTERVAL_MS and _MAX_QUEUE_SIZE."""
+        return cls(
+            database,
+            batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100")),
+            flush_interval_ms=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "250")),
+            max_queue_size=int(os.getenv("WRITE_BEHIND_MAX_QUEUE_SIZE", "10000")),
+        )
+
+    @property
+    def depth(self) -> int:
+        """Number of writes waiting to be flushed."""
+        return sum(len(documents) for documents in self._inserts.values()) + len(self._wishlist)
+
+    def _get_wake(self) -> asyncio.Event:
+        # Created on first use so the event binds to the worker's running loop
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def _get_flush_lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    def start(self) -> None:
+        """Start the background flush task if it is not running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        wake = self._get_wake()
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            if self.depth:
+                await self.flush()
+
+    async def _enqueued(self, user_id: Optional[str]) -> None:
+        self.queued += 1
+        if user_id:
+            self._pending_users.add(user_id)
+        if self._task is None or self._task.done():
+            # No background task (e.g. scripts): write through immediately
+            await self.flush()
+        elif self.depth >= self.max_queue_size:
+            logger.warning(f"Write-behind queue full ({self.depth} writes), waiting for flush")
+            await self.flush()
+        elif self.depth >= self.batch_size:
+            self._get_wake().set()
+
+    async def insert(self, collection_name: str, document: Dict[str, Any]) -> str:
+        """
+        Queue a document insert.
+
+        Args:
+            collection_name (str): Target collection
+            document (Dict): Document to insert; _id and created_at are filled in if missing
+
+        Returns:
+            str: ID the document will be stored under
+        """
+        document.setdefault('_id', ObjectId())
+        document.setdefault('created_at', datetime.datetime.utcnow())
+        self._inserts.setdefault(collection_name, []).append(document)
+        await self._enqueued(document.get('user_id'))
+        return str(document['_id'])
+
+    async def add_feedback(self, feedback_data: Dict[str, Any]) -> str:
+        """Queue a feedback insert and return its ID."""
+        return await self.insert('feedback', feedback_data)
+
+    async def create_user_profile(self, user_data: Dict[str, Any]) -> str:
+        """Queue a user profile insert and return its ID."""
+        return await self.insert('users', user_data)
+
+    async def add_to_wishlist(self, user_id: str, wishlist_items: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """
+        Queue wishlist upserts.
+
+        Repeated additions of the same product before a flush are merged, later fields
+        winning and the first added_date kept.
+
+        Args:
+            user_id (str): User identifier
+            wishlist_items (List[Dict]): Items to add, each with a product_id
+
+        Returns:
+            Optional[List[str]]: Product IDs of the queued items, None if an item has no product_id
+        """
+        if not wishlist_items or any(not item.get('product_id') for item in wishlist_items):
+            logger.error(f"Wishlist items for user {user_id} must each have a product_id")
+            return None
+
+        now = datetime.datetime.utcnow()
+        for item in wishlist_items:
+            key = (user_id, item['product_id'])
+            merged = self._wishlist.get(key)
+            if merged is None:
+                self._wishlist[key] = {'added_date': now, **item}
+            else:
+                merged.update({field: value for field, value in item.items() if field != 'added_date'})
+            await self._enqueued(user_id)
+        return [item['product_id'] for item in wishlist_items]
+
+    async def sync_user(self, user_id: str) -> None:
+        """
+        Flush pending writes if any belong to the user, so a following read sees them.
+
+        A user stays pending until their writes have landed, so a call made while a
+        background flush is writing them waits for that flush.
+
+        Args:
+            user_id (str): User identifier
+        """
+        if user_id in self._pending_users:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write everything queued so far.
+
+        Inserts go out as one insert_documents call per collection and wishlist
+        upserts as one add_to_wishlist call per user, all concurrently. Inserts that
+        did not land and failed wishlist batches are requeued for the next flush.
+
+        Returns:
+            int: Number of writes persisted
+        """
+        async with self._get_flush_lock():
+            inserts, self._inserts = self._inserts, {}
+            wishlist, self._wishlist = self._wishlist, {}
+            if not inserts and not wishlist:
+                self._pending_users = set()
+                return 0
+
+            by_user: Dict[str, List[Tuple[str, str]]] = {}
+            for key in wishlist:
+                by_user.setdefault(key[0], []).append(key)
+
+            batches = [(collection_name, [(collection_name, document) for document in documents],
+                        self.database.insert_documents(collection_name, documents))
+                       for collection_name, documents in inserts.items()]
+            batches += [(WISHLISTS_COLLECTION, [(key, wishlist[key]) for key in keys],
+                         self.database.add_to_wishlist(user_id, [wishlist[key] for key in keys]))
+                        for user_id, keys in by_user.items()]
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(write for _, _, write in batches), return_exceptions=True)
+            elapsed = time.perf_counter() - start
+
+            self.flushes += 1
+            self.flush_time_total += elapsed
+            self.flush_time_max = max(self.flush_time_max, elapsed)
+
+            persisted = 0
+            for (description, writes, _), result in zip(batches, results):
+                if result is None or isinstance(result, BaseException):
+                    failed = writes
+                elif description == WISHLISTS_COLLECTION:
+                    failed = []
+                else:
+                    # insert_documents returns the IDs that landed, possibly only some
+                    stored = set(result)
+                    failed = [(key, write) for key, write in writes if str(write['_id']) not in stored]
+                if failed:
+                    self.flush_failures += 1
+                    self._requeue(description, failed)
+                persisted += len(writes) - len(failed)
+                requeued = {id(write) for _, write in failed}
+                for _, write in writes:
+                    if id(write) not in requeued:
+                        self._attempts.pop(id(write), None)
+
+            # Users stay pending until nothing of theirs is queued, requeued or in flight
+            self._pending_users = {user_id for user_id, _ in self._wishlist}
+            self._pending_users.update(document['user_id'] for documents in self._inserts.values()
+                                       for document in documents if document.get('user_id'))
+            self.flushed += persisted
+            logger.info(f"Flushed {persisted} buffered writes in {elapsed * 1000:.1f} ms "
+                        f"({self.depth} still queued)")
+            return persisted
+
+    def _requeue(self, description: str, writes: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        retry = []
+        for key, write in writes:
+            attempts = self._attempts.pop(id(write), 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[id(write)] = attempts
+                retry.append((key, write))
+            else:
+                self.dropped += 1
+        if len(retry) < len(writes):
+            logger.error(f"Dropped {len(writes) - len(retry)} buffered {description} writes after "
+                         f"{self.max_attempts} attempts")
+
+        for key, write in retry:
+            if description == WISHLISTS_COLLECTION:
+                # A newer addition queued during the flush takes precedence
+                self._wishlist.setdefault(key, write)
+            else:
+                self._inserts.setdefault(key, []).append(write)
+
+    async def close(self) -> None:
+        """Stop background flushing and write out whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _ in range(self.max_attempts):
+            if not self.depth:
+                break
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get buffer counters.
+
+        Returns:
+            Dict: Queue depth, writes queued/flushed/dropped and flush latency
+        """
+        average = self.flush_time_total / self.flushes if self.flushes else 0.0
+        return {
+            "queue_depth": self.depth,
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "flush_latency_avg_ms": round(average * 1000, 3),
+            "flush_latency_max_ms": round(self.flush_time_max * 1000, 3),
+        }